@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import redis
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlmodel import Session
+
+from .catalog import get_catalog_state
+
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_REDIS_TTL = int(os.getenv("CACHE_REDIS_TTL", "86400"))
+
+
+# Entrée du cache: corps JSON déjà sérialisé, ETag fort et en-têtes additionnels
+class CacheEntry:
+    __slots__ = ("etag", "body", "headers")
+
+    def __init__(self, etag: str, body: bytes, headers: dict):
+        self.etag = etag
+        self.body = body
+        self.headers = headers
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.etag) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+
+# Cache des réponses en lecture: LRU en mémoire borné en octets, puis Redis partagé entre workers (optionnel)
+# Les clés contiennent la génération du catalogue: une écriture rend toutes les anciennes entrées inaccessibles
+class ResponseCache:
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, redis_url: str = None, redis_ttl: int = CACHE_REDIS_TTL):
+        self.max_bytes = max_bytes
+        self.redis_ttl = redis_ttl
+        self.redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    # Fonction pour lire une entrée (mémoire, puis Redis)
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+
+        if self.redis is None:
+            return None
+        try:
+            data = self.redis.hgetall(f"atelier-cache:{key}")
+        except redis.RedisError:
+            return None
+        if not data:
+            return None
+
+        entry = CacheEntry(data[b"etag"].decode(), data[b"body"], json.loads(data[b"headers"]))
+        self._store_local(key, entry)
+        return entry
+
+    # Fonction pour enregistrer une entrée dans les deux niveaux
+    def set(self, key: str, entry: CacheEntry):
+        self._store_local(key, entry)
+        if self.redis is None:
+            return
+        try:
+            redis_key = f"atelier-cache:{key}"
+            pipe = self.redis.pipeline()
+            pipe.hset(redis_key, mapping={"etag": entry.etag, "body": entry.body, "headers": json.dumps(entry.headers)})
+            pipe.expire(redis_key, self.redis_ttl)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def _store_local(self, key: str, entry: CacheEntry):
+        if entry.size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self.entries[key] = entry
+            self.size += entry.size
+            # Éviction des entrées les moins récemment utilisées
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size
+
+
+response_cache = ResponseCache(redis_url=CACHE_REDIS_URL)
+
+
+# Fonction pour vérifier si le client possède déjà la version courante
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+# Fonction pour servir une réponse JSON depuis le cache (ou la construire), avec ETag et 304
+# build() renvoie (contenu, en-têtes) et n'est appelé qu'en cas d'absence dans le cache
+def cached_json_response(request: Request, session: Session, route: str, params: dict, build) -> Response:
+    generation = get_catalog_state(session).generation
+    key = f"{route}:{generation}:" + json.dumps(params, sort_keys=True, default=str)
+
+    entry = response_cache.get(key)
+    if entry is None:
+        content, headers = build()
+        body = json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        entry = CacheEntry(etag, body, headers)
+        response_cache.set(key, entry)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", **entry.headers}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
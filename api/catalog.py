@@ -0,0 +1,46 @@
+from sqlmodel import Session, select, update
+
+from .models.atelier import Atelier
+from .models.catalog import CatalogState
+
+CATALOG_STATE_ID = 1
+
+
+# Fonction pour récupérer l'état courant du catalogue
+def get_catalog_state(session: Session) -> CatalogState:
+    state = session.get(CatalogState, CATALOG_STATE_ID)
+    if state is None:
+        state = CatalogState(id=CATALOG_STATE_ID, generation=0, reset_generation=0)
+    return state
+
+
+# Fonction pour passer à la génération suivante
+# La ligne reste verrouillée jusqu'au commit, les écritures concurrentes sont donc sérialisées
+def bump_generation(session: Session, reset: bool = False) -> int:
+    values = {"generation": CatalogState.generation + 1}
+    if reset:
+        values["reset_generation"] = CatalogState.generation + 1
+    result = session.exec(
+        update(CatalogState)
+        .where(CatalogState.id == CATALOG_STATE_ID)
+        .values(**values)
+        .returning(CatalogState.generation)
+    )
+    return result.scalar_one()
+
+
+# Fonction pour récupérer les URLs ajoutées ou modifiées depuis une génération, avec leur empreinte de contenu
+# Renvoie l'index complet si le client n'a jamais synchronisé ou si le catalogue a été vidé depuis
+def get_url_index(session: Session, since: int) -> dict:
+    state = get_catalog_state(session)
+    full = since <= 0 or since < state.reset_generation or since > state.generation
+    statement = select(Atelier.url, Atelier.content_hash)
+    if not full:
+        statement = statement.where(Atelier.generation > since)
+    rows = session.exec(statement).all()
+    return {
+        "generation": state.generation,
+        "full": full,
+        "urls": [row.url for row in rows],
+        "hashes": [row.content_hash for row in rows],
+    }
@@ -0,0 +1,141 @@
+import os
+import socket
+import threading
+from concurrent.futures import Future
+
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "scrapping.settings")
+
+REACTOR_PATH = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
+
+
+# Fonction pour charger les settings Scrapy du projet
+def get_crawl_settings():
+    from scrapy.utils.project import get_project_settings
+    return get_project_settings()
+
+
+# Crawl en cours dans le reactor: crawler Scrapy (stats en lecture directe) et futur du résultat
+class RunningCrawl:
+
+    def __init__(self):
+        self.crawler = None
+        self.future = Future()
+
+    # Fonction pour lire une statistique du crawler pendant le crawl
+    def stat(self, key, default=0):
+        if self.crawler is None or self.crawler.stats is None:
+            return default
+        return self.crawler.stats.get_value(key, default)
+
+
+# Exécution des spiders dans le processus du worker Celery
+# Le reactor Twisted (asyncio) tourne dans un thread dédié et reste actif entre les tâches,
+# ainsi que le navigateur Chromium partagé via CDP (pas de démarrage de Playwright à chaque crawl)
+class InProcessCrawlRunner:
+
+    def __init__(self, warm_browser: bool = True):
+        self.warm_browser = warm_browser
+        self.cdp_url = None
+        self._lock = threading.Lock()
+        self._reactor = None
+        self._playwright = None
+        self._browser = None
+        self._running = set()
+
+    # Fonction pour démarrer le reactor dans son thread (une seule fois par processus)
+    def _ensure_reactor(self):
+        with self._lock:
+            if self._reactor is not None:
+                return self._reactor
+
+            from scrapy.utils.reactor import install_reactor
+            install_reactor(REACTOR_PATH)
+            from twisted.internet import reactor
+
+            thread = threading.Thread(
+                target=reactor.run,
+                kwargs={"installSignalHandlers": False},
+                name="scrapy-reactor",
+                daemon=True,
+            )
+            thread.start()
+            self._reactor = reactor
+            return reactor
+
+    # Fonction pour lancer (une fois) le navigateur partagé, exposé en CDP sur un port local libre
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self.cdp_url
+
+        from playwright.async_api import async_playwright
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(
+            headless=True,
+            args=[f"--remote-debugging-port={port}"],
+        )
+        self.cdp_url = f"http://127.0.0.1:{port}"
+        return self.cdp_url
+
+    # Fonction exécutée dans le thread du reactor pour démarrer le crawl
+    def _start(self, running, spider_name, spider_args, settings_overrides):
+        from scrapy.crawler import CrawlerRunner
+        from scrapy.utils.defer import deferred_from_coro
+
+        def crawl(cdp_url):
+            settings = get_crawl_settings()
+            if cdp_url:
+                settings.set("PLAYWRIGHT_CDP_URL", cdp_url, priority="cmdline")
+            settings.setdict(settings_overrides or {}, priority="cmdline")
+
+            runner = CrawlerRunner(settings)
+            running.crawler = runner.create_crawler(spider_name)
+            return runner.crawl(running.crawler, **(spider_args or {}))
+
+        def done(_):
+            if not running.future.done():
+                running.future.set_result(running.crawler.stats.get_stats())
+
+        def failed(failure):
+            if not running.future.done():
+                running.future.set_exception(failure.value)
+
+        try:
+            if self.warm_browser:
+                d = deferred_from_coro(self._ensure_browser())
+            else:
+                from twisted.internet import defer
+                d = defer.succeed(None)
+            d.addCallback(crawl)
+            d.addCallbacks(done, failed)
+        except Exception as e:
+            running.future.set_exception(e)
+
+    # Fonction pour lancer un crawl depuis le thread de la tâche Celery
+    def crawl(self, spider_name, spider_args=None, settings_overrides=None) -> RunningCrawl:
+        reactor = self._ensure_reactor()
+        running = RunningCrawl()
+        self._running.add(running)
+        running.future.add_done_callback(lambda _: self._running.discard(running))
+        reactor.callFromThread(self._start, running, spider_name, spider_args, settings_overrides)
+        return running
+
+    # Fonction pour arrêter proprement un crawl (timeout de la tâche)
+    def stop(self, running):
+        if self._reactor is not None and running.crawler is not None:
+            self._reactor.callFromThread(running.crawler.stop)
+
+    # Fonction pour arrêter proprement tous les crawls en cours (arrêt du worker)
+    def stop_all(self):
+        for running in list(self._running):
+            self.stop(running)
+
+
+in_process_runner = InProcessCrawlRunner(
+    warm_browser=os.getenv("CRAWL_WARM_BROWSER", "true").lower() in ("1", "true", "yes"),
+)
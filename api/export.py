@@ -0,0 +1,33 @@
+import json
+import zlib
+
+from sqlmodel import Session, select
+
+from .database import engine
+from .models.atelier import Atelier
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+# Générateur NDJSON sur un curseur serveur (mémoire constante quelle que soit la taille du catalogue)
+def export_ateliers(category: str = None, compress: bool = False):
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    with Session(engine) as session:
+        statement = (
+            select(*Atelier.__table__.columns)
+            .order_by(Atelier.id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        if category:
+            statement = statement.where(Atelier.category == category)
+
+        for partition in session.exec(statement).mappings().partitions():
+            chunk = "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in partition).encode("utf-8")
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    if compressor is not None:
+        yield compressor.flush()
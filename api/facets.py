@@ -0,0 +1,105 @@
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from .catalog import bump_generation
+from .models.facet import AtelierFacet
+
+PRICE_BUCKET_EUROS = 25
+DURATION_BUCKET_MINUTES = 60
+
+# Expressions SQL des facettes, évaluées sur une ligne d'atelier
+# Les histogrammes de prix et de durée sont des tranches "min-max"
+FACET_EXPRESSIONS = {
+    "total": "'all'::text",
+    "category": "category",
+    "city": "city",
+    "price": (
+        f"((price_cents / {PRICE_BUCKET_EUROS * 100}) * {PRICE_BUCKET_EUROS})::text || '-' || "
+        f"((price_cents / {PRICE_BUCKET_EUROS * 100}) * {PRICE_BUCKET_EUROS} + {PRICE_BUCKET_EUROS})::text"
+    ),
+    "duration": (
+        f"((duration_minutes / {DURATION_BUCKET_MINUTES}) * {DURATION_BUCKET_MINUTES})::text || '-' || "
+        f"((duration_minutes / {DURATION_BUCKET_MINUTES}) * {DURATION_BUCKET_MINUTES} + {DURATION_BUCKET_MINUTES})::text"
+    ),
+}
+
+# Facettes triées par borne inférieure plutôt que par nombre d'ateliers
+HISTOGRAM_FACETS = ("price", "duration")
+
+
+# Fonction pour générer les lignes (facette, valeur, delta) d'un ensemble de lignes d'ateliers
+def _facet_rows_sql(source: str, delta: int) -> str:
+    return " UNION ALL ".join(
+        f"SELECT '{name}' AS facet, {expression} AS value, {delta} AS delta FROM {source} WHERE {expression} IS NOT NULL"
+        for name, expression in FACET_EXPRESSIONS.items()
+    )
+
+
+# Fonction pour générer la fonction et le trigger (par instruction, tables de transition) d'une opération
+def _facet_trigger_sql(operation: str, sources: list) -> list:
+    name = f"atelier_facet_{operation.lower()}"
+    changes = " UNION ALL ".join(_facet_rows_sql(source, delta) for source, delta in sources)
+    referencing = " ".join(
+        f"{'NEW' if source == 'new_rows' else 'OLD'} TABLE AS {source}" for source, _ in sources
+    )
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO atelierfacet (facet, value, count)
+            SELECT facet, value, sum(delta) FROM ({changes}) AS changes
+            GROUP BY facet, value
+            ORDER BY facet, value
+            ON CONFLICT (facet, value) DO UPDATE SET count = atelierfacet.count + EXCLUDED.count;
+            DELETE FROM atelierfacet WHERE count <= 0;
+            RETURN NULL;
+        END $$
+        """,
+        f"""
+        CREATE OR REPLACE TRIGGER {name} AFTER {operation} ON atelier
+        REFERENCING {referencing}
+        FOR EACH STATEMENT EXECUTE FUNCTION {name}()
+        """,
+    ]
+
+
+# Requête de recalcul complet des facettes
+REFRESH_FACETS_SQL = f"""
+    INSERT INTO atelierfacet (facet, value, count)
+    SELECT facet, value, sum(delta) FROM ({_facet_rows_sql('atelier', 1)}) AS rows
+    GROUP BY facet, value
+"""
+
+# Migrations: triggers de maintenance incrémentale puis remplissage initial si la table est vide
+FACET_MIGRATIONS = (
+    _facet_trigger_sql("INSERT", [("new_rows", 1)])
+    + _facet_trigger_sql("UPDATE", [("old_rows", -1), ("new_rows", 1)])
+    + _facet_trigger_sql("DELETE", [("old_rows", -1)])
+    + [REFRESH_FACETS_SQL + " HAVING NOT EXISTS (SELECT 1 FROM atelierfacet)"]
+)
+
+
+# Fonction pour recalculer toutes les facettes (réconciliation en fin de crawl)
+def refresh_facets(session: Session):
+    # Bloque les écritures concurrentes le temps du recalcul, les lectures restent possibles
+    session.exec(text("LOCK TABLE atelier IN SHARE MODE"))
+    session.exec(text("DELETE FROM atelierfacet"))
+    session.exec(text(REFRESH_FACETS_SQL))
+    bump_generation(session)
+    session.commit()
+
+
+# Fonction pour lire les facettes précalculées (coût proportionnel au nombre de facettes)
+def get_facets(session: Session) -> dict:
+    facets = {name: [] for name in FACET_EXPRESSIONS}
+    for row in session.exec(select(AtelierFacet)).all():
+        facets.setdefault(row.facet, []).append({"value": row.value, "count": row.count})
+
+    total = facets.pop("total")
+    for name, values in facets.items():
+        if name in HISTOGRAM_FACETS:
+            values.sort(key=lambda v: int(v["value"].split("-")[0]))
+        else:
+            values.sort(key=lambda v: (-v["count"], v["value"]))
+
+    return {"total": total[0]["count"] if total else 0, "facets": facets}
@@ -0,0 +1,297 @@
+import zlib
+from typing import List
+
+from pydantic import ValidationError
+from sqlalchemy import BigInteger, Column, Float, Integer, MetaData, Select, Text, Table, func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from .catalog import bump_generation
+from .models.atelier import (
+    Atelier,
+    AtelierCreate,
+    AtelierSnapshot,
+    ConflictMode,
+    IngestChunkResult,
+    IngestLineError,
+    IngestResult,
+    IngestTransaction,
+)
+from .normalize import NORMALIZED_FIELDS, normalize_atelier
+
+# Champs mis à jour quand une URL existe déjà (mode update)
+UPDATABLE_FIELDS = ("title", "category", "price", "duration", "location")
+
+# Champs recopiés dans l'historique à chaque nouvelle version
+SNAPSHOT_FIELDS = ("url", "generation") + UPDATABLE_FIELDS + NORMALIZED_FIELDS
+
+# Ingestion en flux (NDJSON): taille maximale d'une ligne, pas de décompression et erreurs détaillées par bloc
+GZIP_MAGIC = b"\x1f\x8b"
+MAX_NDJSON_LINE_BYTES = 1024 * 1024
+INFLATE_STEP = 256 * 1024
+MAX_LINE_ERRORS = 20
+
+
+# Champs chargés dans la table de staging par COPY (voir upsert_from_staging)
+STAGING_FIELDS = ("url",) + UPDATABLE_FIELDS + NORMALIZED_FIELDS
+
+# Table de staging temporaire, propre à chaque connexion et vidée à chaque commit
+# seq conserve l'ordre de chargement: pour une URL chargée plusieurs fois, la dernière ligne gagne
+atelier_staging = Table(
+    "atelier_staging",
+    MetaData(),
+    Column("seq", BigInteger, primary_key=True, autoincrement=True),
+    Column("url", Text, nullable=False),
+    Column("title", Text, nullable=False),
+    Column("category", Text),
+    Column("price", Float),
+    Column("duration", Text),
+    Column("location", Text),
+    Column("duration_minutes", Integer),
+    Column("city", Text),
+    Column("district", Text),
+    Column("price_cents", Integer),
+    Column("content_hash", Text),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DELETE ROWS",
+)
+
+
+# Fonction pour construire l'instruction INSERT ... ON CONFLICT d'un lot
+# values: liste de lignes, ou SELECT dont les colonnes suivent STAGING_FIELDS + generation
+# En mode update, une ligne existante n'est réécrite que si son empreinte de contenu change
+def build_upsert(values, mode: ConflictMode):
+    if isinstance(values, Select):
+        statement = insert(Atelier).from_select([*STAGING_FIELDS, "generation"], values)
+    else:
+        statement = insert(Atelier).values(values)
+    if mode == ConflictMode.update:
+        statement = statement.on_conflict_do_update(
+            index_elements=[Atelier.url],
+            set_={field: statement.excluded[field] for field in UPDATABLE_FIELDS + NORMALIZED_FIELDS + ("generation",)},
+            where=Atelier.content_hash.is_distinct_from(statement.excluded.content_hash),
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=[Atelier.url])
+    # xmax = 0 uniquement pour les lignes réellement insérées
+    return statement.returning(*Atelier.__table__.columns, literal_column("(xmax = 0)").label("inserted"))
+
+
+# Fonction pour ajouter à l'historique les lignes insérées ou modifiées par un upsert, dans la même instruction
+# (WITH upserted AS (INSERT ... RETURNING), snapshots AS (INSERT INTO ateliersnapshot SELECT ...) SELECT ...)
+def with_snapshots(upsert):
+    upserted = upsert.cte("upserted")
+    snapshots = insert(AtelierSnapshot).from_select(
+        ["atelier_id", "created", "captured_at", *SNAPSHOT_FIELDS],
+        select(
+            upserted.c.id,
+            upserted.c.inserted,
+            func.timezone("utc", func.now()),
+            *[upserted.c[field] for field in SNAPSHOT_FIELDS],
+        ),
+    ).cte("snapshots")
+    return select(upserted).add_cte(snapshots)
+
+
+# Fonction pour insérer ou mettre à jour un lot d'ateliers en une seule instruction
+def upsert_ateliers(session: Session, ateliers: List[AtelierCreate], mode: ConflictMode = ConflictMode.skip) -> dict:
+    # Dédoublonnage du lot par URL (la dernière occurrence gagne)
+    rows = {}
+    for atelier in ateliers:
+        rows[atelier.url] = normalize_atelier(atelier.model_dump())
+
+    if not rows:
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "ateliers": []}
+
+    generation = bump_generation(session)
+    values = [{**row, "generation": generation} for row in rows.values()]
+    result = session.exec(with_snapshots(build_upsert(values, mode))).mappings().all()
+
+    if not result:
+        # Rien n'a changé: on annule aussi l'incrément de génération
+        session.rollback()
+        return {"inserted": 0, "updated": 0, "unchanged": len(rows), "ateliers": []}
+
+    session.commit()
+
+    inserted = sum(1 for row in result if row["inserted"])
+    ateliers = [Atelier.model_validate({key: value for key, value in row.items() if key != "inserted"}) for row in result]
+    return {
+        "inserted": inserted,
+        "updated": len(result) - inserted,
+        "unchanged": len(rows) - len(result),
+        "ateliers": ateliers,
+    }
+
+
+# Fonction pour ajouter des ateliers, normalisés, à la table de staging de la transaction courante
+def stage_ateliers(session: Session, ateliers: List[AtelierCreate]):
+    connection = session.connection()
+    atelier_staging.create(connection, checkfirst=True)
+    rows = [normalize_atelier(atelier.model_dump()) for atelier in ateliers]
+    session.exec(insert(atelier_staging).values([{field: row[field] for field in STAGING_FIELDS} for row in rows]))
+
+
+# Fonction pour fusionner la table de staging dans atelier en une seule instruction (upsert et historique)
+# Les lignes doivent avoir été chargées (COPY) dans atelier_staging dans la transaction courante
+def upsert_from_staging(session: Session, mode: ConflictMode = ConflictMode.skip) -> dict:
+    staged = session.exec(select(func.count(func.distinct(atelier_staging.c.url)))).scalar_one()
+    if not staged:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    generation = bump_generation(session)
+    latest = (
+        select(*[atelier_staging.c[field] for field in STAGING_FIELDS], literal(generation).label("generation"))
+        .distinct(atelier_staging.c.url)
+        .order_by(atelier_staging.c.url, atelier_staging.c.seq.desc())
+    )
+    result = session.exec(with_snapshots(build_upsert(latest, mode))).mappings().all()
+
+    if not result:
+        session.rollback()
+        return {"inserted": 0, "updated": 0, "unchanged": staged}
+
+    session.commit()
+
+    inserted = sum(1 for row in result if row["inserted"])
+    return {"inserted": inserted, "updated": len(result) - inserted, "unchanged": staged - len(result)}
+
+
+# Erreur de lecture d'un flux NDJSON (gzip invalide, ligne trop longue)
+class NdjsonError(ValueError):
+    pass
+
+
+# Lecteur NDJSON incrémental: reçoit le corps morceau par morceau (gzip détecté ou imposé)
+# et renvoie les lignes complètes numérotées, sans jamais garder plus d'une ligne incomplète en mémoire
+class NdjsonReader:
+
+    def __init__(self, compressed: bool = None):
+        self.compressed = compressed
+        self.decompressor = None
+        self.buffer = bytearray()
+        self.line = 0
+
+    def feed(self, data: bytes):
+        if self.compressed is None and data:
+            self.compressed = data[:2] == GZIP_MAGIC
+        if not self.compressed:
+            yield from self._split(data)
+            return
+
+        try:
+            while data:
+                # Un nouveau membre gzip commence après la fin du précédent (fichiers concaténés)
+                if self.decompressor is None or self.decompressor.eof:
+                    self.decompressor = zlib.decompressobj(wbits=31)
+                out = self.decompressor.decompress(data, INFLATE_STEP)
+                data = self.decompressor.unconsumed_tail or self.decompressor.unused_data
+                yield from self._split(out)
+        except zlib.error as e:
+            raise NdjsonError(f"gzip invalide: {str(e)}")
+
+    # Fonction pour renvoyer la dernière ligne (sans retour à la ligne final) en fin de flux
+    def finish(self):
+        if self.compressed and self.decompressor is not None and not self.decompressor.eof:
+            raise NdjsonError("gzip tronqué")
+        if self.buffer.strip():
+            self.line += 1
+            yield self.line, bytes(self.buffer)
+        self.buffer.clear()
+
+    def _split(self, data: bytes):
+        self.buffer += data
+        start = 0
+        while True:
+            end = self.buffer.find(b"\n", start)
+            if end == -1:
+                break
+            self.line += 1
+            line = self.buffer[start:end]
+            start = end + 1
+            if line.strip():
+                yield self.line, bytes(line)
+        del self.buffer[:start]
+        if len(self.buffer) > MAX_NDJSON_LINE_BYTES:
+            raise NdjsonError(f"ligne {self.line + 1} trop longue (plus de {MAX_NDJSON_LINE_BYTES} octets)")
+
+
+# Fonction pour décrire une erreur de validation sur une ligne
+def _line_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" if detail["loc"] else detail["msg"]
+        for detail in error.errors()
+    )
+
+
+# Fonction pour valider et écrire un bloc de lignes (exécutée dans le pool de threads)
+# En transaction unique, le bloc est seulement ajouté à la table de staging: la génération n'est incrémentée
+# (et la ligne catalogstate verrouillée) qu'à la fusion, juste avant le commit, pas pendant la lecture du flux
+def _write_chunk(session: Session, index: int, lines, mode: ConflictMode, transaction: IngestTransaction):
+    chunk = IngestChunkResult(chunk=index, first_line=lines[0][0], last_line=lines[-1][0])
+    ateliers = []
+    for line_number, line in lines:
+        try:
+            ateliers.append(AtelierCreate.model_validate_json(line))
+        except ValidationError as e:
+            chunk.invalid += 1
+            if len(chunk.errors) < MAX_LINE_ERRORS:
+                chunk.errors.append(IngestLineError(line=line_number, error=_line_error(e)))
+
+    if not ateliers:
+        return chunk
+
+    if transaction == IngestTransaction.request:
+        stage_ateliers(session, ateliers)
+        chunk.staged = len(ateliers)
+        return chunk
+
+    written = upsert_ateliers(session, ateliers, mode)
+
+    chunk.inserted = written["inserted"]
+    chunk.updated = written["updated"]
+    chunk.unchanged = written["unchanged"]
+    return chunk
+
+
+# Fonction pour ingérer un flux NDJSON d'ateliers par blocs de chunk_size lignes
+# La mémoire utilisée ne dépend que de la taille d'un bloc, pas de celle du flux
+# Une erreur de lecture (NdjsonError) est levée en transaction unique; par bloc, les lignes lues avant l'erreur
+# sont écrites et le résultat partiel est renvoyé avec l'erreur
+async def ingest_ndjson(session: Session, stream, mode: ConflictMode = ConflictMode.skip, chunk_size: int = 1000,
+                        transaction: IngestTransaction = IngestTransaction.chunk, compressed: bool = None) -> IngestResult:
+    reader = NdjsonReader(compressed)
+    result = IngestResult()
+    pending = []
+
+    async def flush():
+        chunk = await run_in_threadpool(_write_chunk, session, len(result.chunks) + 1, pending, mode, transaction)
+        result.chunks.append(chunk)
+        for field in ("inserted", "updated", "unchanged", "invalid"):
+            setattr(result, field, getattr(result, field) + getattr(chunk, field))
+        pending.clear()
+
+    try:
+        async for data in stream:
+            for line in reader.feed(data):
+                pending.append(line)
+                if len(pending) >= chunk_size:
+                    await flush()
+        for line in reader.finish():
+            pending.append(line)
+    except NdjsonError as e:
+        if transaction == IngestTransaction.request:
+            raise
+        result.error = str(e)
+    if pending:
+        await flush()
+
+    # Transaction unique: fusion de toutes les lignes en attente (la dernière occurrence d'une URL gagne), puis commit
+    if transaction == IngestTransaction.request:
+        merged = await run_in_threadpool(upsert_from_staging, session, mode)
+        for field in ("inserted", "updated", "unchanged"):
+            setattr(result, field, merged[field])
+
+    result.lines = reader.line
+    return result
@@ -0,0 +1,138 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Mode multi-processus (workers uvicorn, processus Celery, crawls en sous-processus): chaque processus écrit ses
+# métriques dans ce répertoire et elles sont agrégées à la lecture. La variable doit être définie avant le
+# lancement des processus, et le répertoire vidé à chaque redémarrage du déploiement
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Buckets (secondes) des requêtes HTTP et SQL
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Buckets (secondes) de l'attente et de l'exécution des tâches Celery (un crawl dure jusqu'à 30 minutes)
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# Instructions SQL distinguées dans les métriques (les autres sont comptées dans "OTHER")
+SQL_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "daisy_http_request_duration_seconds",
+    "Durée des requêtes HTTP de l'API, par route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    "daisy_db_query_duration_seconds",
+    "Durée des requêtes SQL, par type d'instruction",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "daisy_db_pool_checked_out",
+    "Connexions des pools SQLAlchemy en cours d'utilisation",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CAPACITY = Gauge(
+    "daisy_db_pool_capacity",
+    "Connexions maximum des pools SQLAlchemy (pool_size + max_overflow)",
+    multiprocess_mode="livesum",
+)
+CELERY_TASK_QUEUE_WAIT = Histogram(
+    "daisy_celery_task_queue_wait_seconds",
+    "Attente des tâches Celery entre leur envoi et leur démarrage",
+    ["task", "spider"],
+    buckets=TASK_BUCKETS,
+)
+CELERY_TASK_DURATION = Histogram(
+    "daisy_celery_task_duration_seconds",
+    "Durée d'exécution des tâches Celery",
+    ["task", "spider", "state"],
+    buckets=TASK_BUCKETS,
+)
+
+_servers = set()
+
+
+# Fonction pour construire le registre exposé (agrégation des fichiers de tous les processus en mode multi-processus)
+def metrics_registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+# Fonction pour produire la réponse /metrics (format texte Prometheus)
+def render_metrics():
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+# Fonction pour exposer /metrics dans un processus sans API (worker Celery, crawl Scrapy lancé à la main)
+def start_metrics_server(port: int):
+    if port in _servers:
+        return
+    start_http_server(port, registry=metrics_registry())
+    _servers.add(port)
+
+
+# Fonction pour retirer les gauges d'un processus terminé (mode multi-processus)
+def mark_process_dead(pid: int):
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+# Fonction pour nommer la route d'une requête par son modèle (/api/v1/ateliers/{atelier_id}) et non son URL
+def route_label(request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# Fonction pour extraire le type d'instruction d'une requête SQL
+def sql_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in SQL_OPERATIONS else "OTHER"
+
+
+# Fonction pour instrumenter un moteur SQLAlchemy: durée des requêtes et occupation du pool de connexions
+def instrument_engine(engine):
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        DB_POOL_CAPACITY.inc(pool.size() + max(pool._max_overflow, 0))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["metrics_query_start"].pop()
+        DB_QUERY_DURATION.labels(sql_operation(statement)).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def failed_query(context):
+        starts = context.connection.info.get("metrics_query_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+    return engine
@@ -0,0 +1,67 @@
+from sqlalchemy import text
+
+from .facets import FACET_MIGRATIONS
+
+# Migrations idempotentes appliquées au démarrage, après create_all
+# (create_all ne modifie pas les tables déjà existantes)
+MIGRATIONS = [
+    # Génération du catalogue dans laquelle chaque atelier a été écrit
+    "ALTER TABLE atelier ADD COLUMN IF NOT EXISTS generation INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_atelier_generation ON atelier (generation)",
+    # Index unique sur l'URL (suppression des doublons existants avant sa création)
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = 'ix_atelier_url' AND i.indisunique
+        ) THEN
+            DELETE FROM atelier a USING atelier b WHERE a.url = b.url AND a.id > b.id;
+            DROP INDEX IF EXISTS ix_atelier_url;
+            CREATE UNIQUE INDEX ix_atelier_url ON atelier (url);
+        END IF;
+    END $$
+    """,
+    # Index composite pour la pagination par curseur filtrée par catégorie
+    "CREATE INDEX IF NOT EXISTS ix_atelier_category_id ON atelier (category, id)",
+    # Recherche plein texte (configuration french) et approchante (trigrammes)
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE atelier ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('french', coalesce(title, '')), 'A')
+        || setweight(to_tsvector('french', coalesce(category, '')), 'B')
+        || setweight(to_tsvector('french', coalesce(location, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_atelier_search_vector ON atelier USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_atelier_title_trgm ON atelier USING GIN (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_atelier_location_trgm ON atelier USING GIN (location gin_trgm_ops)",
+    # Champs normalisés calculés à l'ingestion (remplis pour l'existant par POST /ateliers/backfill-normalized)
+    "ALTER TABLE atelier ADD COLUMN IF NOT EXISTS duration_minutes INTEGER",
+    "ALTER TABLE atelier ADD COLUMN IF NOT EXISTS city VARCHAR",
+    "ALTER TABLE atelier ADD COLUMN IF NOT EXISTS district VARCHAR",
+    "ALTER TABLE atelier ADD COLUMN IF NOT EXISTS price_cents INTEGER",
+    # Empreinte de contenu (voir api/normalize.py)
+    "ALTER TABLE atelier ADD COLUMN IF NOT EXISTS content_hash VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_atelier_price_cents_id ON atelier (price_cents, id)",
+    "CREATE INDEX IF NOT EXISTS ix_atelier_city_price_cents ON atelier (city, price_cents)",
+    "CREATE INDEX IF NOT EXISTS ix_atelier_duration_minutes_id ON atelier (duration_minutes, id)",
+    # Progression des crawls, mise à jour pendant l'exécution
+    "ALTER TABLE crawllog ADD COLUMN IF NOT EXISTS pages_crawled INTEGER",
+    "ALTER TABLE crawllog ADD COLUMN IF NOT EXISTS errors_count INTEGER",
+    "ALTER TABLE crawllog ADD COLUMN IF NOT EXISTS crawl_id VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_crawllog_crawl_id ON crawllog (crawl_id)",
+    "ALTER TABLE crawllog ADD COLUMN IF NOT EXISTS resumed BOOLEAN",
+    # Mode de profilage demandé au lancement du crawl (profil dans crawlprofile)
+    "ALTER TABLE crawllog ADD COLUMN IF NOT EXISTS profiling VARCHAR",
+    "INSERT INTO catalogstate (id, generation, reset_generation) VALUES (1, 0, 0) ON CONFLICT (id) DO NOTHING",
+    # Compteurs de facettes maintenus par triggers (voir api/facets.py)
+    *FACET_MIGRATIONS,
+]
+
+
+# Fonction pour appliquer les migrations
+def run_migrations(engine):
+    with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
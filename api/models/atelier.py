@@ -1,17 +1,59 @@
+from datetime import datetime
+from enum import Enum
 from typing import Annotated, List, Union
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 # Modèle pour l'atelier
 class Atelier(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_atelier_category_id", "category", "id"),
+        Index("ix_atelier_price_cents_id", "price_cents", "id"),
+        Index("ix_atelier_city_price_cents", "city", "price_cents"),
+        Index("ix_atelier_duration_minutes_id", "duration_minutes", "id"),
+    )
+
     id: Union[int, None] = Field(default=None, primary_key=True)
     title: str = Field(index=True)
-    url: str = Field(index=True)
+    url: str = Field(index=True, unique=True)
     category: Union[str, None] = Field(default=None, index=True)
     price: Union[float, None] = Field(default=None, index=True)
     duration: Union[str, None] = Field(default=None, index=True)
     location: Union[str, None] = Field(default=None, index=True)
+    generation: Union[int, None] = Field(default=None, index=True)
+    # Champs normalisés calculés à l'ingestion (voir api/normalize.py)
+    duration_minutes: Union[int, None] = None
+    city: Union[str, None] = None
+    district: Union[str, None] = None
+    price_cents: Union[int, None] = None
+    # Empreinte des champs normalisés: une ligne n'est réécrite que si elle change
+    content_hash: Union[str, None] = None
+
+# Modèle pour l'historique des ateliers (une ligne par version, en ajout seul)
+class AtelierSnapshot(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_ateliersnapshot_atelier_id_id", "atelier_id", "id"),
+        Index("ix_ateliersnapshot_generation_id", "generation", "id"),
+    )
+
+    id: Union[int, None] = Field(default=None, primary_key=True)
+    atelier_id: int
+    url: str = Field(index=True)
+    generation: Union[int, None] = None
+    created: bool = Field(default=False)
+    captured_at: datetime = Field(default_factory=datetime.utcnow)
+    title: str
+    category: Union[str, None] = None
+    price: Union[float, None] = None
+    duration: Union[str, None] = None
+    location: Union[str, None] = None
+    duration_minutes: Union[int, None] = None
+    city: Union[str, None] = None
+    district: Union[str, None] = None
+    price_cents: Union[int, None] = None
+    content_hash: Union[str, None] = None
 
 # Modèle pour la création d'un atelier
 class AtelierCreate(SQLModel):
@@ -20,4 +62,50 @@ class AtelierCreate(SQLModel):
     category: Union[str, None] = None
     price: Union[float, None] = None
     duration: Union[str, None] = None
-    location: Union[str, None] = None
\ No newline at end of file
+    location: Union[str, None] = None
+
+# Enum pour le comportement en cas d'URL déjà existante
+class ConflictMode(str, Enum):
+    skip = "skip"
+    update = "update"
+
+# Modèle pour le résultat d'un batch
+class AtelierBatchResult(SQLModel):
+    inserted: int
+    updated: int
+    unchanged: int
+    ateliers: List[Atelier]
+
+# Enum pour la portée des transactions d'une ingestion en flux
+class IngestTransaction(str, Enum):
+    chunk = "chunk"  # un commit par bloc: les blocs déjà écrits restent en cas d'erreur
+    request = "request"  # une seule transaction: tout ou rien
+
+# Modèle pour une ligne rejetée d'une ingestion en flux
+class IngestLineError(SQLModel):
+    line: int
+    error: str
+
+# Modèle pour le résultat d'un bloc d'une ingestion en flux
+class IngestChunkResult(SQLModel):
+    chunk: int
+    first_line: int
+    last_line: int
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+    # Lignes valides mises en attente (transaction=request), écrites à la fin du flux
+    staged: int = 0
+    errors: List[IngestLineError] = []
+
+# Modèle pour le résultat d'une ingestion en flux
+class IngestResult(SQLModel):
+    lines: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+    chunks: List[IngestChunkResult] = []
+    # Erreur de lecture du flux (transaction=chunk): les blocs de chunks sont écrits, la suite du flux est ignorée
+    error: Union[str, None] = None
@@ -0,0 +1,67 @@
+from datetime import datetime
+from enum import Enum
+from typing import List, Union
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+# Modèle pour l'état du catalogue (une seule ligne, id = 1)
+class CatalogState(SQLModel, table=True):
+    id: Union[int, None] = Field(default=None, primary_key=True)
+    generation: int = Field(default=0)
+    reset_generation: int = Field(default=0)
+
+
+# Modèle pour l'index des URLs (complet ou delta depuis une génération)
+# hashes[i] est l'empreinte de contenu de urls[i] (None pour une ligne pas encore normalisée)
+class AtelierUrlIndex(SQLModel):
+    generation: int
+    full: bool
+    urls: List[str]
+    hashes: List[Union[str, None]]
+
+
+# Enum pour l'état d'un chargement complet du catalogue
+class CatalogLoadStatus(str, Enum):
+    loading = "loading"  # ateliers en cours de chargement dans atelierloadrow
+    promoted = "promoted"  # chargement appliqué au catalogue
+    failed = "failed"  # crawl en échec ou incomplet: le catalogue n'a pas été modifié
+
+
+# Modèle pour un chargement complet du catalogue (crawl en mode full_refresh)
+# Les ateliers sont chargés à part puis appliqués au catalogue en une seule transaction (promotion)
+class CatalogLoad(SQLModel, table=True):
+    id: Union[int, None] = Field(default=None, primary_key=True)
+    status: CatalogLoadStatus = Field(default=CatalogLoadStatus.loading, index=True)
+    task_id: Union[str, None] = Field(default=None, index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    promoted_at: Union[datetime, None] = None
+    # Lignes de chargement supprimées (en tâche de fond, après promotion ou échec)
+    cleaned_at: Union[datetime, None] = None
+    staged: Union[int, None] = None
+    inserted: Union[int, None] = None
+    updated: Union[int, None] = None
+    deleted: Union[int, None] = None
+    error_message: Union[str, None] = None
+
+
+# Modèle pour un atelier chargé par un chargement complet (champs bruts et normalisés, comme atelier)
+class AtelierLoadRow(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_atelierloadrow_load_id_url", "load_id", "url"),
+    )
+
+    id: Union[int, None] = Field(default=None, primary_key=True)
+    load_id: int = Field(foreign_key="catalogload.id", ondelete="CASCADE")
+    url: str
+    title: str
+    category: Union[str, None] = None
+    price: Union[float, None] = None
+    duration: Union[str, None] = None
+    location: Union[str, None] = None
+    duration_minutes: Union[int, None] = None
+    city: Union[str, None] = None
+    district: Union[str, None] = None
+    price_cents: Union[int, None] = None
+    content_hash: Union[str, None] = None
@@ -1,5 +1,6 @@
 from typing import Union
 from datetime import datetime
+from sqlalchemy import Column, LargeBinary
 from sqlmodel import Field, SQLModel
 from enum import Enum
 
@@ -13,15 +14,56 @@ class CrawlStatus(str, Enum):
     FAILED = "FAILED"
     TIMEOUT = "TIMEOUT"
 
+# Enum pour le mode d'exécution du crawl
+class CrawlRunner(str, Enum):
+    inprocess = "inprocess"
+    subprocess = "subprocess"
+
+# Enum pour le découpage d'un crawl en sous-tâches parallèles
+class ShardStrategy(str, Enum):
+    none = "none"
+    category = "category"
+    city = "city"
+    pages = "pages"
+
+# Enum pour le mode de crawl: pages de liste, revisite des pages détail dues ou remplacement complet du catalogue
+class CrawlMode(str, Enum):
+    listing = "listing"
+    detail = "detail"
+    full_refresh = "full_refresh"
+
+# Enum pour le profilage d'un crawl: échantillonnage de la pile (format flamegraph) ou cProfile (pstats)
+class CrawlProfiling(str, Enum):
+    none = "none"
+    sampling = "sampling"
+    callbacks = "callbacks"
+
 # Modèle pour le log du crawl
 class CrawlLog(SQLModel, table=True):
     id: Union[int, None] = Field(default=None, primary_key=True)
     task_id: str = Field(index=True)
+    crawl_id: Union[str, None] = Field(default=None, index=True)
+    # Crawl reprenable: état trouvé dans CRAWL_STATE_DIR par le worker au démarrage (None sans crawl_id)
+    resumed: Union[bool, None] = None
     spider_name: str = Field(index=True)
     status: str = Field(index=True)
     error_message: Union[str, None] = None
     items_scraped: Union[int, None] = None
+    pages_crawled: Union[int, None] = None
+    errors_count: Union[int, None] = None
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     completed_at: Union[datetime, None] = None
+    profiling: Union[str, None] = None
+
+# Modèle pour le profil d'un crawl, rattaché à son log
+class CrawlProfile(SQLModel, table=True):
+    id: Union[int, None] = Field(default=None, primary_key=True)
+    crawl_log_id: int = Field(foreign_key="crawllog.id", ondelete="CASCADE", index=True)
+    mode: str
+    filename: str
+    content_type: str
+    size: int
+    content: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -0,0 +1,22 @@
+from typing import Dict, List
+
+from sqlmodel import Field, SQLModel
+
+
+# Modèle pour les compteurs de facettes, maintenus par triggers sur la table atelier
+class AtelierFacet(SQLModel, table=True):
+    facet: str = Field(primary_key=True)
+    value: str = Field(primary_key=True)
+    count: int = Field(default=0)
+
+
+# Modèle pour une valeur de facette
+class FacetCount(SQLModel):
+    value: str
+    count: int
+
+
+# Modèle pour la réponse de l'endpoint des facettes
+class AtelierFacets(SQLModel):
+    total: int
+    facets: Dict[str, List[FacetCount]]
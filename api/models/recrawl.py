@@ -0,0 +1,58 @@
+from datetime import datetime
+from enum import Enum
+from typing import Union
+
+from sqlmodel import Field, SQLModel
+
+
+# Modèle pour l'état de recrawl d'un atelier (validateurs HTTP, empreinte et historique des changements)
+class AtelierCrawlState(SQLModel, table=True):
+    atelier_id: int = Field(primary_key=True, foreign_key="atelier.id", ondelete="CASCADE")
+    first_checked_at: datetime = Field(default_factory=datetime.utcnow)
+    last_checked_at: datetime = Field(default_factory=datetime.utcnow)
+    next_check_at: datetime = Field(index=True)
+    check_count: int = Field(default=0)
+    change_count: int = Field(default=0)
+    etag: Union[str, None] = None
+    last_modified: Union[str, None] = None
+    page_hash: Union[str, None] = None
+
+
+# Enum pour le résultat de la visite d'une page détail
+class RecrawlStatus(str, Enum):
+    not_modified = "not_modified"  # 304: validateurs HTTP inchangés
+    unchanged = "unchanged"  # empreinte de la page inchangée, page non parsée
+    changed = "changed"  # page modifiée, champs extraits joints
+    gone = "gone"  # 404 / 410
+
+
+# Modèle pour une URL à revisiter
+class RecrawlTarget(SQLModel):
+    url: str
+    etag: Union[str, None] = None
+    last_modified: Union[str, None] = None
+    page_hash: Union[str, None] = None
+
+
+# Modèle pour le résultat de la visite d'une page détail envoyé par le spider
+class RecrawlResult(SQLModel):
+    url: str
+    status: RecrawlStatus
+    etag: Union[str, None] = None
+    last_modified: Union[str, None] = None
+    page_hash: Union[str, None] = None
+    title: Union[str, None] = None
+    category: Union[str, None] = None
+    price: Union[float, None] = None
+    duration: Union[str, None] = None
+    location: Union[str, None] = None
+
+
+# Modèle pour le bilan d'un lot de résultats de recrawl
+class RecrawlSummary(SQLModel):
+    not_modified: int = 0
+    unchanged: int = 0
+    changed: int = 0
+    gone: int = 0
+    updated: int = 0
+    unknown: int = 0
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import re
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from .catalog import bump_generation
+from .models.atelier import Atelier
+
+DURATION_PATTERN = re.compile(
+    r"^\s*(?:(?P<hours>\d+)\s*h(?:eures?)?)?\s*(?:(?P<minutes>\d+)\s*(?:min(?:utes?)?)?)?\s*$",
+    re.IGNORECASE,
+)
+
+# Nombre dans un prix affiché ("1 234,50 €", "1.234 €", "65€"), espaces déjà retirés
+PRICE_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+# Partie entière et décimales: seul un dernier séparateur suivi d'un ou deux chiffres est décimal
+PRICE_PARTS_PATTERN = re.compile(r"^(?P<integer>.*?)(?:[.,](?P<decimals>\d{1,2}))?$")
+
+# Champs calculés à l'ingestion à partir des champs bruts
+NORMALIZED_FIELDS = ("duration_minutes", "city", "district", "price_cents", "content_hash")
+
+# Champs couverts par l'empreinte de contenu (prix en centimes pour éviter les écarts de flottants)
+HASH_FIELDS = ("title", "category", "price_cents", "duration", "location")
+
+
+# Fonction pour convertir une durée texte ("2h30", "7h", "45min") en minutes
+def parse_duration_minutes(duration):
+    if not duration:
+        return None
+    match = DURATION_PATTERN.match(duration)
+    if not match or not (match.group("hours") or match.group("minutes")):
+        return None
+    if not match.group("hours") and not re.search(r"min", duration, re.IGNORECASE):
+        return None
+    return int(match.group("hours") or 0) * 60 + int(match.group("minutes") or 0)
+
+
+# Fonction pour séparer une localisation "Ville, Quartier" en (ville, quartier)
+def split_location(location):
+    if not location:
+        return None, None
+    city, _, district = location.partition(",")
+    return city.strip() or None, district.strip() or None
+
+
+# Fonction pour lire un prix affiché en euros ("1 234,50 €" -> 1234.5, "1.234 €" -> 1234.0)
+# Un séparateur suivi de trois chiffres est un séparateur de milliers
+def parse_price(text):
+    if text is None or isinstance(text, (int, float)):
+        return text
+    match = PRICE_PATTERN.search(re.sub(r"[\s\u00a0\u202f]", "", text))
+    if not match:
+        return None
+    parts = PRICE_PARTS_PATTERN.match(match.group(0))
+    integer = re.sub(r"[.,]", "", parts.group("integer"))
+    return float(f"{integer}.{parts.group('decimals')}" if parts.group("decimals") else integer)
+
+
+# Fonction pour convertir un prix en euros en centimes, sans erreur d'arrondi flottant
+def price_to_cents(price):
+    if price is None:
+        return None
+    try:
+        return int((Decimal(str(price)) * 100).to_integral_value())
+    except InvalidOperation:
+        return None
+
+
+# Fonction pour calculer l'empreinte de contenu d'un atelier normalisé
+def content_hash(row: dict) -> str:
+    raw = json.dumps([row.get(field) for field in HASH_FIELDS], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+# Fonction pour calculer les champs normalisés d'un atelier
+def normalize_atelier(row: dict) -> dict:
+    city, district = split_location(row.get("location"))
+    normalized = {
+        **row,
+        "duration_minutes": parse_duration_minutes(row.get("duration")),
+        "city": city,
+        "district": district,
+        "price_cents": price_to_cents(row.get("price")),
+    }
+    normalized["content_hash"] = content_hash(normalized)
+    return normalized
+
+
+# Fonction pour recalculer les champs normalisés des lignes jamais normalisées, par lots (keyset sur id)
+# content_hash est toujours calculé avec les autres champs normalisés: une ligne dont la durée ou le lieu
+# ne se lit pas (duration_minutes ou city NULL) n'est traitée qu'une fois, et un lot sélectionné est toujours écrit.
+# Les lignes recalculées changent de génération (cache des lectures et delta de l'index des URLs)
+def backfill_normalized(session: Session, batch_size: int = 1000) -> int:
+    last_id = 0
+    updated = 0
+
+    while True:
+        rows = session.exec(
+            select(Atelier.id, Atelier.title, Atelier.category, Atelier.duration, Atelier.location, Atelier.price)
+            .where(Atelier.content_hash == None, Atelier.id > last_id)
+            .order_by(Atelier.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        generation = bump_generation(session)
+        values = []
+        for row in rows:
+            normalized = normalize_atelier({
+                "title": row.title,
+                "category": row.category,
+                "duration": row.duration,
+                "location": row.location,
+                "price": row.price,
+            })
+            values.append({
+                "id": row.id,
+                "generation": generation,
+                **{field: normalized[field] for field in NORMALIZED_FIELDS},
+            })
+        session.exec(update(Atelier), params=values)
+        session.commit()
+
+        updated += len(rows)
+        last_id = rows[-1].id
+
+    return updated
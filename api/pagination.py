@@ -0,0 +1,22 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+
+# Fonction pour encoder un curseur opaque (position de la dernière ligne renvoyée)
+def encode_cursor(position: dict) -> str:
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+# Fonction pour décoder un curseur reçu du client
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(position, dict):
+            raise ValueError("curseur invalide")
+        return position
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
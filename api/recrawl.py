@@ -0,0 +1,115 @@
+import math
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select
+
+from .ingest import upsert_ateliers
+from .models.atelier import Atelier, AtelierCreate, ConflictMode
+from .models.recrawl import AtelierCrawlState, RecrawlResult, RecrawlStatus, RecrawlSummary, RecrawlTarget
+
+# Bornes de l'intervalle entre deux visites d'une page détail
+MIN_RECHECK_INTERVAL = timedelta(hours=6)
+MAX_RECHECK_INTERVAL = timedelta(days=30)
+# Période d'observation ajoutée à l'historique (évite un intervalle nul ou infini au début)
+PRIOR_OBSERVATION = timedelta(days=1)
+# Probabilité de changement visée au moment de la prochaine visite
+TARGET_CHANGE_PROBABILITY = 0.5
+
+
+# Fonction pour calculer la date de la prochaine visite à partir de l'historique des changements
+# Le taux de changement est estimé par changements observés / durée d'observation,
+# et la visite est planifiée quand la probabilité que la page ait changé atteint TARGET_CHANGE_PROBABILITY
+def next_check_at(state: AtelierCrawlState, now: datetime) -> datetime:
+    observed = (now - state.first_checked_at) + PRIOR_OBSERVATION
+    rate = (state.change_count + 0.5) / observed.total_seconds()
+    interval = timedelta(seconds=-math.log(1 - TARGET_CHANGE_PROBABILITY) / rate)
+    return now + min(max(interval, MIN_RECHECK_INTERVAL), MAX_RECHECK_INTERVAL)
+
+
+# Fonction pour récupérer les URLs dont la prochaine visite est due (jamais visitées en dernier)
+def get_due_targets(session: Session, limit: int, now: datetime = None) -> List[RecrawlTarget]:
+    now = now or datetime.utcnow()
+    statement = (
+        select(Atelier.url, AtelierCrawlState.etag, AtelierCrawlState.last_modified, AtelierCrawlState.page_hash)
+        .outerjoin(AtelierCrawlState, AtelierCrawlState.atelier_id == Atelier.id)
+        .where(or_(AtelierCrawlState.next_check_at == None, AtelierCrawlState.next_check_at <= now))
+        .order_by(AtelierCrawlState.next_check_at.asc().nulls_last(), Atelier.id)
+        .limit(limit)
+    )
+    return [RecrawlTarget(**row) for row in session.exec(statement).mappings().all()]
+
+
+# Fonction pour appliquer les résultats d'un recrawl: mise à jour des ateliers modifiés puis replanification
+def apply_recrawl_results(session: Session, results: List[RecrawlResult], now: datetime = None) -> RecrawlSummary:
+    now = now or datetime.utcnow()
+    summary = RecrawlSummary()
+
+    results = list({result.url: result for result in results}.values())
+    if not results:
+        return summary
+
+    rows = session.exec(
+        select(Atelier, AtelierCrawlState)
+        .outerjoin(AtelierCrawlState, AtelierCrawlState.atelier_id == Atelier.id)
+        .where(Atelier.url.in_([result.url for result in results]))
+    ).all()
+    known = {atelier.url: (atelier, state) for atelier, state in rows}
+    # Objets détachés: ils restent lisibles après le commit de l'upsert sans être rechargés
+    session.expunge_all()
+
+    # Les champs absents de la page gardent leur valeur actuelle
+    changes = []
+    for result in results:
+        if result.status == RecrawlStatus.changed and result.url in known:
+            atelier = known[result.url][0]
+            fields = {
+                field: getattr(result, field) if getattr(result, field) is not None else getattr(atelier, field)
+                for field in ("title", "category", "price", "duration", "location")
+            }
+            changes.append(AtelierCreate(url=result.url, **fields))
+
+    updated_urls = set()
+    if changes:
+        written = upsert_ateliers(session, changes, ConflictMode.update)
+        updated_urls = {atelier.url for atelier in written["ateliers"]}
+        summary.updated = written["updated"]
+
+    states = []
+    for result in results:
+        if result.url not in known:
+            summary.unknown += 1
+            continue
+        setattr(summary, result.status.value, getattr(summary, result.status.value) + 1)
+
+        atelier, state = known[result.url]
+        state = state or AtelierCrawlState(atelier_id=atelier.id, first_checked_at=now, next_check_at=now)
+        state.check_count += 1
+        state.last_checked_at = now
+        if result.url in updated_urls:
+            state.change_count += 1
+        if result.etag is not None:
+            state.etag = result.etag
+        if result.last_modified is not None:
+            state.last_modified = result.last_modified
+        if result.page_hash is not None:
+            state.page_hash = result.page_hash
+        if result.status == RecrawlStatus.gone:
+            state.next_check_at = now + MAX_RECHECK_INTERVAL
+        else:
+            state.next_check_at = next_check_at(state, now)
+        states.append(state.model_dump())
+
+    if states:
+        statement = insert(AtelierCrawlState).values(states)
+        statement = statement.on_conflict_do_update(
+            index_elements=[AtelierCrawlState.atelier_id],
+            set_={column.name: statement.excluded[column.name] for column in AtelierCrawlState.__table__.columns
+                  if column.name != "atelier_id"},
+        )
+        session.exec(statement)
+        session.commit()
+
+    return summary
@@ -0,0 +1,129 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import delete, exists, func, insert, literal
+from sqlmodel import Session, select
+
+from .catalog import bump_generation
+from .ingest import STAGING_FIELDS, build_upsert, with_snapshots
+from .models.atelier import Atelier, AtelierCreate, ConflictMode
+from .models.catalog import AtelierLoadRow, CatalogLoad, CatalogLoadStatus
+from .normalize import normalize_atelier
+
+# Part minimale du catalogue en ligne qu'un chargement doit contenir pour être promu
+# (protège contre un crawl "réussi" mais tronqué qui supprimerait la moitié du catalogue)
+MIN_PROMOTE_RATIO = 0.5
+# Lignes de chargement supprimées par transaction lors du nettoyage
+CLEAN_BATCH_SIZE = 10000
+
+
+# Fonction pour créer un chargement complet du catalogue
+def create_load(session: Session, task_id: str = None) -> CatalogLoad:
+    load = CatalogLoad(task_id=task_id)
+    session.add(load)
+    session.commit()
+    session.refresh(load)
+    return load
+
+
+# Fonction pour récupérer un chargement (verrouillé jusqu'au commit si for_update)
+def get_load(session: Session, load_id: int, for_update: bool = False) -> CatalogLoad:
+    statement = select(CatalogLoad).where(CatalogLoad.id == load_id)
+    if for_update:
+        statement = statement.with_for_update()
+    load = session.exec(statement).first()
+    if load is None:
+        raise LookupError(f"Chargement {load_id} introuvable")
+    return load
+
+
+# Fonction pour ajouter des ateliers à un chargement en cours (normalisés comme à l'ingestion)
+def stage_ateliers(session: Session, load_id: int, ateliers: List[AtelierCreate]) -> int:
+    load = get_load(session, load_id)
+    if load.status != CatalogLoadStatus.loading:
+        raise ValueError(f"Le chargement {load_id} n'est plus en cours ({load.status.value})")
+    if not ateliers:
+        return 0
+
+    rows = [{**normalize_atelier(atelier.model_dump()), "load_id": load_id} for atelier in ateliers]
+    session.exec(insert(AtelierLoadRow), params=rows)
+    session.commit()
+    return len(rows)
+
+
+# Fonction pour appliquer un chargement au catalogue, en une seule transaction:
+# suppression des ateliers absents du chargement, puis upsert (mode update, avec historique) des ateliers chargés.
+# Les lecteurs voient l'ancien catalogue jusqu'au commit, puis le nouveau: jamais de catalogue vide ou partiel.
+# Seuls les ateliers disparus sont supprimés: la table n'est ni vidée ni verrouillée en entier
+def promote_load(session: Session, load_id: int, min_ratio: float = MIN_PROMOTE_RATIO) -> CatalogLoad:
+    load = get_load(session, load_id, for_update=True)
+    if load.status != CatalogLoadStatus.loading:
+        raise ValueError(f"Le chargement {load_id} ne peut pas être promu ({load.status.value})")
+
+    staged = session.exec(
+        select(func.count(func.distinct(AtelierLoadRow.url))).where(AtelierLoadRow.load_id == load_id)
+    ).one()
+    live = session.exec(select(func.count()).select_from(Atelier)).one()
+    if not staged or staged < live * min_ratio:
+        raise ValueError(
+            f"Chargement {load_id} incomplet: {staged} ateliers chargés pour {live} en ligne "
+            f"(minimum {min_ratio:.0%})"
+        )
+
+    stale = ~exists().where(AtelierLoadRow.load_id == load_id, AtelierLoadRow.url == Atelier.url)
+    deleted = session.exec(delete(Atelier).where(stale)).rowcount
+
+    # Des URLs ont disparu: les copies locales de l'index des URLs doivent être resynchronisées en entier
+    generation = bump_generation(session, reset=deleted > 0)
+    latest = (
+        select(*[getattr(AtelierLoadRow, field) for field in STAGING_FIELDS], literal(generation).label("generation"))
+        .where(AtelierLoadRow.load_id == load_id)
+        .distinct(AtelierLoadRow.url)
+        .order_by(AtelierLoadRow.url, AtelierLoadRow.id.desc())
+    )
+    result = session.exec(with_snapshots(build_upsert(latest, ConflictMode.update))).mappings().all()
+    inserted = sum(1 for row in result if row["inserted"])
+
+    load.status = CatalogLoadStatus.promoted
+    load.promoted_at = datetime.utcnow()
+    load.staged = staged
+    load.inserted = inserted
+    load.updated = len(result) - inserted
+    load.deleted = deleted
+    session.add(load)
+    session.commit()
+    session.refresh(load)
+    return load
+
+
+# Fonction pour marquer un chargement en échec (le catalogue en ligne n'est pas modifié)
+def fail_load(session: Session, load_id: int, error_message: str = None) -> CatalogLoad:
+    load = get_load(session, load_id, for_update=True)
+    if load.status == CatalogLoadStatus.loading:
+        load.status = CatalogLoadStatus.failed
+        load.error_message = error_message
+        session.add(load)
+    session.commit()
+    return load
+
+
+# Fonction pour supprimer les lignes d'un chargement terminé, par lots (sans longue transaction)
+def clean_load(session: Session, load_id: int, batch_size: int = CLEAN_BATCH_SIZE) -> int:
+    load = get_load(session, load_id)
+    if load.status == CatalogLoadStatus.loading:
+        raise ValueError(f"Le chargement {load_id} est encore en cours")
+
+    removed = 0
+    while True:
+        batch = select(AtelierLoadRow.id).where(AtelierLoadRow.load_id == load_id).limit(batch_size)
+        count = session.exec(delete(AtelierLoadRow).where(AtelierLoadRow.id.in_(batch.scalar_subquery()))).rowcount
+        session.commit()
+        removed += count
+        if count < batch_size:
+            break
+
+    load = get_load(session, load_id)
+    load.cleaned_at = datetime.utcnow()
+    session.add(load)
+    session.commit()
+    return removed
@@ -0,0 +1,40 @@
+from sqlalchemy import cast, func, literal, literal_column, or_, tuple_
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+
+from .models.atelier import Atelier
+
+# Colonne tsvector générée par la migration (configuration french, non déclarée dans le modèle)
+search_vector = literal_column("atelier.search_vector")
+
+
+# Fonction pour construire la requête de recherche classée
+# Correspondance plein texte (GIN sur search_vector) ou approchante (trigrammes sur title / location)
+def build_search(q: str, category: str = None, after: dict = None, limit: int = 20):
+    tsquery = func.websearch_to_tsquery("french", q)
+    term = literal(q)
+    rank = cast(
+        func.ts_rank_cd(search_vector, tsquery)
+        + func.greatest(
+            func.word_similarity(term, Atelier.title),
+            func.word_similarity(term, func.coalesce(Atelier.location, "")),
+        ),
+        DOUBLE_PRECISION,
+    ).label("rank")
+
+    matches = or_(
+        search_vector.op("@@")(tsquery),
+        term.op("<%")(Atelier.title),
+        term.op("<%")(Atelier.location),
+    )
+    inner = select(Atelier, rank).where(matches)
+    if category:
+        inner = inner.where(Atelier.category == category)
+
+    ranked = inner.subquery()
+    hit = aliased(Atelier, ranked)
+    statement = select(hit, ranked.c.rank)
+    if after:
+        statement = statement.where(tuple_(ranked.c.rank, ranked.c.id) < tuple_(after["rank"], after["id"]))
+    return statement.order_by(ranked.c.rank.desc(), ranked.c.id.desc()).limit(limit)
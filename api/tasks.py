@@ -1,34 +1,411 @@
+import json
+import os
+import signal
 import subprocess
-import re
+import tempfile
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+
+from celery import chord, group
+from celery.utils import uuid
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_shutdown,
+    worker_shutting_down,
+)
+from celery.utils.log import get_task_logger
+from sqlalchemy import update
+from sqlmodel import Session, select
 
 from .celery_config import celery_app
+from .database import engine
+from .facets import refresh_facets
+from .metrics import CELERY_TASK_DURATION, CELERY_TASK_QUEUE_WAIT, mark_process_dead, start_metrics_server
+from .models.crawl_log import CrawlLog, CrawlProfile, CrawlProfiling, CrawlRunner, CrawlStatus, ShardStrategy
+from .refresh import clean_load, fail_load, promote_load
+
+logger = get_task_logger(__name__)
+
+CRAWL_TIMEOUT = 1800
+PROGRESS_INTERVAL = 5
+GRACEFUL_STOP_TIMEOUT = 60
+DEFAULT_CRAWL_RUNNER = os.getenv("CRAWL_RUNNER", CrawlRunner.inprocess.value)
+CRAWL_STATE_DIR = os.path.abspath(os.getenv("CRAWL_STATE_DIR", ".crawls"))
+# Répertoire des profils en cours d'écriture (le profil est copié dans crawlprofile en fin de crawl)
+CRAWL_PROFILE_DIR = os.path.abspath(os.getenv("CRAWL_PROFILE_DIR", os.path.join(CRAWL_STATE_DIR, "profiles")))
+# Fichier et type de contenu des profils, par mode de profilage
+PROFILE_FILES = {
+    CrawlProfiling.sampling.value: ("folded.txt", "text/plain; charset=utf-8"),
+    CrawlProfiling.callbacks.value: ("pstats", "application/octet-stream"),
+}
+
+# Sous-processus `scrapy crawl` en cours, arrêtés proprement à l'arrêt du worker
+running_processes = set()
+running_processes_lock = threading.Lock()
+
+# Port du serveur /metrics du worker Celery (0: désactivé), à utiliser avec PROMETHEUS_MULTIPROC_DIR
+# pour exposer aussi les métriques des processus enfants et des crawls
+CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", 0))
+# Position de l'argument spider_name des tâches de crawl (label "spider" des métriques)
+SPIDER_ARG_POSITIONS = {"run_scrapy_spider": 0, "aggregate_crawl_shards": 1}
+# Statistique des lots d'ateliers non écrits (pipelines API et COPY): un chargement incomplet n'est jamais promu
+BATCHES_FAILED_STAT = "database_pipeline/batches_failed"
+# Début d'exécution des tâches en cours, par task_id
+task_started = {}
+
+
+# Fonction pour obtenir le répertoire d'état (JOBDIR) d'un crawl reprenable
+def crawl_jobdir(crawl_id: str) -> str:
+    return os.path.join(CRAWL_STATE_DIR, crawl_id)
+
+
+# Fonction pour savoir si un crawl (ou l'un de ses shards) a déjà un état à reprendre
+# Appelée par le worker: le JOBDIR est sur son système de fichiers, pas forcément sur celui de l'API
+def crawl_state_exists(crawl_id: str) -> bool:
+    if os.path.isdir(crawl_jobdir(crawl_id)):
+        return True
+    prefix = f"{crawl_id}-shard"
+    return os.path.isdir(CRAWL_STATE_DIR) and any(name.startswith(prefix) for name in os.listdir(CRAWL_STATE_DIR))
+
+
+# Arrêt du worker: les crawls en cours sont arrêtés proprement pour que leur frontière soit sauvegardée
+@worker_shutting_down.connect
+def stop_crawls_on_shutdown(**kwargs):
+    from .crawler import in_process_runner
+    in_process_runner.stop_all()
+    with running_processes_lock:
+        for process in running_processes:
+            process.send_signal(signal.SIGINT)
+
+
+# Démarrage du worker: exposition de /metrics (processus principal)
+@worker_init.connect
+def start_worker_metrics(**kwargs):
+    if CELERY_METRICS_PORT:
+        start_metrics_server(CELERY_METRICS_PORT)
+
+
+# Arrêt d'un processus enfant du worker: ses gauges ne sont plus comptées
+@worker_process_shutdown.connect
+def forget_worker_process_metrics(pid=None, **kwargs):
+    mark_process_dead(pid or os.getpid())
+
+
+# Envoi d'une tâche (API ou worker): horodatage pour mesurer son attente dans la file
+@before_task_publish.connect
+def stamp_task_published(headers=None, **kwargs):
+    if headers is not None:
+        headers["published_at"] = time.time()
+
+
+# Fonction pour retrouver le spider d'une tâche de crawl ("" pour les autres tâches)
+def task_spider(task, args, kwargs) -> str:
+    if kwargs and kwargs.get("spider_name"):
+        return kwargs["spider_name"]
+    position = SPIDER_ARG_POSITIONS.get(task.name.rsplit(".", 1)[-1])
+    if position is not None and args and len(args) > position:
+        return str(args[position])
+    return ""
+
+
+# Démarrage d'une tâche: temps passé dans la file depuis son envoi
+@task_prerun.connect
+def record_task_queue_wait(task_id=None, task=None, args=None, kwargs=None, **extra):
+    task_started[task_id] = time.monotonic()
+    published_at = task.request.get("published_at")
+    if published_at:
+        CELERY_TASK_QUEUE_WAIT.labels(task.name, task_spider(task, args, kwargs)).observe(
+            max(time.time() - float(published_at), 0)
+        )
+
+
+# Fin d'une tâche: durée d'exécution et état final
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, args=None, kwargs=None, state=None, **extra):
+    started = task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_DURATION.labels(task.name, task_spider(task, args, kwargs), state or "UNKNOWN").observe(
+            time.monotonic() - started
+        )
+
+
+# Fonction pour réconcilier les facettes précalculées en fin de crawl
+def refresh_facets_after_crawl():
+    try:
+        with Session(engine) as session:
+            refresh_facets(session)
+    except Exception as e:
+        logger.warning(f"Erreur lors du recalcul des facettes: {str(e)}")
+
+
+# Tâche Celery pour supprimer en arrière-plan les lignes d'un chargement complet terminé
+@celery_app.task
+def clean_catalog_load(load_id: int):
+    with Session(engine) as session:
+        removed = clean_load(session, load_id)
+    return {"load_id": load_id, "removed": removed}
+
+
+# Fonction pour appliquer au catalogue le chargement complet d'un crawl réussi
+def promote_catalog_load(load_id: int) -> dict:
+    with Session(engine) as session:
+        load = promote_load(session, load_id)
+        result = {
+            "load_id": load.id,
+            "staged": load.staged,
+            "inserted": load.inserted,
+            "updated": load.updated,
+            "deleted": load.deleted,
+        }
+    clean_catalog_load.delay(load_id)
+    return result
+
+
+# Fonction pour abandonner le chargement complet d'un crawl en échec (le catalogue en ligne reste inchangé)
+def abandon_catalog_load(load_id: int, error_message: str):
+    try:
+        with Session(engine) as session:
+            fail_load(session, load_id, error_message)
+        clean_catalog_load.delay(load_id)
+    except Exception as e:
+        logger.warning(f"Erreur lors de l'abandon du chargement {load_id}: {str(e)}")
+
+
+# Fonction pour obtenir le fichier dans lequel le crawl écrit son profil
+def crawl_profile_path(task_id: str, profiling: str) -> str:
+    os.makedirs(CRAWL_PROFILE_DIR, exist_ok=True)
+    return os.path.join(CRAWL_PROFILE_DIR, f"{task_id}.{PROFILE_FILES[profiling][0]}")
+
+
+# Fonction pour enregistrer le profil d'un crawl (terminé, en échec ou interrompu) avec son CrawlLog
+def save_crawl_profile(task_id: str, profiling: str, path: str):
+    if not os.path.exists(path):
+        logger.warning(f"Aucun profil écrit par le crawl {task_id}")
+        return
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+        extension, content_type = PROFILE_FILES[profiling]
+        with Session(engine) as session:
+            crawl_log = session.exec(select(CrawlLog).where(CrawlLog.task_id == task_id)).first()
+            if crawl_log is None:
+                logger.warning(f"Profil du crawl {task_id} ignoré: log du crawl introuvable")
+                return
+            session.add(CrawlProfile(
+                crawl_log_id=crawl_log.id,
+                mode=profiling,
+                filename=f"{crawl_log.spider_name}-{task_id}.{extension}",
+                content_type=content_type,
+                size=len(content),
+                content=content,
+            ))
+            session.commit()
+    except Exception as e:
+        logger.warning(f"Erreur lors de l'enregistrement du profil du crawl {task_id}: {str(e)}")
+    finally:
+        os.remove(path)
+
+
+# Fonction pour vérifier qu'un crawl est allé jusqu'au bout (un crawl interrompu ne doit pas remplacer le catalogue)
+# Un crawl arrêté par CLOSESPIDER_TIMEOUT se termine normalement mais avec finish_reason "closespider_timeout",
+# et un lot non écrit laisserait des ateliers absents du chargement, supprimés à la promotion
+def check_crawl_complete(result: dict, load_id: int):
+    finish_reason = result.get("finish_reason")
+    if finish_reason != "finished":
+        raise Exception(f"Crawl incomplet ({finish_reason or 'raison de fin inconnue'}): chargement {load_id} non promu")
+    if result.get("batches_failed"):
+        raise Exception(f"{result['batches_failed']} lots non chargés: chargement {load_id} non promu")
+
+
+# Fonction pour mettre à jour le log du crawl pendant et à la fin de la tâche
+def update_crawl_log(task_id: str, **fields):
+    try:
+        with Session(engine) as session:
+            session.exec(
+                update(CrawlLog)
+                .where(CrawlLog.task_id == task_id)
+                .values(updated_at=datetime.utcnow(), **fields)
+            )
+            session.commit()
+    except Exception as e:
+        logger.warning(f"Erreur lors de la mise à jour du log du crawl {task_id}: {str(e)}")
+
+
+# Fonction pour lancer le crawl dans un sous-processus `scrapy crawl` (isolation complète)
+# Les stats du crawl sont écrites en JSON par l'extension CrawlStatsFile, dans un fichier temporaire
+def run_subprocess_crawl(spider_name: str, spider_args: dict = None, settings: dict = None) -> dict:
+    fd, stats_path = tempfile.mkstemp(prefix="crawl-stats-", suffix=".json")
+    os.close(fd)
+    settings = {**(settings or {}), "CRAWL_STATS_PATH": stats_path}
+
+    command = ["scrapy", "crawl", spider_name]
+    for key, value in (spider_args or {}).items():
+        command += ["-a", f"{key}={value}"]
+    for key, value in settings.items():
+        command += ["-s", f"{key}={value}"]
+
+    try:
+        process = subprocess.Popen(
+            command,
+            cwd="./scrapping",
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        with running_processes_lock:
+            running_processes.add(process)
+        try:
+            try:
+                stdout, stderr = process.communicate(timeout=CRAWL_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                # SIGINT: Scrapy s'arrête proprement et sauvegarde la frontière (JOBDIR) avant de quitter
+                process.send_signal(signal.SIGINT)
+                try:
+                    process.communicate(timeout=GRACEFUL_STOP_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.communicate()
+                raise
+        finally:
+            with running_processes_lock:
+                running_processes.discard(process)
+
+        stats = read_crawl_stats(stats_path)
+    finally:
+        os.remove(stats_path)
+
+    error_msg = None
+    if process.returncode != 0:
+        error_msg = stderr or stdout or 'Erreur inconnue'
+    return {
+        "items_scraped": stats.get("item_scraped_count", 0),
+        "pages_crawled": stats.get("response_received_count"),
+        "errors_count": stats.get("log_count/ERROR"),
+        "finish_reason": stats.get("finish_reason"),
+        "batches_failed": stats.get(BATCHES_FAILED_STAT, 0),
+        "error_msg": error_msg,
+    }
+
+
+# Fonction pour lire les stats écrites par CrawlStatsFile ({} si le crawl s'est arrêté avant de les écrire)
+def read_crawl_stats(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Fonction pour lancer le crawl dans le worker (CrawlerRunner), avec suivi des stats pendant le crawl
+# La progression est écrite dans le CrawlLog de log_task_id (aucun pour un shard: ses compteurs ne couvrent qu'une partie du crawl)
+def run_in_process_crawl(task, spider_name: str, spider_args: dict = None, settings: dict = None,
+                         log_task_id: str = None) -> dict:
+    from .crawler import in_process_runner
+
+    running = in_process_runner.crawl(spider_name, spider_args, settings)
+    deadline = time.monotonic() + CRAWL_TIMEOUT
+
+    while True:
+        try:
+            stats = running.future.result(timeout=PROGRESS_INTERVAL)
+            break
+        except FutureTimeoutError:
+            pass
+
+        if time.monotonic() > deadline:
+            # Arrêt propre: on attend que la frontière soit sauvegardée avant de rendre la main
+            in_process_runner.stop(running)
+            try:
+                running.future.result(timeout=GRACEFUL_STOP_TIMEOUT)
+            except Exception:
+                pass
+            raise subprocess.TimeoutExpired(spider_name, CRAWL_TIMEOUT)
+
+        progress = {
+            "items_scraped": running.stat("item_scraped_count"),
+            "pages_crawled": running.stat("response_received_count"),
+            "errors_count": running.stat("log_count/ERROR"),
+        }
+        task.update_state(state='PROGRESS', meta={'current': 0, 'total': 100, 'status': 'Crawl en cours', **progress})
+        if log_task_id:
+            update_crawl_log(log_task_id, status=CrawlStatus.PROGRESS.value, **progress)
+
+    return {
+        "items_scraped": stats.get("item_scraped_count", 0),
+        "pages_crawled": stats.get("response_received_count", 0),
+        "errors_count": stats.get("log_count/ERROR", 0),
+        "finish_reason": stats.get("finish_reason"),
+        "batches_failed": stats.get(BATCHES_FAILED_STAT, 0),
+        "error_msg": None,
+    }
+
+
+# Fonction pour répartir le budget de politesse entre les shards lancés en parallèle
+# Sans limiteur partagé, chaque shard ralentit d'un facteur égal au nombre de shards: le débit total vers le site reste inchangé
+def politeness_settings(shard_count: int) -> dict:
+    if shard_count <= 1:
+        return {}
+
+    from .crawler import get_crawl_settings
+    base = get_crawl_settings()
+
+    # Le limiteur Redis partage déjà le budget entre tous les processus
+    if base.getbool("REDIS_RATE_LIMIT_ENABLED"):
+        return {}
+
+    return {
+        "DOWNLOAD_DELAY": base.getfloat("DOWNLOAD_DELAY") * shard_count,
+        "AUTOTHROTTLE_START_DELAY": base.getfloat("AUTOTHROTTLE_START_DELAY") * shard_count,
+        "AUTOTHROTTLE_MAX_DELAY": base.getfloat("AUTOTHROTTLE_MAX_DELAY") * shard_count,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": base.getfloat("AUTOTHROTTLE_TARGET_CONCURRENCY") / shard_count,
+    }
+
 
 # Tâche Celery pour démarrer un crawl
+# En mode shard, la tâche ne lève pas d'exception en cas d'échec: le résultat est agrégé par le chord
+# Un shard n'a pas de CrawlLog: il passe celui du crawl parent (parent_task_id) en STARTED, le callback du chord écrit le reste
+# Avec un crawl_id, la frontière est persistée dans CRAWL_STATE_DIR et reprise par la tâche suivante de même crawl_id
+# Avec un load_id (mode full_refresh), les ateliers sont chargés à part et promus seulement si le crawl est complet
+# Avec profiling, le profil du crawl est enregistré avec son CrawlLog, même en cas d'échec ou de timeout
 @celery_app.task(bind=True)
-def run_scrapy_spider(self, spider_name: str):
+def run_scrapy_spider(self, spider_name: str, runner: str = None, spider_args: dict = None,
+                      shard_count: int = 1, shard: bool = False, crawl_id: str = None, load_id: int = None,
+                      profiling: str = None, parent_task_id: str = None):
+    runner = runner or DEFAULT_CRAWL_RUNNER
+    resumed = crawl_state_exists(crawl_id) if crawl_id else None
     
-    self.update_state(state='PROGRESS', meta={'current': 0, 'total': 100, 'status': 'Démarrage du spider...'})
+    self.update_state(state='PROGRESS', meta={'current': 0, 'total': 100, 'status': 'Démarrage du spider...', 'resumed': resumed})
+    if shard:
+        if parent_task_id:
+            update_crawl_log(parent_task_id, status=CrawlStatus.STARTED.value)
+    else:
+        update_crawl_log(self.request.id, status=CrawlStatus.STARTED.value, resumed=resumed)
     
     try:
+        settings = politeness_settings(shard_count)
+        if crawl_id:
+            settings["JOBDIR"] = crawl_jobdir(crawl_id)
+        if load_id:
+            settings["CATALOG_LOAD_ID"] = load_id
+        if profiling:
+            settings["CRAWL_PROFILE"] = profiling
+            settings["CRAWL_PROFILE_PATH"] = crawl_profile_path(self.request.id, profiling)
+
         # Lancement du crawl avec Scrapy
-        result = subprocess.run(
-            ["scrapy", "crawl", spider_name],
-            cwd="./scrapping",
-            timeout=1800,
-            capture_output=True,
-            text=True
-        )
-        
-        # Récupération du nombre d'items scrapés
-        items_scraped = 0
-        if result.stdout:
-            match = re.search(r"'item_scraped_count':\s*(\d+)", result.stdout)
-            if match:
-                items_scraped = int(match.group(1))
+        if runner == CrawlRunner.subprocess.value:
+            result = run_subprocess_crawl(spider_name, spider_args, settings)
+        else:
+            result = run_in_process_crawl(self, spider_name, spider_args, settings, None if shard else self.request.id)
+        items_scraped = result["items_scraped"]
         
         # Gestion des erreurs
-        if result.returncode != 0:
-            error_msg = result.stderr or result.stdout or 'Erreur inconnue'
+        if result["error_msg"]:
+            error_msg = result["error_msg"]
             self.update_state(
                 state='FAILURE',
                 meta={
@@ -40,7 +417,16 @@ def run_scrapy_spider(self, spider_name: str):
                 }
             )
             raise Exception(f"Erreur lors du crawl: {error_msg}")
-        
+
+        catalog_load = None
+        if load_id:
+            check_crawl_complete(result, load_id)
+            if not shard:
+                catalog_load = promote_catalog_load(load_id)
+
+        if not shard:
+            refresh_facets_after_crawl()
+
         # Mise à jour du statut du crawl
         self.update_state(
             state='SUCCESS',
@@ -51,25 +437,47 @@ def run_scrapy_spider(self, spider_name: str):
                 'items_scraped': items_scraped
             }
         )
+        if not shard:
+            update_crawl_log(
+                self.request.id,
+                status=CrawlStatus.SUCCESS.value,
+                items_scraped=items_scraped,
+                pages_crawled=result["pages_crawled"],
+                errors_count=result["errors_count"],
+                completed_at=datetime.utcnow(),
+            )
                 
         # Retour du statut du crawl
         return {
             "status": "success",
             "message": f"Crawl {spider_name} terminé avec succès",
-            "items_scraped": items_scraped
+            "items_scraped": items_scraped,
+            "pages_crawled": result["pages_crawled"],
+            "errors_count": result["errors_count"],
+            "finish_reason": result.get("finish_reason"),
+            "crawl_id": crawl_id,
+            "resumed": resumed,
+            "catalog_load": catalog_load,
+            "spider_args": spider_args,
         }
     except subprocess.TimeoutExpired:
         # Gestion du timeout
+        error_msg = f"Timeout: le crawl {spider_name} a pris plus de 30 minutes"
         self.update_state(
             state='FAILURE',
             meta={
                 'current': 0,
                 'total': 100,
                 'status': 'Timeout',
-                'error_msg': f"Timeout: le crawl {spider_name} a pris plus de 30 minutes"
+                'error_msg': error_msg
             }
         )
-        raise Exception(f"Timeout: le crawl {spider_name} a pris plus de 30 minutes")
+        if shard:
+            return {"status": "failed", "error_msg": error_msg, "items_scraped": 0, "resumed": resumed, "spider_args": spider_args}
+        update_crawl_log(self.request.id, status=CrawlStatus.TIMEOUT.value, completed_at=datetime.utcnow())
+        if load_id:
+            abandon_catalog_load(load_id, error_msg)
+        raise Exception(error_msg)
     except Exception as e:
         error_msg = str(e)
         # Gestion des erreurs
@@ -82,4 +490,103 @@ def run_scrapy_spider(self, spider_name: str):
                 'error_msg': error_msg
             }
         )
+        if shard:
+            return {"status": "failed", "error_msg": error_msg, "items_scraped": 0, "resumed": resumed, "spider_args": spider_args}
+        update_crawl_log(self.request.id, status=CrawlStatus.FAILED.value, error_message=error_msg, completed_at=datetime.utcnow())
+        if load_id:
+            abandon_catalog_load(load_id, error_msg)
         raise
+    finally:
+        if profiling:
+            save_crawl_profile(self.request.id, profiling, crawl_profile_path(self.request.id, profiling))
+
+
+# Tâche Celery (callback du chord) pour agréger les résultats des shards dans le CrawlLog parent
+# En mode full_refresh, le chargement commun n'est promu que si tous les shards ont réussi
+@celery_app.task(bind=True)
+def aggregate_crawl_shards(self, results: list, spider_name: str, load_id: int = None):
+    items_scraped = sum(r.get("items_scraped") or 0 for r in results)
+    pages_crawled = sum(r.get("pages_crawled") or 0 for r in results)
+    failed = [r for r in results if r.get("status") != "success"]
+    errors_count = sum(r.get("errors_count") or 0 for r in results) + len(failed)
+    # Reprise d'un crawl réparti: au moins un shard a repris sa frontière (None sans crawl_id)
+    flags = [r.get("resumed") for r in results if r.get("resumed") is not None]
+    resumed = any(flags) if flags else None
+
+    error_message = None
+    if failed:
+        error_message = "\n".join(f"{r.get('spider_args')}: {r.get('error_msg')}" for r in failed)
+
+    # Un crawl complet partiel n'est jamais promu: le crawl entier est en échec
+    catalog_load = None
+    load_failed = False
+    if load_id:
+        if failed:
+            abandon_catalog_load(load_id, error_message)
+            load_failed = True
+        else:
+            try:
+                catalog_load = promote_catalog_load(load_id)
+            except Exception as e:
+                error_message = f"Erreur lors de la promotion du chargement {load_id}: {str(e)}"
+                abandon_catalog_load(load_id, error_message)
+                load_failed = True
+
+    refresh_facets_after_crawl()
+
+    update_crawl_log(
+        self.request.id,
+        status=CrawlStatus.FAILED.value if load_failed or len(failed) == len(results) else CrawlStatus.SUCCESS.value,
+        items_scraped=items_scraped,
+        pages_crawled=pages_crawled,
+        errors_count=errors_count,
+        error_message=error_message,
+        resumed=resumed,
+        completed_at=datetime.utcnow(),
+    )
+
+    return {
+        "status": "failed" if load_failed else "success" if not failed else "partial" if len(failed) < len(results) else "failed",
+        "message": f"Crawl {spider_name} terminé: {len(results) - len(failed)}/{len(results)} shards réussis",
+        "items_scraped": items_scraped,
+        "pages_crawled": pages_crawled,
+        "errors_count": errors_count,
+        "resumed": resumed,
+        "catalog_load": catalog_load,
+        "shards": results,
+    }
+
+
+# Fonction pour construire les arguments du spider de chaque shard
+def build_shards(strategy: str, shard_count: int, shard_values: list, max_pages: int) -> list:
+    if strategy in (ShardStrategy.category.value, ShardStrategy.city.value):
+        if not shard_values:
+            raise ValueError(f"shard_values est requis pour un découpage par {strategy}")
+        return [{"shard_by": strategy, "shard_value": value, "max_pages": max_pages} for value in shard_values]
+
+    # Découpage en plages de pages contiguës
+    shard_count = max(1, min(shard_count, max_pages))
+    size, extra = divmod(max_pages, shard_count)
+    shards = []
+    start = 1
+    for i in range(shard_count):
+        end = start + size - 1 + (1 if i < extra else 0)
+        shards.append({"start_page": start, "max_pages": end})
+        start = end + 1
+    return shards
+
+
+# Fonction pour lancer un crawl réparti: une sous-tâche par shard, jointes par un chord
+# Chaque shard d'un crawl reprenable a sa propre frontière ({crawl_id}-shard{n})
+# En mode full_refresh, tous les shards chargent dans le même chargement (load_id)
+# L'identifiant du callback est fixé d'avance: c'est la tâche du CrawlLog, que les shards mettent à jour
+def start_sharded_crawl(spider_name: str, shards: list, runner: str = None, crawl_id: str = None, load_id: int = None):
+    parent_task_id = uuid()
+    header = group(
+        run_scrapy_spider.s(
+            spider_name, runner, spider_args, len(shards), True,
+            f"{crawl_id}-shard{index}" if crawl_id else None, load_id, parent_task_id=parent_task_id,
+        )
+        for index, spider_args in enumerate(shards)
+    )
+    return chord(header)(aggregate_crawl_shards.s(spider_name, load_id).set(task_id=parent_task_id))
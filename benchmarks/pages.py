@@ -0,0 +1,77 @@
+import json
+import os
+import random
+from html import escape
+
+from scrapy.http import HtmlResponse
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), "..", "scrapping", "test_output.json")
+LISTING_URL = "https://wecandoo.fr/ateliers"
+
+CARD_TEMPLATE = (
+    "<a href='{href}' class='w-card'>"
+    "<div class='w-card__image'><img src='/img/{slug}.jpg' alt=''></div>"
+    "<div class='w-card__body'>"
+    "<p class='w-typo--footnote-serif'>{category}</p>"
+    "<h3>{title}</h3>"
+    "<p class='w-typo--caption'><span>{duration}</span> · <span>{location}</span></p>"
+    "<span class='w-typo--h6'><span>{price}</span></span>"
+    "</div></a>"
+)
+
+
+# Fonction pour charger les valeurs réelles de l'échantillon (catégories, durées, lieux, titres)
+def load_vocabulary():
+    with open(SAMPLE_PATH, encoding="utf-8") as f:
+        sample = json.load(f)
+    return {
+        field: sorted({row[field] for row in sample if row.get(field) is not None}, key=str)
+        for field in ("title", "category", "price", "duration", "location")
+    }
+
+
+# Fonction pour générer les cartes d'une page de liste synthétique (déterministe pour une graine donnée)
+# Quelques cartes sont incomplètes (sans lieu, sans prix) comme sur le site
+def generate_cards(count: int, seed: int = 0):
+    vocabulary = load_vocabulary()
+    rng = random.Random(seed)
+    cards = []
+    for i in range(count):
+        title = f"{rng.choice(vocabulary['title'])} #{i}"
+        cards.append({
+            "slug": f"atelier-{seed}-{i}",
+            "title": title,
+            "category": rng.choice(vocabulary["category"]),
+            "price": None if i % 97 == 0 else f"{rng.choice(vocabulary['price']):g} €",
+            "duration": rng.choice(vocabulary["duration"]),
+            "location": None if i % 53 == 0 else rng.choice(vocabulary["location"]),
+        })
+    return cards
+
+
+# Fonction pour produire le HTML d'une page de liste au format Wecandoo
+def render_listing(cards, page_num: int = 1) -> bytes:
+    parts = ["<!DOCTYPE html><html><head><meta charset='utf-8'><title>Ateliers</title></head><body><main>"]
+    for card in cards:
+        html = CARD_TEMPLATE.format(
+            href=f"/atelier/{card['slug']}",
+            slug=card["slug"],
+            category=escape(card["category"]),
+            title=escape(card["title"]),
+            duration=escape(card["duration"]),
+            location=escape(card["location"] or ""),
+            price=escape(card["price"] or ""),
+        )
+        if card["location"] is None:
+            html = html.replace(" · <span></span>", "")
+        if card["price"] is None:
+            html = html.replace("<span class='w-typo--h6'><span></span></span>", "")
+        parts.append(html)
+    parts.append(f"<nav><a href='/ateliers?page={page_num + 1}'>Suivant</a></nav>")
+    parts.append("</main></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+# Fonction pour construire une réponse Scrapy à partir du HTML (nouvel objet: aucun arbre déjà parsé)
+def listing_response(body: bytes) -> HtmlResponse:
+    return HtmlResponse(url=LISTING_URL, body=body, encoding="utf-8")
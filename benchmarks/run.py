@@ -0,0 +1,329 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from itemadapter import ItemAdapter
+from scrapy.utils.test import get_crawler
+
+from api.normalize import content_hash, normalize_atelier
+from benchmarks.pages import generate_cards, listing_response, render_listing
+from scrapping.extraction import extract_pagination_links
+from scrapping.items import AtelierItem
+from scrapping.pipelines import AtelierPipeline, DatabasePipeline, PostgresCopyPipeline
+from scrapping.spiders.wecandoo import WecandooSpider
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_SIZES = (1000, 10000, 50000)
+INGEST_BATCH_SIZE = 50
+COPY_BATCH_SIZE = 1000
+CALIBRATION_SIZE = 5000
+CALIBRATION_REPEAT = 5
+
+
+# Fonction pour créer les items bruts d'une page (tels que produits par le spider, avant normalisation)
+def raw_items(cards):
+    return [
+        AtelierItem(
+            title=f"  {card['title']} ",
+            url=f"/atelier/{card['slug']}",
+            category=card["category"],
+            price=card["price"],
+            duration=card["duration"],
+            location=card["location"],
+        )
+        for card in cards
+    ]
+
+
+# Fonction pour créer les items normalisés d'une page
+def normalized_items(cards, spider):
+    pipeline = AtelierPipeline()
+    return [pipeline.process_item(item, spider) for item in raw_items(cards)]
+
+
+# Étape d'extraction: parsing du HTML, extraction des cartes et des liens, dédoublonnage du spider
+class ExtractStage:
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.name = f"extract/{extractor}"
+
+    def setup(self, cards, body):
+        return WecandooSpider(extractor=self.extractor), body
+
+    def run(self, state):
+        spider, body = state
+        response = listing_response(body)
+        items = list(spider.items_from_cards(spider.extract_listing(response)))
+        extract_pagination_links(response)
+        return len(items)
+
+
+# Étape de normalisation: AtelierPipeline.process_item sur des items bruts
+class NormalizeStage:
+    name = "normalize"
+
+    def setup(self, cards, body):
+        return WecandooSpider(), AtelierPipeline(), raw_items(cards)
+
+    def run(self, state):
+        spider, pipeline, items = state
+        for item in items:
+            pipeline.process_item(item, spider)
+        return len(items)
+
+
+# Étape de mise en buffer: DatabasePipeline.process_item (routage sur l'index des URLs et empreintes, sans envoi)
+# La moitié des URLs sont déjà connues de l'index avec la même empreinte, comme lors d'un crawl de mise à jour
+class BufferStage:
+    name = "buffer"
+
+    def setup(self, cards, body):
+        spider = WecandooSpider()
+        spider.crawler = get_crawler(WecandooSpider)
+        items = normalized_items(cards, spider)
+        pipeline = DatabasePipeline(streaming=False)
+        pipeline.existing_urls = {
+            row["url"]: content_hash(normalize_atelier(row))
+            for row in (ItemAdapter(item).asdict() for item in items[::2])
+        }
+        return spider, pipeline, items
+
+    def run(self, state):
+        spider, pipeline, items = state
+        for item in items:
+            pipeline.process_item(item, spider)
+        return len(items)
+
+
+# Étape d'ingestion de bout en bout: POST /ateliers/batch (create_ateliers_batch) par lots de INGEST_BATCH_SIZE,
+# sur une base PostgreSQL dédiée. Chaque lot part du corps JSON, validé comme par FastAPI, et la réponse est sérialisée
+# avec son response_model (seule la couche HTTP n'est pas mesurée)
+# "ingest" part d'une table vide, "ingest/unchanged" renvoie des ateliers déjà enregistrés
+class IngestStage:
+
+    def __init__(self, database_url, preload=False):
+        from sqlmodel import SQLModel, create_engine
+
+        import api.models.catalog, api.models.crawl_log, api.models.facet, api.models.recrawl  # noqa: F401
+        from api.migrations import run_migrations
+
+        self.name = "ingest/unchanged" if preload else "ingest"
+        self.preload = preload
+        self.engine = create_engine(database_url)
+        SQLModel.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+
+    def _reset(self):
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            conn.execute(text("TRUNCATE atelier RESTART IDENTITY CASCADE"))
+
+    def _ingest(self, session, bodies):
+        from typing import List
+
+        from pydantic import TypeAdapter
+
+        from api.main import create_ateliers_batch
+        from api.models.atelier import Atelier, AtelierCreate, ConflictMode
+
+        request, response = TypeAdapter(List[AtelierCreate]), TypeAdapter(List[Atelier])
+        for body in bodies:
+            written = create_ateliers_batch(request.validate_json(body), session=session, on_conflict=ConflictMode.update)
+            response.dump_json(written)
+
+    def setup(self, cards, body):
+        from sqlmodel import Session
+
+        spider = WecandooSpider()
+        rows = [ItemAdapter(item).asdict() for item in normalized_items(cards, spider)]
+        bodies = [json.dumps(rows[i:i + INGEST_BATCH_SIZE]) for i in range(0, len(rows), INGEST_BATCH_SIZE)]
+        self._reset()
+        session = Session(self.engine)
+        if self.preload:
+            self._ingest(session, bodies)
+        return session, bodies, len(rows)
+
+    def run(self, state):
+        session, bodies, count = state
+        try:
+            self._ingest(session, bodies)
+        finally:
+            session.close()
+        return count
+
+
+# Étape d'écriture directe: PostgresCopyPipeline (COPY dans la table de staging puis fusion) par lots de COPY_BATCH_SIZE
+class CopyIngestStage(IngestStage):
+
+    def __init__(self, database_url):
+        super().__init__(database_url)
+        self.name = "ingest/copy"
+
+    def setup(self, cards, body):
+        spider = WecandooSpider()
+        rows = [ItemAdapter(item).asdict() for item in normalized_items(cards, spider)]
+        self._reset()
+        pipeline = PostgresCopyPipeline(database_url=self.engine.url, streaming=False)
+        pipeline.engine = self.engine
+        return pipeline, rows
+
+    def run(self, state):
+        pipeline, rows = state
+        for i in range(0, len(rows), COPY_BATCH_SIZE):
+            pipeline._post_batch(rows[i:i + COPY_BATCH_SIZE])
+        return len(rows)
+
+
+# Fonction pour mesurer une étape: meilleur temps sur plusieurs répétitions, puis pic mémoire sur une exécution dédiée
+# (tracemalloc ralentit l'exécution: il n'est jamais actif pendant la mesure du temps)
+def measure(stage, cards, body, repeat):
+    best = None
+    for _ in range(repeat):
+        state = stage.setup(cards, body)
+        gc.collect()
+        start = time.perf_counter()
+        count = stage.run(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del state
+
+    state = stage.setup(cards, body)
+    gc.collect()
+    tracemalloc.start()
+    stage.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+
+    return {
+        "items_per_s": round(count / best, 1),
+        "seconds": round(best, 4),
+        "peak_mib": round(peak / (1024 * 1024), 2),
+    }
+
+
+# Fonction pour mesurer la vitesse de la machine sur une charge fixe, indépendante du code du projet
+# (aller-retour JSON et tri des cartes générées), en éléments par seconde
+# Médiane de plusieurs passes, mesurée juste avant chaque étape pour suivre la charge de la machine
+def calibrate(cards):
+    timings = []
+    for _ in range(CALIBRATION_REPEAT):
+        start = time.perf_counter()
+        rows = json.loads(json.dumps(cards))
+        sorted(rows, key=lambda row: (str(row["category"]), row["title"]))
+        timings.append(time.perf_counter() - start)
+    return round(len(cards) / statistics.median(timings), 1)
+
+
+# Fonction pour comparer un résultat à sa référence: débit en baisse ou mémoire en hausse au-delà du seuil
+# Le débit de référence est ramené à la machine courante par le rapport des calibrations
+def regressions(result, baseline, threshold):
+    found = []
+    expected = baseline["items_per_s"] * result["calibration"] / baseline.get("calibration", result["calibration"])
+    if result["items_per_s"] < expected * (1 - threshold):
+        found.append(f"débit {result['items_per_s']:.0f}/s < {expected:.0f}/s")
+    if result["peak_mib"] > baseline["peak_mib"] * (1 + threshold):
+        found.append(f"mémoire {result['peak_mib']:.2f} Mio > {baseline['peak_mib']:.2f} Mio")
+    return found
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {"results": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, baseline):
+    merged = baseline.get("results", {})
+    for name, sizes in results.items():
+        merged.setdefault(name, {}).update(sizes)
+    data = {
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+        "results": merged,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def build_stages(names):
+    stages = [ExtractStage("compiled"), ExtractStage("css"), NormalizeStage(), BufferStage()]
+    database_url = os.getenv("BENCH_DATABASE_URL")
+    if database_url and (not names or any(name.startswith("ingest") for name in names)):
+        stages += [IngestStage(database_url), IngestStage(database_url, preload=True), CopyIngestStage(database_url)]
+    if names:
+        stages = [stage for stage in stages if stage.name in names]
+    return stages
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks du scraping (extraction, normalisation, buffer, ingestion)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Nombre de cartes par page")
+    parser.add_argument("--stages", nargs="+", help="Étapes à mesurer (toutes par défaut)")
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions par mesure (le meilleur temps est gardé)")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_THRESHOLD", 0.2)),
+                        help="Régression tolérée (0.2 = 20%% de débit en moins ou de mémoire en plus)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Fichier JSON des références")
+    parser.add_argument("--update-baseline", action="store_true", help="Enregistrer les résultats comme références")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = load_baseline(args.baseline)
+    stages = build_stages(args.stages)
+    if not os.getenv("BENCH_DATABASE_URL"):
+        print("BENCH_DATABASE_URL non défini: étapes d'ingestion ignorées")
+
+    calibration_cards = generate_cards(CALIBRATION_SIZE)
+
+    results = {}
+    failures = []
+    for size in args.sizes:
+        cards = generate_cards(size)
+        body = render_listing(cards)
+        for stage in stages:
+            calibration = calibrate(calibration_cards)
+            result = {**measure(stage, cards, body, args.repeat), "calibration": calibration}
+            results.setdefault(stage.name, {})[str(size)] = result
+
+            # Une étape sans référence est un échec: elle ne serait jamais comparée
+            reference = baseline["results"].get(stage.name, {}).get(str(size))
+            if reference:
+                problems = regressions(result, reference, args.threshold)
+                status = "RÉGRESSION" if problems else "ok"
+            elif args.update_baseline:
+                problems, status = [], "nouveau"
+            else:
+                problems, status = ["aucune référence"], "SANS RÉFÉRENCE"
+            print(
+                f"{stage.name:<18} {size:>6} cartes  {result['items_per_s']:>10.0f} items/s  "
+                f"{result['peak_mib']:>8.2f} Mio  (calibration {calibration:.0f}/s)  {status}"
+                + (f" ({', '.join(problems)})" if problems else "")
+            )
+            failures += [f"{stage.name} [{size}]: {problem}" for problem in problems]
+
+    if args.update_baseline:
+        save_baseline(args.baseline, results, baseline)
+        print(f"Références enregistrées dans {args.baseline}")
+        return 0
+
+    if failures:
+        print(f"{len(failures)} régression(s) au-delà de {args.threshold:.0%} ou référence(s) manquante(s):")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+import asyncio
+import time
+from collections import deque
+from importlib.metadata import version
+
+from scrapy.core.downloader.handlers import DownloadHandlers
+from scrapy.exceptions import NotConfigured
+from scrapy_playwright.handler import ScrapyPlaywrightDownloadHandler
+
+# Mémoire JS de la page (Chromium uniquement, None ailleurs)
+PAGE_HEAP_SCRIPT = "() => (performance.memory ? performance.memory.usedJSHeapSize : null)"
+
+# Versions de scrapy-playwright dont les API internes utilisées par le pool ont été vérifiées
+# (ScrapyPlaywrightDownloadHandler._create_page et context_wrappers, DownloadHandlers._get_handler)
+PLAYWRIGHT_POOL_SUPPORTED_VERSIONS = ("0.0.41",)
+
+
+# Fonction pour vérifier que les API internes utilisées par le pool existent dans les versions installées
+# Le pool est désactivé (NotConfigured) plutôt que de laisser des pages prises après une mise à jour
+def check_playwright_internals():
+    installed = version("scrapy-playwright")
+    if installed not in PLAYWRIGHT_POOL_SUPPORTED_VERSIONS:
+        raise NotConfigured(
+            f"scrapy-playwright {installed} non vérifié pour le pool de pages "
+            f"(versions vérifiées: {', '.join(PLAYWRIGHT_POOL_SUPPORTED_VERSIONS)})"
+        )
+    if not callable(getattr(ScrapyPlaywrightDownloadHandler, "_create_page", None)):
+        raise NotConfigured("ScrapyPlaywrightDownloadHandler._create_page introuvable")
+    if not callable(getattr(DownloadHandlers, "_get_handler", None)):
+        raise NotConfigured("DownloadHandlers._get_handler introuvable")
+
+
+# Fonctions d'accès aux API internes de Scrapy et scrapy-playwright (vérifiées par check_playwright_internals)
+def _download_handler(crawler, scheme):
+    return crawler.engine.downloader.handlers._get_handler(scheme)
+
+
+async def _create_page(handler, request, spider):
+    return await handler._create_page(request=request, spider=spider)
+
+
+def _browser_context(handler, name):
+    wrapper = handler.context_wrappers.get(name)
+    return wrapper.context if wrapper is not None else None
+
+
+# Page du pool et son historique
+class PooledPage:
+
+    def __init__(self, page, context):
+        self.page = page
+        self.context = context
+        self.generation = context.generation
+        self.created = time.monotonic()
+        self.uses = 0
+        self.heap = None
+
+    @property
+    def context_name(self):
+        return self.context.name(self.generation)
+
+    # Page d'un contexte renouvelé depuis sa création
+    @property
+    def stale(self):
+        return self.generation != self.context.generation
+
+
+# Contexte du pool: renouvelé après max_pages pages créées (nouveau nom, l'ancien contexte est fermé
+# quand sa dernière page est retirée)
+class PooledContext:
+
+    def __init__(self, index):
+        self.index = index
+        self.generation = 0
+        self.created_pages = 0
+        self.live = {0: set()}
+
+    def name(self, generation=None):
+        return f"pool-{self.index}-{self.generation if generation is None else generation}"
+
+    def load(self):
+        return len(self.live[self.generation])
+
+
+# Pool de pages Playwright réutilisées d'une requête à l'autre
+# Le nombre de pages (size) borne aussi le nombre de rendus simultanés, indépendamment du délai de politesse:
+# le scroll d'une page se fait pendant l'attente de la requête suivante.
+# Une page est recyclée (fermée puis recréée) après max_uses rendus ou si sa mémoire JS dépasse max_heap_mb
+class PagePool:
+
+    def __init__(self, crawler, size=4, contexts=1, max_uses=20, max_heap_mb=256, context_max_pages=100):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.size = size
+        self.max_uses = max_uses
+        self.max_heap = max_heap_mb * 1024 * 1024
+        self.context_max_pages = context_max_pages
+        self.contexts = [PooledContext(i) for i in range(max(contexts, 1))]
+        self.semaphore = asyncio.Semaphore(size)
+        self.idle = deque()
+        self.leased = {}
+        self.handler = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        check_playwright_internals()
+        settings = crawler.settings
+        return cls(
+            crawler,
+            size=settings.getint('PLAYWRIGHT_POOL_SIZE', 4),
+            contexts=settings.getint('PLAYWRIGHT_POOL_CONTEXTS', 1),
+            max_uses=settings.getint('PLAYWRIGHT_POOL_MAX_USES', 20),
+            max_heap_mb=settings.getint('PLAYWRIGHT_POOL_MAX_HEAP_MB', 256),
+            context_max_pages=settings.getint('PLAYWRIGHT_POOL_CONTEXT_MAX_PAGES', 100),
+        )
+
+    # Fonction pour retrouver le download handler Playwright (éventuellement derrière le cache de pages)
+    def _playwright_handler(self, request):
+        if self.handler is None:
+            handler = _download_handler(self.crawler, request.url.split(":", 1)[0])
+            handler = getattr(handler, 'fallback', None) or handler
+            if isinstance(handler, ScrapyPlaywrightDownloadHandler):
+                if not isinstance(getattr(handler, 'context_wrappers', None), dict):
+                    raise RuntimeError("ScrapyPlaywrightDownloadHandler.context_wrappers introuvable")
+                self.handler = handler
+        return self.handler
+
+    # Fonction pour obtenir une page: page libre du pool, sinon nouvelle page (None si Playwright n'est pas utilisé)
+    async def acquire(self, request, spider):
+        handler = self._playwright_handler(request)
+        if handler is None:
+            return None
+
+        start = time.monotonic()
+        await self.semaphore.acquire()
+        wait_ms = (time.monotonic() - start) * 1000
+        self.stats.inc_value('playwright_pool/acquire_wait_ms', int(wait_ms))
+        self.stats.max_value('playwright_pool/acquire_wait_ms_max', int(wait_ms))
+        self.stats.inc_value('playwright_pool/acquired')
+
+        try:
+            while self.idle:
+                pooled = self.idle.popleft()
+                if pooled.page.is_closed():
+                    await self._retire(pooled, 'closed')
+                    continue
+                if pooled.stale:
+                    await self._retire(pooled, 'context_recycled')
+                    continue
+                self.stats.inc_value('playwright_pool/hits')
+                return self._lease(pooled, request)
+
+            self.stats.inc_value('playwright_pool/misses')
+            context = await self._context_for_new_page()
+            request.meta['playwright_context'] = context.name()
+            page = await _create_page(handler, request, spider)
+            pooled = PooledPage(page, context)
+            context.created_pages += 1
+            context.live[context.generation].add(page)
+            self.stats.inc_value('playwright_pool/pages_created')
+            return self._lease(pooled, request)
+        except Exception:
+            self.semaphore.release()
+            raise
+
+    def _lease(self, pooled, request):
+        pooled.uses += 1
+        self.leased[pooled.page] = pooled
+        request.meta['playwright_context'] = pooled.context_name
+        return pooled.page
+
+    # Fonction pour choisir le contexte d'une nouvelle page (le moins chargé, renouvelé s'il a assez servi)
+    async def _context_for_new_page(self):
+        context = min(self.contexts, key=PooledContext.load)
+        if context.created_pages >= self.context_max_pages:
+            old_generation = context.generation
+            context.generation += 1
+            context.created_pages = 0
+            context.live[context.generation] = set()
+            self.stats.inc_value('playwright_pool/contexts_recycled')
+            await self._maybe_close_context(context, old_generation)
+        return context
+
+    # Fonction pour fermer un ancien contexte dont toutes les pages ont été retirées
+    async def _maybe_close_context(self, context, generation):
+        if generation == context.generation or context.live.get(generation):
+            return
+        context.live.pop(generation, None)
+        browser_context = _browser_context(self.handler, context.name(generation))
+        if browser_context is not None:
+            await browser_context.close()
+
+    # Fonction pour rendre une page au pool (ou la fermer si elle a atteint sa limite d'utilisations ou de mémoire)
+    async def release(self, page):
+        pooled = self.leased.pop(page, None)
+        if pooled is None:
+            if not page.is_closed():
+                await page.close()
+            return
+
+        try:
+            if page.is_closed():
+                await self._retire(pooled, 'closed')
+                return
+
+            try:
+                pooled.heap = await page.evaluate(PAGE_HEAP_SCRIPT)
+            except Exception:
+                pooled.heap = None
+            if pooled.heap is not None:
+                heap_mb = pooled.heap / (1024 * 1024)
+                self.stats.max_value('playwright_pool/page_heap_mb_max', round(heap_mb, 1))
+
+            if pooled.uses >= self.max_uses:
+                await self._retire(pooled, 'max_uses')
+            elif pooled.heap is not None and pooled.heap > self.max_heap:
+                await self._retire(pooled, 'memory')
+            elif pooled.stale:
+                await self._retire(pooled, 'context_recycled')
+            else:
+                # Page vidée avant sa prochaine utilisation: plus de scripts ni de timers de l'ancienne page
+                await page.goto('about:blank')
+                self.idle.append(pooled)
+        except Exception:
+            await self._retire(pooled, 'error')
+        finally:
+            self.semaphore.release()
+
+    # Fonction pour fermer une page et enregistrer sa durée de vie
+    async def _retire(self, pooled, reason):
+        lifetime = time.monotonic() - pooled.created
+        self.stats.inc_value(f'playwright_pool/pages_retired/{reason}')
+        self.stats.inc_value('playwright_pool/page_lifetime_s', round(lifetime, 3))
+        self.stats.inc_value('playwright_pool/page_uses', pooled.uses)
+        self.stats.max_value('playwright_pool/page_lifetime_s_max', round(lifetime, 3))
+        if pooled.heap is not None:
+            self.stats.set_value('playwright_pool/last_retired_heap_mb', round(pooled.heap / (1024 * 1024), 1))
+
+        if not pooled.page.is_closed():
+            try:
+                await pooled.page.close()
+            except Exception:
+                pass
+
+        pooled.context.live.get(pooled.generation, set()).discard(pooled.page)
+        await self._maybe_close_context(pooled.context, pooled.generation)
+
+    # Fonction pour fermer les pages libres et publier les statistiques du pool
+    async def close(self):
+        while self.idle:
+            await self._retire(self.idle.popleft(), 'shutdown')
+
+        acquired = self.stats.get_value('playwright_pool/acquired') or 0
+        hits = self.stats.get_value('playwright_pool/hits') or 0
+        retired = sum(
+            value for key, value in self.stats.get_stats().items()
+            if key.startswith('playwright_pool/pages_retired/')
+        )
+        if acquired:
+            self.stats.set_value('playwright_pool/hit_rate', round(hits / acquired, 3))
+        if retired:
+            self.stats.set_value(
+                'playwright_pool/page_lifetime_s_avg',
+                round(self.stats.get_value('playwright_pool/page_lifetime_s') / retired, 3),
+            )
+            self.stats.set_value(
+                'playwright_pool/page_uses_avg',
+                round(self.stats.get_value('playwright_pool/page_uses') / retired, 2),
+            )
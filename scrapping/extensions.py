@@ -0,0 +1,260 @@
+# Define here your extensions
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import cProfile
+import json
+import os
+import sys
+import threading
+from collections import Counter as StackCounter
+
+from prometheus_client import Counter, Gauge, Histogram
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from api.metrics import start_metrics_server
+from scrapping.signals import batch_flushed, page_timed
+
+# Buckets (secondes) des étapes d'une page Playwright (rendu, scroll, attente, extraction) et des envois de lots
+PHASE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+# Buckets (lignes) de la taille des lots envoyés par les pipelines
+BATCH_SIZE_BUCKETS = (1, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+SCRAPY_PAGES = Counter(
+    "daisy_scrapy_pages",
+    "Pages téléchargées",
+    ["spider", "fetch", "status"],
+)
+SCRAPY_ITEMS = Counter(
+    "daisy_scrapy_items",
+    "Items traités par les pipelines",
+    ["spider", "outcome"],
+)
+SCRAPY_PAGES_RATE = Gauge(
+    "daisy_scrapy_pages_per_second",
+    "Débit de pages des crawls en cours",
+    ["spider"],
+    multiprocess_mode="livesum",
+)
+SCRAPY_ITEMS_RATE = Gauge(
+    "daisy_scrapy_items_per_second",
+    "Débit d'items des crawls en cours",
+    ["spider"],
+    multiprocess_mode="livesum",
+)
+SCRAPY_PAGE_PHASE = Histogram(
+    "daisy_scrapy_page_phase_seconds",
+    "Temps passé par page Playwright, par étape",
+    ["spider", "phase"],
+    buckets=PHASE_BUCKETS,
+)
+SCRAPY_FLUSH_DURATION = Histogram(
+    "daisy_scrapy_pipeline_flush_seconds",
+    "Durée d'envoi d'un lot par un pipeline (attente d'un envoi libre comprise)",
+    ["spider", "pipeline"],
+    buckets=PHASE_BUCKETS,
+)
+SCRAPY_BATCH_SIZE = Histogram(
+    "daisy_scrapy_pipeline_batch_size",
+    "Taille des lots envoyés par les pipelines",
+    ["spider", "pipeline"],
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+
+# Extension exportant les métriques Prometheus du crawl: pages et items (compteurs et débit courant),
+# étapes des pages Playwright, durée et taille des envois des pipelines
+# Dans un worker Celery, les métriques sont exposées par le worker (CELERY_METRICS_PORT);
+# pour un `scrapy crawl` lancé à la main, PROMETHEUS_EXPORTER_PORT démarre un serveur /metrics
+class PrometheusMetrics:
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.interval = crawler.settings.getfloat('PROMETHEUS_RATE_INTERVAL', 15)
+        self.exporter_port = crawler.settings.getint('PROMETHEUS_EXPORTER_PORT')
+        self.rate_loop = None
+        self.pages_prev = 0
+        self.items_prev = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PROMETHEUS_ENABLED'):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(s.response_received, signal=signals.response_received)
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(s.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(s.page_timed, signal=page_timed)
+        crawler.signals.connect(s.batch_flushed, signal=batch_flushed)
+        return s
+
+    def spider_opened(self, spider):
+        if self.exporter_port:
+            start_metrics_server(self.exporter_port)
+        self.pages_prev = 0
+        self.items_prev = 0
+        self.rate_loop = task.LoopingCall(self.record_rates, spider)
+        self.rate_loop.start(self.interval, now=False)
+
+    # Fonction pour publier le débit depuis la dernière mesure (comme LogStats, mais par seconde)
+    def record_rates(self, spider):
+        stats = self.crawler.stats
+        pages = stats.get_value('response_received_count', 0)
+        items = stats.get_value('item_scraped_count', 0)
+        SCRAPY_PAGES_RATE.labels(spider.name).set((pages - self.pages_prev) / self.interval)
+        SCRAPY_ITEMS_RATE.labels(spider.name).set((items - self.items_prev) / self.interval)
+        self.pages_prev, self.items_prev = pages, items
+
+    def spider_closed(self, spider, reason):
+        if self.rate_loop is not None and self.rate_loop.running:
+            self.rate_loop.stop()
+        self.rate_loop = None
+        SCRAPY_PAGES_RATE.labels(spider.name).set(0)
+        SCRAPY_ITEMS_RATE.labels(spider.name).set(0)
+
+    def response_received(self, response, request, spider):
+        fetch = 'playwright' if request.meta.get('playwright') else 'http'
+        SCRAPY_PAGES.labels(spider.name, fetch, str(response.status)).inc()
+
+    def item_scraped(self, item, response, spider):
+        SCRAPY_ITEMS.labels(spider.name, 'scraped').inc()
+
+    def item_dropped(self, item, response, exception, spider):
+        SCRAPY_ITEMS.labels(spider.name, 'dropped').inc()
+
+    def page_timed(self, spider, page_num, timings):
+        for phase in ('render', 'scroll', 'settle', 'extract'):
+            SCRAPY_PAGE_PHASE.labels(spider.name, phase).observe(timings[f'{phase}_ms'] / 1000)
+
+    def batch_flushed(self, spider, pipeline, size, seconds):
+        SCRAPY_FLUSH_DURATION.labels(spider.name, pipeline).observe(seconds)
+        SCRAPY_BATCH_SIZE.labels(spider.name, pipeline).observe(size)
+
+
+# Échantillonneur de la pile d'un thread: toutes les interval secondes, la pile courante est comptée
+# Le résultat est au format "folded" (une pile par ligne, frames séparées par ";", puis le nombre d'échantillons),
+# lu par flamegraph.pl, speedscope ou inferno
+class StackSampler:
+
+    def __init__(self, thread_id, interval=0.01):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="crawl-profiler", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                location = "/".join(code.co_filename.split(os.sep)[-2:])
+                stack.append(f"{code.co_name} ({location}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# Extension de profilage d'un crawl (CRAWL_PROFILE), écrit dans CRAWL_PROFILE_PATH à la fermeture du spider
+# "sampling": échantillonnage du thread du reactor, format folded (faible surcoût, adapté à tout le crawl)
+# "callbacks": cProfile, format pstats (temps exact par fonction: parse, process_item de chaque pipeline...),
+# avec un surcoût notable. En mode inprocess, les autres crawls du même worker apparaissent dans le profil
+class CrawlProfiler:
+
+    def __init__(self, crawler, mode, path, interval):
+        self.crawler = crawler
+        self.mode = mode
+        self.path = path
+        self.interval = interval
+        self.sampler = None
+        self.profile = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        mode = settings.get('CRAWL_PROFILE')
+        if mode not in ('sampling', 'callbacks') or not settings.get('CRAWL_PROFILE_PATH'):
+            raise NotConfigured
+        s = cls(crawler, mode, settings.get('CRAWL_PROFILE_PATH'), settings.getfloat('CRAWL_PROFILE_INTERVAL', 0.01))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    # Le profilage démarre dans le thread du reactor, où s'exécutent les callbacks et les pipelines
+    def spider_opened(self, spider):
+        if self.mode == 'sampling':
+            self.sampler = StackSampler(threading.get_ident(), self.interval)
+            self.sampler.start()
+        else:
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError as e:
+                # Un autre profilage est déjà actif dans ce thread (crawl concurrent du même worker)
+                spider.logger.warning(f"Profilage impossible: {str(e)}")
+                self.profile = None
+
+    def spider_closed(self, spider, reason):
+        stats = self.crawler.stats
+        try:
+            if self.sampler is not None:
+                self.sampler.stop()
+                self.sampler.write(self.path)
+                stats.set_value('profile/samples', self.sampler.samples)
+            elif self.profile is not None:
+                self.profile.disable()
+                self.profile.dump_stats(self.path)
+            else:
+                return
+            stats.set_value('profile/mode', self.mode)
+            spider.logger.info(f"Profil du crawl ({self.mode}) enregistré dans {self.path}")
+        except Exception as e:
+            spider.logger.error(f"Erreur lors de l'enregistrement du profil: {str(e)}")
+
+
+# Extension qui écrit les stats du crawl dans CRAWL_STATS_PATH (JSON) à la fermeture du spider
+# Utilisée par le mode subprocess: le worker lit ce fichier au lieu du dump texte des stats dans les logs
+class CrawlStatsFile:
+
+    def __init__(self, crawler, path):
+        self.crawler = crawler
+        self.path = path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('CRAWL_STATS_PATH')
+        if not path:
+            raise NotConfigured
+        s = cls(crawler, path)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    # Appelée après CoreStats (finish_reason) et la fermeture des pipelines (lots non écrits)
+    def spider_closed(self, spider, reason):
+        stats = self.crawler.stats.get_stats()
+        stats.setdefault('finish_reason', reason)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(stats, f, default=str)
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import re
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+ATELIER_SELECTOR = "a[href*='/atelier/']"
+PAGINATION_SELECTOR = "a[href*='page='], a[href*='/ateliers?']"
+
+# Champs des cartes d'ateliers: nom -> (sélecteur CSS des nœuds texte, rang du nœud parmi ceux trouvés)
+CARD_FIELDS = {
+    "title": ("h3::text", 0),
+    "category": ("p.w-typo--footnote-serif::text", 0),
+    "price": ("span.w-typo--h6 span::text", 0),
+    "duration": ("p.w-typo--caption span::text", 0),
+    "location": ("p.w-typo--caption span::text", 1),
+}
+
+ISO_DURATION_PATTERN = re.compile(r"^PT?(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?$", re.IGNORECASE)
+
+# Clés indiquant le nombre d'ateliers par page dans les données embarquées
+# (les totaux du catalogue, comme nbHits ou totalCount, ne disent rien du contenu d'une page)
+PAGE_SIZE_KEYS = ("hitsPerPage", "pageSize", "perPage", "itemsPerPage")
+
+
+# Fonction pour extraire les cartes d'ateliers du HTML (rendu ou statique)
+def extract_cards(response):
+    cards = []
+    for atelier in response.css(ATELIER_SELECTOR):
+        url = atelier.css("::attr(href)").get()
+        if not url:
+            continue
+
+        spans = atelier.css("p.w-typo--caption span::text").getall()
+        cards.append({
+            "title": atelier.css("h3::text").get(),
+            "url": response.urljoin(url),
+            "category": atelier.css("p.w-typo--footnote-serif::text").get(),
+            "price": atelier.css("span.w-typo--h6 span::text").get(),
+            "duration": spans[0] if spans else None,
+            "location": spans[1] if len(spans) > 1 else None,
+        })
+    return cards
+
+
+# Extracteur de cartes compilé: chaque sélecteur est traduit une seule fois en XPath lxml précompilé,
+# puis évalué directement sur l'arbre de chaque carte (sans objets Selector intermédiaires).
+# Un sélecteur partagé par plusieurs champs (durée et lieu) n'est évalué qu'une fois par carte
+class CompiledCardExtractor:
+
+    def __init__(self, card_selector=ATELIER_SELECTOR, fields=CARD_FIELDS):
+        translator = HTMLTranslator()
+        self.card_selector = card_selector
+        self.fields = fields
+        self.card_xpath = etree.XPath(translator.css_to_xpath(card_selector))
+        self.xpaths = {
+            selector: etree.XPath(translator.css_to_xpath(selector), smart_strings=False)
+            for selector in dict.fromkeys(selector for selector, _ in fields.values())
+        }
+
+    def extract(self, response):
+        cards = []
+        for card in self.card_xpath(response.selector.root):
+            url = card.get("href")
+            if not url:
+                continue
+
+            texts = {selector: xpath(card) for selector, xpath in self.xpaths.items()}
+            row = {"title": None, "url": response.urljoin(url)}
+            for field, (selector, index) in self.fields.items():
+                found = texts[selector]
+                row[field] = found[index] if len(found) > index else None
+            cards.append(row)
+        return cards
+
+    # Arguments du script page.evaluate équivalent (EXTRACT_CARDS_SCRIPT)
+    def browser_args(self):
+        return {
+            "card": self.card_selector,
+            "pagination": PAGINATION_SELECTOR,
+            "fields": {field: [selector.replace("::text", ""), index] for field, (selector, index) in self.fields.items()},
+        }
+
+
+# Script renvoyant les cartes (href brut et champs) et les liens de pagination sans sérialiser le HTML
+EXTRACT_CARDS_SCRIPT = """
+(spec) => {
+    const ownTexts = (el) => Array.from(el.childNodes).filter((n) => n.nodeType === 3).map((n) => n.data);
+    const cards = [];
+    for (const card of document.querySelectorAll(spec.card)) {
+        const href = card.getAttribute("href");
+        if (!href) continue;
+        const texts = {};
+        const row = {title: null, href: href};
+        for (const [field, [selector, index]] of Object.entries(spec.fields)) {
+            if (!(selector in texts)) {
+                texts[selector] = Array.from(card.querySelectorAll(":scope " + selector)).flatMap(ownTexts);
+            }
+            row[field] = index < texts[selector].length ? texts[selector][index] : null;
+        }
+        cards.push(row);
+    }
+    const links = Array.from(document.querySelectorAll(spec.pagination)).map((a) => a.getAttribute("href"));
+    return {cards: cards, links: links};
+}
+"""
+
+card_extractor = CompiledCardExtractor()
+
+
+# Fonction pour lire les liens de pagination d'une page
+def extract_pagination_links(response):
+    return response.css(PAGINATION_SELECTOR).css("::attr(href)").getall()
+
+
+# Fonction pour lire les blocs JSON embarqués (__NEXT_DATA__ et JSON-LD)
+def _embedded_documents(response):
+    scripts = response.css("script#__NEXT_DATA__::text, script[type='application/ld+json']::text").getall()
+    for script in scripts:
+        try:
+            yield json.loads(script)
+        except ValueError:
+            continue
+
+
+# Fonction pour parcourir récursivement un document JSON
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def _text(value):
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return str(value)
+
+
+# Fonction pour convertir un objet JSON en carte d'atelier (None s'il ne décrit pas un atelier)
+def _card_from_json(node, response):
+    url = node.get("url") or node.get("href") or node.get("slug")
+    title = node.get("title") or node.get("name")
+    if not isinstance(url, str) or "/atelier/" not in url or not isinstance(title, str):
+        return None
+
+    offers = node.get("offers") if isinstance(node.get("offers"), dict) else {}
+    address = node.get("address") if isinstance(node.get("address"), dict) else {}
+    location = node.get("location")
+    if isinstance(location, dict):
+        place = location.get("address")
+        location = location.get("name") or (place.get("addressLocality") if isinstance(place, dict) else place)
+    if not location and address:
+        location = address.get("addressLocality")
+
+    category = node.get("category")
+    if isinstance(category, dict):
+        category = category.get("name")
+
+    return {
+        "title": title,
+        "url": response.urljoin(url),
+        "category": _text(category),
+        "price": _text(node.get("price", offers.get("price"))),
+        "duration": _text(node.get("duration")),
+        "location": _text(location),
+    }
+
+
+# Fonction pour extraire les cartes d'ateliers des données embarquées
+# Renvoie (cartes, nombre d'ateliers par page annoncé ou None)
+def extract_embedded_cards(response):
+    cards = {}
+    page_size = None
+    for document in _embedded_documents(response):
+        for node in _walk(document):
+            for key in PAGE_SIZE_KEYS:
+                value = node.get(key)
+                if page_size is None and isinstance(value, int) and not isinstance(value, bool) and value > 0:
+                    page_size = value
+            card = _card_from_json(node, response)
+            if card and card["url"] not in cards:
+                cards[card["url"]] = card
+    return list(cards.values()), page_size
+
+
+# Fonction pour convertir une durée ISO 8601 ("PT2H30M") au format des cartes ("2h30")
+def _duration_text(value):
+    value = _text(value)
+    match = ISO_DURATION_PATTERN.match(value) if value else None
+    if not match or not (match.group("hours") or match.group("minutes")):
+        return value
+    hours, minutes = int(match.group("hours") or 0), int(match.group("minutes") or 0)
+    if not hours:
+        return f"{minutes}min"
+    return f"{hours}h{minutes:02d}" if minutes else f"{hours}h"
+
+
+# Fonction pour calculer l'empreinte d'une page détail sans la parser
+# Basée sur les données structurées si elles existent, sinon sur le contenu principal
+def page_fingerprint(response):
+    parts = response.css("script#__NEXT_DATA__::text, script[type='application/ld+json']::text").getall()
+    if not parts:
+        parts = response.css("main").getall() or [response.text]
+    return hashlib.sha1("".join(parts).encode("utf-8")).hexdigest()
+
+
+# Fonction pour extraire les champs d'une page détail (données embarquées puis HTML)
+# Les champs introuvables valent None (la valeur existante est conservée par l'API)
+def extract_detail(response):
+    for document in _embedded_documents(response):
+        for node in _walk(document):
+            if not any(key in node for key in ("offers", "price", "duration")):
+                continue
+            card = _card_from_json({**node, "url": response.url}, response)
+            if card:
+                card["duration"] = _duration_text(node.get("duration"))
+                return card
+
+    title = response.css("h1::text").get() or response.css("meta[property='og:title']::attr(content)").get()
+    if not title:
+        return None
+    return {
+        "title": title.strip(),
+        "url": response.url,
+        "category": None,
+        "price": response.css("meta[property='product:price:amount']::attr(content)").get(),
+        "duration": None,
+        "location": None,
+    }
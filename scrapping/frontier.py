@@ -0,0 +1,104 @@
+import hashlib
+import os
+import sqlite3
+
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.utils.job import job_dir
+from w3lib.url import canonicalize_url
+
+# Taille des empreintes stockées (8 octets: collisions négligeables jusqu'à plusieurs dizaines de millions d'URLs)
+FINGERPRINT_SIZE = 8
+
+
+# Fonction pour calculer l'empreinte compacte d'une URL
+def url_fingerprint(url: str) -> bytes:
+    return hashlib.blake2b(canonicalize_url(url).encode("utf-8"), digest_size=FINGERPRINT_SIZE).digest()
+
+
+# Ensemble d'empreintes persisté dans SQLite (mémoire bornée au cache de pages SQLite)
+# Accepte des URLs (empreinte calculée) ou des empreintes déjà calculées (bytes)
+class FingerprintStore:
+
+    def __init__(self, path: str, commit_every: int = 1000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.commit_every = commit_every
+        self.pending = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints (fp BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def _key(value) -> bytes:
+        if isinstance(value, str):
+            return url_fingerprint(value)
+        return bytes(value[:FINGERPRINT_SIZE])
+
+    def __contains__(self, value) -> bool:
+        row = self.connection.execute(
+            "SELECT 1 FROM fingerprints WHERE fp = ?", (self._key(value),)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM fingerprints").fetchone()[0]
+
+    # Fonction pour ajouter une valeur, renvoie True si elle n'était pas encore connue
+    def add(self, value) -> bool:
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO fingerprints (fp) VALUES (?)", (self._key(value),)
+        )
+        added = cursor.rowcount == 1
+        if added:
+            self.pending += 1
+            if self.pending >= self.commit_every:
+                self.flush()
+        return added
+
+    def flush(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+# Dupefilter à empreintes compactes, persisté dans le JOBDIR du crawl pour pouvoir le reprendre
+# Sans JOBDIR, les empreintes restent en mémoire (8 octets par requête au lieu de 40 caractères hexadécimaux)
+class PersistentDupeFilter(BaseDupeFilter):
+
+    def __init__(self, path: str = None, debug: bool = False, fingerprinter=None):
+        self.store = FingerprintStore(os.path.join(path, "requests.seen.sqlite")) if path else set()
+        self.debug = debug
+        self.fingerprinter = fingerprinter
+        self.filtered = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            job_dir(crawler.settings),
+            debug=crawler.settings.getbool("DUPEFILTER_DEBUG"),
+            fingerprinter=crawler.request_fingerprinter,
+        )
+
+    def request_seen(self, request) -> bool:
+        fp = self.fingerprinter.fingerprint(request)[:FINGERPRINT_SIZE]
+        if fp in self.store:
+            return True
+        self.store.add(fp)
+        return False
+
+    def log(self, request, spider):
+        self.filtered += 1
+        if self.debug:
+            spider.logger.debug(f"Requête déjà vue filtrée: {request}")
+        spider.crawler.stats.inc_value("dupefilter/filtered", spider=spider)
+
+    def close(self, reason):
+        if isinstance(self.store, FingerprintStore):
+            self.store.close()
@@ -13,3 +13,16 @@ class AtelierItem(scrapy.Item):
     price = scrapy.Field()
     location = scrapy.Field()
     duration = scrapy.Field()
+
+# Item pour le résultat de la visite d'une page détail (mode detail)
+class RecrawlResultItem(scrapy.Item):
+    url = scrapy.Field()
+    status = scrapy.Field()
+    etag = scrapy.Field()
+    last_modified = scrapy.Field()
+    page_hash = scrapy.Field()
+    title = scrapy.Field()
+    category = scrapy.Field()
+    price = scrapy.Field()
+    location = scrapy.Field()
+    duration = scrapy.Field()
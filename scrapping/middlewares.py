@@ -3,7 +3,14 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import asyncio
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+from scrapping.browser import PagePool
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
@@ -98,3 +105,151 @@ class TutorialDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+# Script Lua: réservation d'un jeton dans le seau du domaine, renvoie l'attente en secondes
+# Le seau se remplit au rythme de 1 / delay jetons par seconde, delay étant partagé par tous les processus
+TOKEN_BUCKET_SCRIPT = """
+local default_delay = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'delay')
+local delay = math.max(tonumber(state[3]) or default_delay, 0.001)
+local rate = 1 / delay
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate) - 1
+local wait = 0
+if tokens < 0 then
+    wait = -tokens / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now, 'delay', delay)
+redis.call('EXPIRE', KEYS[1], 3600)
+return {tostring(wait), tostring(delay)}
+"""
+
+# Script Lua: prise en compte d'une latence mesurée (même règle qu'AutoThrottle, état partagé)
+LATENCY_SCRIPT = """
+local latency = tonumber(ARGV[1])
+local alpha = tonumber(ARGV[2])
+local target_concurrency = tonumber(ARGV[3])
+local min_delay = tonumber(ARGV[4])
+local max_delay = tonumber(ARGV[5])
+local ok = ARGV[6] == '1'
+local state = redis.call('HMGET', KEYS[1], 'latency', 'delay')
+local average = tonumber(state[1]) or latency
+average = average + alpha * (latency - average)
+local delay = tonumber(state[2]) or min_delay
+local target_delay = average / target_concurrency
+local new_delay = math.max(target_delay, (delay + target_delay) / 2)
+new_delay = math.min(math.max(min_delay, new_delay), max_delay)
+if not ok and new_delay <= delay then
+    new_delay = delay
+end
+redis.call('HSET', KEYS[1], 'latency', average, 'delay', new_delay)
+redis.call('EXPIRE', KEYS[1], 3600)
+return {tostring(new_delay), tostring(average)}
+"""
+
+
+# Middleware de limitation de débit partagée entre processus (seau à jetons Redis par domaine)
+# Les latences mesurées par chaque processus alimentent un délai commun, à la manière d'AutoThrottle
+class RedisRateLimitMiddleware:
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.stats = crawler.stats
+        self.redis = aioredis.from_url(settings.get('REDIS_RATE_LIMIT_URL'))
+        self.key_prefix = settings.get('REDIS_RATE_LIMIT_KEY_PREFIX', 'ratelimit')
+        self.min_delay = settings.getfloat('REDIS_RATE_LIMIT_MIN_DELAY', 3)
+        self.max_delay = settings.getfloat('REDIS_RATE_LIMIT_MAX_DELAY', 10)
+        self.burst = settings.getfloat('REDIS_RATE_LIMIT_BURST', 1)
+        self.target_concurrency = settings.getfloat('REDIS_RATE_LIMIT_TARGET_CONCURRENCY', 1.0)
+        self.latency_alpha = settings.getfloat('REDIS_RATE_LIMIT_LATENCY_ALPHA', 0.3)
+        self.acquire = self.redis.register_script(TOKEN_BUCKET_SCRIPT)
+        self.observe = self.redis.register_script(LATENCY_SCRIPT)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('REDIS_RATE_LIMIT_ENABLED'):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def _key(self, request):
+        return f"{self.key_prefix}:{urlparse_cached(request).hostname}"
+
+    async def process_request(self, request, spider):
+        domain = urlparse_cached(request).hostname
+        try:
+            wait, delay = await self.acquire(keys=[self._key(request)], args=[self.min_delay, self.burst])
+            wait, delay = float(wait), float(delay)
+        except RedisError as e:
+            # Redis indisponible: on retombe sur le délai minimum local
+            self.stats.inc_value('ratelimit/redis_errors')
+            spider.logger.warning(f"Limiteur Redis indisponible, délai local appliqué: {str(e)}")
+            wait, delay = self.min_delay, self.min_delay
+
+        self.stats.set_value(f'ratelimit/slots/{domain}/delay', delay)
+        if wait > 0:
+            self.stats.inc_value('ratelimit/wait_count')
+            self.stats.inc_value('ratelimit/wait_seconds', wait)
+            self.stats.max_value('ratelimit/wait_seconds_max', wait)
+            await asyncio.sleep(wait)
+        request.meta['ratelimit_wait'] = wait
+        return None
+
+    async def process_response(self, request, response, spider):
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return response
+
+        domain = urlparse_cached(request).hostname
+        try:
+            delay, average = await self.observe(
+                keys=[self._key(request)],
+                args=[latency, self.latency_alpha, self.target_concurrency, self.min_delay, self.max_delay,
+                      '1' if response.status == 200 else '0'],
+            )
+            self.stats.set_value(f'ratelimit/slots/{domain}/delay', float(delay))
+            self.stats.set_value(f'ratelimit/slots/{domain}/latency', float(average))
+        except RedisError:
+            self.stats.inc_value('ratelimit/redis_errors')
+        return response
+
+    async def spider_closed(self, spider):
+        await self.redis.aclose()
+
+
+# Middleware fournissant aux requêtes Playwright une page du pool (voir scrapping/browser.py)
+# Le spider rend la page au pool (spider.page_pool.release) une fois la page traitée
+class PlaywrightPagePoolMiddleware:
+
+    def __init__(self, crawler):
+        self.pool = PagePool.from_crawler(crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PLAYWRIGHT_POOL_ENABLED'):
+            raise NotConfigured
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        spider.page_pool = self.pool
+
+    async def process_request(self, request, spider):
+        meta = request.meta
+        # Une requête relancée (retry) garde la page qu'elle a déjà obtenue
+        if meta.get('playwright') and meta.get('playwright_include_page') and 'playwright_page' not in meta:
+            page = await self.pool.acquire(request, spider)
+            if page is not None:
+                meta['playwright_page'] = page
+        return None
+
+    async def spider_closed(self, spider):
+        await self.pool.close()
@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.misc import build_from_crawler, load_object
+from twisted.internet import defer
+from w3lib.url import canonicalize_url
+
+PAGE_CACHE_HANDLER = "scrapping.pagecache.PageCacheDownloadHandler"
+
+# Settings appliqués en mode replay: aucune attente, aucun envoi vers l'API
+REPLAY_SETTINGS = {
+    "DOWNLOAD_DELAY": 0,
+    "AUTOTHROTTLE_ENABLED": False,
+    "REDIS_RATE_LIMIT_ENABLED": False,
+    "CONCURRENT_REQUESTS": 64,
+    "CONCURRENT_REQUESTS_PER_DOMAIN": 64,
+    "ROBOTSTXT_OBEY": False,
+    "CLOSESPIDER_TIMEOUT": 0,
+    "ITEM_PIPELINES": {"scrapping.pipelines.AtelierPipeline": 300},
+}
+
+# Magasins ouverts, partagés entre le download handler et le spider d'un même processus
+_stores = {}
+
+
+# Magasin de pages adressé par contenu: corps compressés nommés par leur SHA-256, index URL -> empreinte dans SQLite
+# Une page est stockée en deux variantes: "http" (réponse brute) et "rendered" (HTML final après rendu et scroll)
+class PageStore:
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                recorded_at REAL NOT NULL,
+                PRIMARY KEY (url, kind)
+            ) WITHOUT ROWID
+            """
+        )
+        self.connection.commit()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest[2:]}.html.gz")
+
+    # Fonction pour enregistrer une page, renvoie l'empreinte de son contenu
+    def put(self, url: str, body: bytes, kind: str = "http", status: int = 200, headers: dict = None) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (url, kind, hash, status, headers, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (canonicalize_url(url), kind, digest, status, json.dumps(headers or {}), time.time()),
+        )
+        self.connection.commit()
+        return digest
+
+    # Fonction pour relire une page: (corps, statut, en-têtes) ou None si elle n'a pas été enregistrée
+    def get(self, url: str, kind: str = "http"):
+        row = self.connection.execute(
+            "SELECT hash, status, headers FROM pages WHERE url = ? AND kind = ?", (canonicalize_url(url), kind)
+        ).fetchone()
+        if row is None:
+            return None
+        digest, status, headers = row
+        with gzip.open(self._object_path(digest), "rb") as f:
+            return f.read(), status, json.loads(headers)
+
+    # Fonction pour parcourir les pages enregistrées (url, variante, empreinte)
+    def entries(self, kind: str = None):
+        if kind:
+            return self.connection.execute("SELECT url, kind, hash FROM pages WHERE kind = ? ORDER BY url", (kind,))
+        return self.connection.execute("SELECT url, kind, hash FROM pages ORDER BY url, kind")
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+# Fonction pour ouvrir (une fois par processus) le magasin de pages configuré
+def open_page_store(settings) -> PageStore:
+    directory = os.path.abspath(settings.get("PAGE_CACHE_DIR", ".pagecache"))
+    if directory not in _stores:
+        _stores[directory] = PageStore(directory)
+    return _stores[directory]
+
+
+# Fonction pour activer le cache de pages dans les settings d'un crawler (appelée par Spider.update_settings)
+# record: téléchargement normal et enregistrement, replay: pages servies depuis le disque, sans navigateur ni réseau
+def apply_page_cache_settings(settings):
+    mode = settings.get("PAGE_CACHE_MODE")
+    if mode not in ("record", "replay"):
+        return
+
+    handlers = settings.getdict("DOWNLOAD_HANDLERS")
+    fallback = handlers.get("https") or "scrapy.core.downloader.handlers.http.HTTPDownloadHandler"
+    if fallback != PAGE_CACHE_HANDLER:
+        settings.set("PAGE_CACHE_FALLBACK_HANDLER", fallback, priority="spider")
+    settings.set(
+        "DOWNLOAD_HANDLERS",
+        {**handlers, "http": PAGE_CACHE_HANDLER, "https": PAGE_CACHE_HANDLER},
+        priority="spider",
+    )
+    if mode == "replay":
+        settings.setdict(REPLAY_SETTINGS, priority="spider")
+
+
+# Download handler du cache de pages
+# En replay, le handler de repli (Playwright) n'est pas instancié: aucun navigateur n'est lancé
+class PageCacheDownloadHandler:
+    lazy = False
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.stats = crawler.stats
+        self.mode = settings.get("PAGE_CACHE_MODE")
+        self.store = open_page_store(settings)
+        self.fallback = None
+        if self.mode != "replay":
+            self.fallback = build_from_crawler(load_object(settings.get("PAGE_CACHE_FALLBACK_HANDLER")), crawler)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    @staticmethod
+    def kind(request) -> str:
+        return "rendered" if request.meta.get("playwright") else "http"
+
+    def download_request(self, request, spider):
+        if self.mode == "replay":
+            return defer.maybeDeferred(self._replay, request)
+
+        d = self.fallback.download_request(request, spider)
+        # Les pages Playwright sont enregistrées par le spider, une fois rendues et scrollées
+        if self.mode == "record" and not request.meta.get("playwright"):
+            d.addCallback(self._record, request)
+        return d
+
+    def _replay(self, request):
+        cached = self.store.get(request.url, self.kind(request))
+        if cached is None:
+            self.stats.inc_value("pagecache/miss")
+            raise IgnoreRequest(f"Page absente du cache ({self.kind(request)}): {request.url}")
+
+        body, status, headers = cached
+        self.stats.inc_value("pagecache/hit")
+        headers = Headers(headers)
+        respcls = responsetypes.from_args(headers=headers, url=request.url, body=body)
+        return respcls(url=request.url, status=status, headers=headers, body=body, request=request, flags=["cached"])
+
+    def _record(self, response, request):
+        self.store.put(
+            request.url,
+            response.body,
+            kind="http",
+            status=response.status,
+            headers=response.headers.to_unicode_dict(),
+        )
+        self.stats.inc_value("pagecache/recorded")
+        return response
+
+    def close(self):
+        if self.fallback is not None and hasattr(self.fallback, "close"):
+            return self.fallback.close()
+
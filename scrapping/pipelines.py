@@ -6,9 +6,26 @@
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
-import re
+import gzip
+import io
+import json
+import os
+import time
 from urllib.parse import urljoin
 import requests
+from pydantic import ValidationError
+from requests.adapters import HTTPAdapter
+from scrapy.exceptions import NotConfigured
+from sqlmodel import Session, create_engine
+from twisted.internet import defer, task, threads
+from urllib3.util.retry import Retry
+from api.catalog import get_url_index
+from api.ingest import STAGING_FIELDS, atelier_staging, upsert_from_staging
+from api.models.atelier import AtelierCreate, ConflictMode
+from api.models.catalog import AtelierLoadRow
+from api.normalize import content_hash, normalize_atelier, parse_price
+from scrapping.items import RecrawlResultItem
+from scrapping.signals import batch_flushed
 from scrapping.settings import API_URL
 
 # Pipeline pour l'atelier
@@ -23,12 +40,7 @@ class AtelierPipeline:
             adapter['category'] = adapter['category'].strip()
         
         if adapter.get('price'):
-            price_str = adapter['price'].strip()
-            price_match = re.search(r'(\d+)', price_str)
-            if price_match:
-                adapter['price'] = int(price_match.group(1))
-            else:
-                adapter['price'] = None
+            adapter['price'] = parse_price(adapter['price'])
         
         if adapter.get('duration'):
             adapter['duration'] = adapter['duration'].strip()
@@ -50,49 +62,181 @@ class AtelierPipeline:
 
 # Pipeline pour la base de données
 class DatabasePipeline:
-    
-    def __init__(self):
-        self.api_url = API_URL
-        self.batch_url = f"{self.api_url}/ateliers/batch"
-        self.urls_url = f"{self.api_url}/ateliers/urls"
-        self.new_ateliers = []
-        self.existing_urls = set()
-    
+    # Valeur de DATABASE_WRITER pour laquelle le pipeline est actif (None: toujours actif)
+    writer = 'api'
+
+    def __init__(self, api_url=API_URL, batch_size=50, flush_interval=30, max_in_flight=2,
+                 max_retries=3, retry_backoff=1.0, streaming=True, url_index_path=None, load_id=None,
+                 on_conflict=ConflictMode.update.value):
+        self.api_url = api_url
+        self.batch_url = f"{self.api_url}/ateliers/upsert"
+        # Crawl full_refresh: les ateliers sont ajoutés au chargement load_id, promu en fin de crawl
+        self.load_id = load_id
+        if load_id:
+            self.batch_url = f"{self.api_url}/catalog/loads/{load_id}/ateliers"
+        # Source de l'index des URLs (URL -> empreinte de contenu), enregistrée avec la copie locale
+        # pour ne pas mélanger deux catalogues
+        self.url_index_source = api_url
+        self.urls_index_url = f"{self.api_url}/ateliers/urls/index"
+        self.url_index_path = url_index_path
+        # Routage des ateliers selon l'index: les URLs inconnues sont toujours envoyées (insertion)
+        # "update": une URL connue n'est renvoyée que si son empreinte diffère de celle de l'index (changement)
+        # "skip": les URLs connues sont ignorées (changements détectés uniquement par le recrawl des pages détail)
+        self.on_conflict = ConflictMode(on_conflict)
+        self.batch_params = None if load_id else {"on_conflict": self.on_conflict.value}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.streaming = streaming
+        self.buffer = []
+        self.existing_urls = {}
+        self.session = None
+        self.semaphore = None
+        self.in_flight = set()
+        self.flush_loop = None
+        self.batch_num = 0
+        self.total_sent = 0
+        self.total_created = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if cls.writer and settings.get('DATABASE_WRITER', 'api') != cls.writer:
+            raise NotConfigured
+        return cls(
+            api_url=settings.get('API_URL', API_URL),
+            batch_size=settings.getint('DATABASE_PIPELINE_BATCH_SIZE', 50),
+            flush_interval=settings.getfloat('DATABASE_PIPELINE_FLUSH_INTERVAL', 30),
+            max_in_flight=settings.getint('DATABASE_PIPELINE_MAX_IN_FLIGHT', 2),
+            max_retries=settings.getint('DATABASE_PIPELINE_MAX_RETRIES', 3),
+            retry_backoff=settings.getfloat('DATABASE_PIPELINE_RETRY_BACKOFF', 1.0),
+            streaming=settings.getbool('DATABASE_PIPELINE_STREAMING', True),
+            url_index_path=settings.get('URL_INDEX_PATH'),
+            load_id=settings.getint('CATALOG_LOAD_ID') or None,
+            on_conflict=settings.get('DATABASE_PIPELINE_ON_CONFLICT', ConflictMode.update.value),
+        )
+
+    # Fonction pour créer la session HTTP (keep-alive, pool et retry avec backoff)
+    def _build_session(self):
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.retry_backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(self.max_in_flight, 1), max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
     # Fonction pour ouvrir le spider
     def open_spider(self, spider):
-        self.new_ateliers = []
-        self.existing_urls = set()
-        
+        self.buffer = []
+        self.existing_urls = {}
+        self.in_flight = set()
+        self.batch_num = 0
+        self.total_sent = 0
+        self.total_created = 0
+        self.session = self._build_session()
+        self.semaphore = defer.DeferredSemaphore(max(self.max_in_flight, 1))
+
+        self.existing_urls = self._sync_url_index(spider)
+
+        # Envoi périodique du buffer, même si le lot n'est pas plein
+        if self.streaming and self.flush_interval > 0:
+            self.flush_loop = task.LoopingCall(self._flush, spider)
+            self.flush_loop.start(self.flush_interval, now=False)
+
+    # Fonction pour synchroniser la copie locale de l'index des URLs et de leurs empreintes (uniquement le delta)
+    # Les ateliers modifiés changent de génération: le delta contient aussi leur nouvelle empreinte.
+    # Un chargement complet doit contenir tous les ateliers, y compris ceux déjà en base: pas d'index
+    def _sync_url_index(self, spider):
+        if self.load_id:
+            return {}
+        generation, urls = self._load_url_index(spider)
+
+        try:
+            index = self._fetch_url_index(spider, generation)
+        except Exception as e:
+            spider.logger.warning(f"Erreur lors de la synchronisation de l'index des URLs: {str(e)}")
+            return urls
+        if index is None:
+            return urls
+
+        received = dict(zip(index["urls"], index["hashes"]))
+        if index["full"]:
+            urls = received
+        else:
+            urls.update(received)
+
+        spider.logger.info(
+            f"Index des URLs: génération {generation} -> {index['generation']}, "
+            f"{len(index['urls'])} URLs reçues ({'complet' if index['full'] else 'delta'})"
+        )
+        spider.crawler.stats.set_value('database_pipeline/url_index_received', len(index["urls"]))
+        self._save_url_index(spider, index["generation"], urls)
+        return urls
+
+    # Fonction pour récupérer les URLs ajoutées depuis une génération (None si l'API refuse)
+    def _fetch_url_index(self, spider, generation):
+        response = self.session.get(self.urls_index_url, params={"since": generation}, timeout=30)
+        if response.status_code != 200:
+            spider.logger.warning(f"Impossible de synchroniser l'index des URLs: {response.status_code}")
+            return None
+        return response.json()
+
+    # Fonction pour charger la copie locale de l'index des URLs
+    # Une copie sans empreintes (ancien format) est ignorée: l'index complet est téléchargé
+    def _load_url_index(self, spider):
+        if not self.url_index_path or not os.path.exists(self.url_index_path):
+            return 0, {}
+        try:
+            with gzip.open(self.url_index_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("api_url") != self.url_index_source or not isinstance(data["urls"], dict):
+                return 0, {}
+            return data["generation"], data["urls"]
+        except Exception as e:
+            spider.logger.warning(f"Index local des URLs illisible, synchronisation complète: {str(e)}")
+            return 0, {}
+
+    # Fonction pour enregistrer la copie locale de l'index des URLs
+    def _save_url_index(self, spider, generation, urls):
+        if not self.url_index_path:
+            return
+        tmp_path = f"{self.url_index_path}.tmp"
         try:
-            response = requests.get(self.urls_url, timeout=10)
-            if response.status_code == 200:
-                self.existing_urls = set(response.json())
-            else:
-                spider.logger.warning(f"Impossible de charger les URLs existantes: {response.status_code}")
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump({"api_url": self.url_index_source, "generation": generation, "urls": urls}, f)
+            os.replace(tmp_path, self.url_index_path)
         except Exception as e:
-            spider.logger.warning(f"Erreur lors du chargement des URLs existantes: {str(e)}")
-            
+            spider.logger.warning(f"Impossible d'enregistrer l'index local des URLs: {str(e)}")
+
     # Fonction pour traiter l'item
     def process_item(self, item, spider):
+        if isinstance(item, RecrawlResultItem):
+            return item
+
         adapter = ItemAdapter(item)
-        
+
         if not adapter.get('url') or not adapter.get('title'):
             spider.logger.warning(f"Item incomplet ignoré: {item}")
             return item
-        
+
         price = adapter.get('price')
         if price is not None:
             price = float(price)
-        
+
         url = adapter.get('url')
-        
-        if url in self.existing_urls:
+        known = url in self.existing_urls
+        if known and self.on_conflict == ConflictMode.skip:
             return item
-        
-        if any(a['url'] == url for a in self.new_ateliers):
-            return item
-        
-        atelier_data = {
+
+        row = {
             "title": adapter.get('title'),
             "url": url,
             "category": adapter.get('category'),
@@ -100,42 +244,316 @@ class DatabasePipeline:
             "duration": adapter.get('duration'),
             "location": adapter.get('location'),
         }
-        
-        self.new_ateliers.append(atelier_data)
-        
+        # Même empreinte que celle calculée par l'API (api/normalize.py): un atelier inchangé (d'après l'index,
+        # ou déjà envoyé pendant ce crawl) n'est pas renvoyé
+        digest = content_hash(normalize_atelier(row))
+        if known and self.existing_urls[url] == digest:
+            spider.crawler.stats.inc_value('database_pipeline/items_skipped_unchanged')
+            return item
+
+        self.existing_urls[url] = digest
+        return self._enqueue(spider, item, row)
+
+    # Fonction pour ajouter une ligne au buffer et envoyer le lot quand il est plein
+    def _enqueue(self, spider, item, row):
+        self.buffer.append(row)
+
+        if not self.streaming or len(self.buffer) < self.batch_size:
+            return item
+
+        sent = self._flush(spider)
+
+        # Backpressure: si le lot attend un envoi libre, le moteur attend la fin de ce lot
+        if self.semaphore.waiting and sent is not None:
+            return sent.addCallback(lambda _: item)
         return item
-    
+
+    # Fonction pour envoyer le buffer courant sans bloquer le reactor
+    def _flush(self, spider):
+        if not self.buffer:
+            return None
+
+        batch = self.buffer
+        self.buffer = []
+        return self._send(spider, batch)
+
+    # Fonction pour envoyer un lot via le pool de connexions, en nombre limité
+    def _send(self, spider, batch):
+        self.batch_num += 1
+        batch_num = self.batch_num
+
+        started = time.monotonic()
+        d = self.semaphore.run(threads.deferToThread, self._post_batch, batch)
+        d.addCallbacks(
+            self._on_batch_sent,
+            self._on_batch_failed,
+            callbackArgs=(spider, batch, batch_num),
+            errbackArgs=(spider, batch, batch_num),
+        )
+        d.addBoth(self._batch_flushed, spider, len(batch), started)
+        self.in_flight.add(d)
+        d.addBoth(self._forget, d)
+        return d
+
+    # Fonction exécutée dans un thread pour envoyer un lot
+    def _post_batch(self, batch):
+        return self.session.post(
+            self.batch_url,
+            params=self.batch_params,
+            json=batch,
+            headers={"Content-Type": "application/json"},
+            timeout=30
+        )
+
+    def _on_batch_sent(self, response, spider, batch, batch_num):
+        self.total_sent += len(batch)
+        if response.status_code == 200 and self.load_id:
+            result = response.json()
+            spider.crawler.stats.inc_value('database_pipeline/batches_sent')
+            spider.crawler.stats.inc_value('database_pipeline/items_staged', result["staged"])
+        elif response.status_code == 200:
+            result = response.json()
+            self.total_created += result["inserted"]
+            spider.crawler.stats.inc_value('database_pipeline/batches_sent')
+            spider.crawler.stats.inc_value('database_pipeline/items_created', result["inserted"])
+            spider.crawler.stats.inc_value('database_pipeline/items_updated', result["updated"])
+            spider.crawler.stats.inc_value('database_pipeline/items_unchanged', result["unchanged"])
+        else:
+            spider.crawler.stats.inc_value('database_pipeline/batches_failed')
+            spider.logger.error(f"Erreur lors de l'envoi du lot {batch_num}: {response.status_code} - {response.text[:200]}")
+
+    def _on_batch_failed(self, failure, spider, batch, batch_num):
+        self.total_sent += len(batch)
+        spider.crawler.stats.inc_value('database_pipeline/batches_failed')
+        if failure.check(requests.exceptions.Timeout):
+            spider.logger.error(f"Timeout lors de l'envoi du lot {batch_num}")
+        else:
+            spider.logger.error(f"Erreur inattendue lors de l'envoi du lot {batch_num}: {failure.getErrorMessage()}")
+
+    # Fonction pour publier la durée d'envoi d'un lot, attente d'un envoi libre comprise (signal batch_flushed)
+    def _batch_flushed(self, result, spider, size, started):
+        spider.crawler.signals.send_catch_log(
+            signal=batch_flushed,
+            spider=spider,
+            pipeline=type(self).__name__,
+            size=size,
+            seconds=time.monotonic() - started,
+        )
+        return result
+
+    def _forget(self, result, d):
+        self.in_flight.discard(d)
+        return result
+
     # Fonction pour fermer le spider
+    @defer.inlineCallbacks
     def close_spider(self, spider):
-        if not self.new_ateliers:
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        self.flush_loop = None
+
+        # Envoi du reste du buffer puis attente des lots en cours
+        pending = self.buffer
+        self.buffer = []
+        for i in range(0, len(pending), self.batch_size):
+            self._send(spider, pending[i:i+self.batch_size])
+
+        if self.in_flight:
+            yield defer.DeferredList(list(self.in_flight))
+
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+        self._log_totals(spider)
+
+    def _log_totals(self, spider):
+        if not self.batch_num:
             spider.logger.info("Aucun nouvel atelier à envoyer")
             return
-                
-        total_created = 0
-        batch_size = 50
-        
-        # Envoi des ateliers par lot
-        for i in range(0, len(self.new_ateliers), batch_size):
-            batch = self.new_ateliers[i:i+batch_size]
-            batch_num = i//batch_size + 1
-            
-            try:
-                response = requests.post(
-                    self.batch_url,
-                    json=batch,
-                    headers={"Content-Type": "application/json"},
-                    timeout=30
-                )
-                
-                if response.status_code == 200:
-                    created = response.json()
-                    total_created += len(created)
+        if self.load_id:
+            spider.logger.info(f"Total: {self.total_sent} ateliers envoyés au chargement {self.load_id}")
+            return
+
+        spider.logger.info(f"Total: {self.total_created} ateliers créés avec succès sur {self.total_sent} envoyés")
+
+
+# Pipeline pour les résultats du recrawl des pages détail (envoyés à /ateliers/recrawl-results)
+# Même envoi par lots que DatabasePipeline, sans index des URLs
+# Actif quel que soit DATABASE_WRITER, mais la session HTTP et l'envoi périodique ne sont créés qu'au premier
+# résultat de recrawl: un crawl de liste ou un chargement complet n'ouvre rien
+class RecrawlPipeline(DatabasePipeline):
+    writer = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_url = f"{self.api_url}/ateliers/recrawl-results"
+        self.batch_params = None
+        self.url_index_path = None
+        self.load_id = None
+
+    def open_spider(self, spider):
+        self.session = None
+
+    def _sync_url_index(self, spider):
+        return {}
+
+    def process_item(self, item, spider):
+        if not isinstance(item, RecrawlResultItem):
+            return item
+        if self.session is None:
+            super().open_spider(spider)
+
+        adapter = ItemAdapter(item)
+        price = adapter.get('price')
+        return self._enqueue(spider, item, {
+            "url": adapter.get('url'),
+            "status": adapter.get('status'),
+            "etag": adapter.get('etag'),
+            "last_modified": adapter.get('last_modified'),
+            "page_hash": adapter.get('page_hash'),
+            "title": adapter.get('title'),
+            "category": adapter.get('category'),
+            "price": float(price) if price is not None else None,
+            "duration": adapter.get('duration'),
+            "location": adapter.get('location'),
+        })
+
+    def _on_batch_sent(self, response, spider, batch, batch_num):
+        self.total_sent += len(batch)
+        if response.status_code == 200:
+            result = response.json()
+            self.total_created += result["updated"]
+            spider.crawler.stats.inc_value('recrawl_pipeline/batches_sent')
+            for key in ("not_modified", "unchanged", "changed", "gone", "updated", "unknown"):
+                spider.crawler.stats.inc_value(f'recrawl_pipeline/{key}', result[key])
+        else:
+            spider.crawler.stats.inc_value('recrawl_pipeline/batches_failed')
+            spider.logger.error(f"Erreur lors de l'envoi des résultats {batch_num}: {response.status_code} - {response.text[:200]}")
+
+    def close_spider(self, spider):
+        if self.session is None:
+            return None
+        return super().close_spider(spider)
+
+    def _log_totals(self, spider):
+        if self.batch_num:
+            spider.logger.info(f"Recrawl: {self.total_created} ateliers mis à jour sur {self.total_sent} pages revisitées")
+
+
+# Pipeline d'écriture directe dans PostgreSQL (DATABASE_WRITER = "copy"), sans passer par l'API
+# Même buffer et même dédoublonnage que DatabasePipeline. Chaque lot est validé avec AtelierCreate et normalisé
+# comme à l'API, chargé par COPY dans une table de staging puis fusionné dans atelier en une instruction
+# Pour un crawl full_refresh, les lots sont chargés par COPY directement dans le chargement (atelierloadrow)
+class PostgresCopyPipeline(DatabasePipeline):
+    writer = 'copy'
+
+    def __init__(self, *args, database_url=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.database_url = database_url
+        self.engine = None
+        self.rows_written = 0
+        self.write_seconds = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = super().from_crawler(crawler)
+        pipeline.database_url = crawler.settings.get('DATABASE_WRITER_URL')
+        pipeline.batch_size = crawler.settings.getint('DATABASE_COPY_BATCH_SIZE', 1000)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        # Une connexion par lot en cours d'écriture
+        self.engine = create_engine(self.database_url, pool_size=max(self.max_in_flight, 1), max_overflow=0)
+        self.url_index_source = self.engine.url.render_as_string(hide_password=True)
+        super().open_spider(spider)
+
+    # Pas de session HTTP: l'index des URLs et les lots passent directement par PostgreSQL
+    def _build_session(self):
+        return None
+
+    def _fetch_url_index(self, spider, generation):
+        with Session(self.engine) as session:
+            return get_url_index(session, generation)
+
+    # Fonction pour convertir les lignes au format texte de COPY (\N pour NULL, caractères spéciaux échappés)
+    @staticmethod
+    def _copy_buffer(rows, columns=STAGING_FIELDS):
+        buffer = io.StringIO()
+        for row in rows:
+            fields = []
+            for field in columns:
+                value = row.get(field)
+                if value is None:
+                    fields.append("\\N")
                 else:
-                    spider.logger.error(f"Erreur lors de l'envoi du lot {batch_num}: {response.status_code} - {response.text[:200]}")
-            
-            except requests.exceptions.Timeout:
-                spider.logger.error(f"Timeout lors de l'envoi du lot {batch_num}")
-            except Exception as e:
-                spider.logger.error(f"Erreur inattendue lors de l'envoi du lot {batch_num}: {str(e)}")
-        
-        spider.logger.info(f"Total: {total_created} ateliers créés avec succès sur {len(self.new_ateliers)} envoyés")
+                    fields.append(
+                        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+                    )
+            buffer.write("\t".join(fields))
+            buffer.write("\n")
+        buffer.seek(0)
+        return buffer
+
+    # Fonction exécutée dans un thread pour écrire un lot: validation, COPY dans la table de staging puis fusion
+    def _post_batch(self, batch):
+        rows = []
+        invalid = 0
+        for row in batch:
+            try:
+                rows.append(normalize_atelier(AtelierCreate.model_validate(row).model_dump()))
+            except ValidationError:
+                invalid += 1
+
+        start = time.monotonic()
+        result = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if rows and self.load_id:
+            rows = [{**row, "load_id": self.load_id} for row in rows]
+            columns = ("load_id",) + STAGING_FIELDS
+            with Session(self.engine) as session:
+                with session.connection().connection.cursor() as cursor:
+                    cursor.copy_expert(
+                        f"COPY {AtelierLoadRow.__tablename__} ({', '.join(columns)}) FROM STDIN",
+                        self._copy_buffer(rows, columns),
+                    )
+                session.commit()
+        elif rows:
+            with Session(self.engine) as session:
+                connection = session.connection()
+                atelier_staging.create(connection, checkfirst=True)
+                with connection.connection.cursor() as cursor:
+                    cursor.copy_expert(
+                        f"COPY atelier_staging ({', '.join(STAGING_FIELDS)}) FROM STDIN",
+                        self._copy_buffer(rows),
+                    )
+                result = upsert_from_staging(session, self.on_conflict)
+        return {**result, "rows": len(rows), "invalid": invalid, "seconds": time.monotonic() - start}
+
+    def _on_batch_sent(self, result, spider, batch, batch_num):
+        self.total_sent += len(batch)
+        self.total_created += result["inserted"]
+        self.rows_written += result["rows"]
+        self.write_seconds += result["seconds"]
+
+        stats = spider.crawler.stats
+        stats.inc_value('database_writer/batches_written')
+        stats.inc_value('database_writer/rows_copied', result["rows"])
+        if self.load_id:
+            stats.inc_value('database_writer/items_staged', result["rows"])
+        stats.inc_value('database_writer/items_created', result["inserted"])
+        stats.inc_value('database_writer/items_updated', result["updated"])
+        stats.inc_value('database_writer/items_unchanged', result["unchanged"])
+        stats.inc_value('database_writer/items_invalid', result["invalid"])
+        stats.inc_value('database_writer/write_ms', int(result["seconds"] * 1000))
+        stats.max_value('database_writer/batch_ms_max', int(result["seconds"] * 1000))
+        if self.write_seconds > 0:
+            stats.set_value('database_writer/rows_per_s', round(self.rows_written / self.write_seconds, 1))
+
+    @defer.inlineCallbacks
+    def close_spider(self, spider):
+        yield super().close_spider(spider)
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
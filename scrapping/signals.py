@@ -0,0 +1,9 @@
+# Signaux propres au projet, envoyés avec crawler.signals.send_catch_log
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/signals.html
+
+# Page de liste rendue par Playwright et traitée (arguments: spider, page_num, timings en ms)
+page_timed = object()
+
+# Lot d'un pipeline envoyé ou écrit, en succès ou non (arguments: spider, pipeline, size, seconds)
+batch_flushed = object()
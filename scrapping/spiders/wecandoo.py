@@ -1,106 +1,479 @@
+import asyncio
+import os
+import time
+from urllib.parse import quote
+
+import requests
 import scrapy
+from scrapy import signals
 from scrapy_playwright.page import PageMethod
-from scrapping.items import AtelierItem
+from scrapping.extraction import (
+    ATELIER_SELECTOR,
+    EXTRACT_CARDS_SCRIPT,
+    card_extractor,
+    extract_cards,
+    extract_detail,
+    extract_embedded_cards,
+    extract_pagination_links,
+    page_fingerprint,
+)
+from scrapping.frontier import FingerprintStore
+from scrapping.items import AtelierItem, RecrawlResultItem
+from scrapping.pagecache import apply_page_cache_settings, open_page_store
+from scrapping.signals import page_timed
 from scrapy.http import HtmlResponse
+from twisted.internet import threads
+
+# Script installant un MutationObserver qui mémorise l'heure de la dernière modification du DOM
+MUTATION_OBSERVER_SCRIPT = """
+() => {
+    if (!window.__daisyObserver) {
+        window.__daisyLastMutation = performance.now();
+        window.__daisyObserver = new MutationObserver(() => { window.__daisyLastMutation = performance.now(); });
+        window.__daisyObserver.observe(document.body, {childList: true, subtree: true});
+    }
+}
+"""
+
+# Script renvoyant le nombre d'ateliers et le temps écoulé depuis la dernière mutation (ms)
+SETTLE_STATE_SCRIPT = """
+(selector) => [document.querySelectorAll(selector).length, performance.now() - window.__daisyLastMutation]
+"""
+
+
+# Suivi des requêtes réseau en cours d'une page Playwright
+class NetworkTracker:
+
+    def __init__(self, page):
+        self.page = page
+        self.in_flight = 0
+        self.last_activity = time.monotonic()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_done)
+        page.on("requestfailed", self._on_done)
+
+    def _on_request(self, request):
+        self.in_flight += 1
+        self.last_activity = time.monotonic()
+
+    def _on_done(self, request):
+        self.in_flight = max(self.in_flight - 1, 0)
+        self.last_activity = time.monotonic()
+
+    # Fonction pour savoir depuis combien de temps (ms) le réseau est inactif
+    def idle_ms(self):
+        if self.in_flight:
+            return 0
+        return (time.monotonic() - self.last_activity) * 1000
+
+    def detach(self):
+        self.page.remove_listener("request", self._on_request)
+        self.page.remove_listener("requestfinished", self._on_done)
+        self.page.remove_listener("requestfailed", self._on_done)
+
 
 # Spider pour Wecandoo
 class WecandooSpider(scrapy.Spider):
     name = "wecandoo"
     start_urls = ["https://wecandoo.fr/ateliers"]
     allowed_domains = ["wecandoo.fr"]
-    
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.max_pages = int(kwargs.get('max_pages', 10))
         self.scroll_attempts = int(kwargs.get('scroll_attempts', 5))
+        # Attente après chaque scroll: "adaptive" (jusqu'à stabilisation) ou "fixed" (2 secondes)
+        self.settle_mode = kwargs.get('settle_mode', 'adaptive')
+        self.settle_timeout = int(kwargs.get('settle_timeout', 5000))
+        self.settle_quiet = int(kwargs.get('settle_quiet', 500))
+        # Téléchargement des pages de liste: "hybrid" (HTTP d'abord, Playwright si incomplet) ou "playwright"
+        self.fetch_mode = kwargs.get('fetch_mode')
+        self.min_cards = kwargs.get('min_cards')
+        self.page_size = 0
+        # Shard d'un crawl réparti: une catégorie / une ville, ou une plage de pages [start_page, max_pages]
+        self.shard_by = kwargs.get('shard_by')
+        self.shard_value = kwargs.get('shard_value')
+        self.start_page = int(kwargs['start_page']) if kwargs.get('start_page') else None
+        # Mode "listing" (pages de liste) ou "detail" (revisite des pages détail dont la visite est due)
+        self.mode = kwargs.get('mode', 'listing')
+        self.recrawl_limit = int(kwargs.get('recrawl_limit', 500))
+        self.recrawl_targets = []
+        # Extraction des cartes: "compiled" (XPath précompilés), "css" (sélecteurs parsel) ou "browser" (page.evaluate)
+        self.extractor = kwargs.get('extractor')
         self.seen_urls = set()
-    
+        self.page_store = None
+        # Pool de pages Playwright, fourni par PlaywrightPagePoolMiddleware quand il est activé
+        self.page_pool = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        return spider
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        apply_page_cache_settings(settings)
+
+    # Fonction appelée à l'ouverture du spider, avant la lecture des requêtes de départ
+    # En mode detail, les URLs à revisiter sont demandées à l'API dans un thread: le reactor,
+    # partagé par tous les crawls du worker, n'est pas bloqué pendant l'appel
+    def spider_opened(self, spider):
+        if self.mode != 'detail':
+            return None
+        d = threads.deferToThread(self.fetch_recrawl_targets)
+        d.addCallbacks(self._set_recrawl_targets, self._recrawl_targets_failed)
+        return d
+
+    # Fonction exécutée dans un thread pour récupérer les pages détail dont la visite est due
+    def fetch_recrawl_targets(self):
+        api_url = self.settings.get('API_URL')
+        response = requests.get(f"{api_url}/ateliers/recrawl-due", params={'limit': self.recrawl_limit}, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def _set_recrawl_targets(self, targets):
+        self.recrawl_targets = targets
+        self.logger.info(f"{len(targets)} pages détail à revisiter")
+
+    def _recrawl_targets_failed(self, failure):
+        self.logger.error(f"Impossible de récupérer les pages détail à revisiter: {failure.getErrorMessage()}")
+
+    # Fonction pour construire la requête Playwright d'une page de liste
+    def listing_request(self, url, page_num=1):
+        return scrapy.Request(
+            url,
+            callback=self.parse,
+            errback=self.listing_failed,
+            meta={
+                'page_num': page_num,
+                "playwright": True,
+                "playwright_include_page": True,
+                "playwright_page_methods": [
+                    PageMethod("wait_for_selector", ATELIER_SELECTOR, timeout=10000),
+                ],
+            },
+        )
+
+    # Fonction pour libérer la page d'une requête Playwright en échec (sinon elle reste prise dans le pool)
+    async def listing_failed(self, failure):
+        page = failure.request.meta.get("playwright_page")
+        if page is not None:
+            await self.close_page(page)
+        self.logger.error(f"Erreur lors du rendu de {failure.request.url}: {failure.getErrorMessage()}")
+
+    # Fonction pour rendre une page au pool, ou la fermer sans pool
+    async def close_page(self, page):
+        if self.page_pool is not None:
+            await self.page_pool.release(page)
+        else:
+            await page.close()
+
+    # Fonction pour construire la requête HTTP simple (sans navigateur) d'une page de liste
+    def static_request(self, url, page_num=1):
+        return scrapy.Request(url, callback=self.parse_static, meta={'page_num': page_num})
+
+    # Fonction pour construire la requête d'une page de liste selon le mode de téléchargement
+    def page_request(self, url, page_num=1):
+        if self.fetch_mode == 'hybrid':
+            return self.static_request(url, page_num)
+        return self.listing_request(url, page_num)
+
     # Fonction pour démarrer les requêtes
     def start_requests(self):
-        for url in self.start_urls:
+        self.fetch_mode = self.fetch_mode or self.settings.get('WECANDOO_FETCH_MODE', 'playwright')
+        self.min_cards = int(self.min_cards or self.settings.getint('WECANDOO_MIN_CARDS', 12))
+        self.page_size = self.settings.getint('WECANDOO_PAGE_SIZE', 0)
+        self.extractor = self.extractor or self.settings.get('WECANDOO_EXTRACTOR', 'compiled')
+        # Enregistrement des pages rendues (le download handler enregistre les réponses HTTP simples)
+        if self.settings.get('PAGE_CACHE_MODE') == 'record':
+            self.page_store = open_page_store(self.settings)
+        # Crawl reprenable: les URLs d'ateliers déjà vues sont conservées dans le JOBDIR
+        jobdir = self.settings.get('JOBDIR')
+        if jobdir:
+            self.seen_urls = FingerprintStore(os.path.join(jobdir, 'seen_urls.sqlite'))
+        if self.mode == 'detail':
+            yield from self.detail_requests()
+            return
+        if self.shard_by in ('category', 'city'):
+            url = self.settings.getdict('WECANDOO_SHARD_URLS')[self.shard_by].format(value=quote(self.shard_value))
+            yield self.page_request(url)
+        elif self.start_page:
+            yield self.page_request(self.page_url(self.start_page), self.start_page)
+        else:
+            for url in self.start_urls:
+                yield self.page_request(url)
+
+    # Fonction pour construire les requêtes conditionnelles des pages détail à revisiter (lues à l'ouverture du spider)
+    def detail_requests(self):
+        for target in self.recrawl_targets:
+            headers = {}
+            if target.get('etag'):
+                headers['If-None-Match'] = target['etag']
+            if target.get('last_modified'):
+                headers['If-Modified-Since'] = target['last_modified']
             yield scrapy.Request(
-                url=url,
-                meta={
-                    "playwright": True,
-                    "playwright_include_page": True,
-                    "playwright_page_methods": [
-                        PageMethod("wait_for_selector", "a[href*='/atelier/']", timeout=10000),
-                    ],
-                },
-                callback=self.parse,
+                target['url'],
+                callback=self.parse_detail,
+                headers=headers,
+                meta={'recrawl': target, 'handle_httpstatus_list': [304, 404, 410]},
+                dont_filter=True,
             )
-    
-    # Fonction pour parser la réponse
-    async def parse(self, response):
-        page = response.meta["playwright_page"]
 
+    # Fonction pour traiter une page détail: 304, page disparue, empreinte inchangée ou page à parser
+    def parse_detail(self, response):
+        target = response.meta['recrawl']
+        result = RecrawlResultItem(
+            url=target['url'],
+            etag=self.header(response, 'ETag'),
+            last_modified=self.header(response, 'Last-Modified'),
+        )
+
+        if response.status == 304:
+            result['status'] = 'not_modified'
+        elif response.status in (404, 410):
+            result['status'] = 'gone'
+        else:
+            page_hash = page_fingerprint(response)
+            detail = extract_detail(response) if page_hash != target.get('page_hash') else None
+            if detail:
+                result.update({key: value for key, value in detail.items() if key != 'url'})
+                result['status'] = 'changed'
+                result['page_hash'] = page_hash
+            else:
+                # Empreinte inchangée (ou page illisible: l'empreinte n'est pas enregistrée pour la reparser)
+                result['status'] = 'unchanged'
+                if page_hash == target.get('page_hash'):
+                    result['page_hash'] = page_hash
+
+        self.crawler.stats.inc_value(f"wecandoo/detail/{result['status']}")
+        yield result
+
+    # Fonction pour lire un en-tête de réponse en texte
+    @staticmethod
+    def header(response, name):
+        value = response.headers.get(name)
+        return value.decode('latin-1') if value else None
+
+    # Fonction appelée à la fermeture du spider
+    def closed(self, reason):
+        if isinstance(self.seen_urls, FingerprintStore):
+            self.seen_urls.close()
+
+    # Fonction pour construire l'URL d'une page de liste numérotée
+    def page_url(self, page_num):
+        return self.settings.get('WECANDOO_PAGE_URL').format(page=page_num)
+
+    # Fonction pour vérifier qu'une page téléchargée sans navigateur contient toutes ses cartes
+    # page_size: nombre d'ateliers par page (données embarquées ou WECANDOO_PAGE_SIZE), None s'il est inconnu.
+    # La dernière page, plus courte, est rendue avec Playwright: une seule page par crawl
+    def is_complete(self, cards, page_size=None):
+        if len(cards) < self.min_cards:
+            return False
+        page_size = page_size or self.page_size
+        return not page_size or len(cards) >= page_size
+
+    # Fonction pour parser une page téléchargée en HTTP simple (données embarquées puis HTML statique)
+    # La page est re-téléchargée avec Playwright si elle ne passe pas le contrôle de complétude
+    def parse_static(self, response):
+        page_num = response.meta.get('page_num', 1)
+        stats = self.crawler.stats
+
+        cards, page_size = extract_embedded_cards(response)
+        source = 'embedded'
+        if not cards:
+            cards = self.extract_listing(response)
+            source = 'html'
+
+        if not self.is_complete(cards, page_size):
+            stats.inc_value('wecandoo/pages_escalated')
+            self.logger.info(f"Page {page_num}: {len(cards)} ateliers sans navigateur, passage à Playwright")
+            yield self.listing_request(response.url, page_num).replace(dont_filter=True)
+            return
+
+        stats.inc_value('wecandoo/pages_http')
+        stats.inc_value(f'wecandoo/pages_http/{source}')
+
+        for item in self.items_from_cards(cards):
+            yield item
+
+        if page_num < self.max_pages:
+            for request in self.next_page_requests(response, extract_pagination_links(response), page_num):
+                yield request
+
+    # Fonction pour attendre que la page se stabilise après un scroll
+    # Stable = nombre d'ateliers inchangé, réseau inactif et DOM sans mutation pendant settle_quiet ms
+    async def settle(self, page, tracker, previous_count):
+        if self.settle_mode == 'fixed':
+            await page.wait_for_timeout(2000)
+            return
+
+        start = time.monotonic()
+        count_changed_at = start
+        count = previous_count
+        while True:
+            current_count, dom_idle_ms = await page.evaluate(SETTLE_STATE_SCRIPT, ATELIER_SELECTOR)
+            now = time.monotonic()
+            if current_count != count:
+                count = current_count
+                count_changed_at = now
+
+            elapsed_ms = (now - start) * 1000
+            count_idle_ms = (now - count_changed_at) * 1000
+            quiet = min(count_idle_ms, dom_idle_ms, tracker.idle_ms())
+            if quiet >= self.settle_quiet or elapsed_ms >= self.settle_timeout:
+                return
+            await asyncio.sleep(0.1)
+
+    # Fonction pour scroller jusqu'à ce que plus aucun atelier ne se charge
+    async def scroll_to_end(self, page, timings):
+        tracker = NetworkTracker(page)
         try:
-            # Scrolling pour charger toutes les ateliers
+            await page.evaluate(MUTATION_OBSERVER_SCRIPT)
             previous_count = 0
             for scroll_count in range(self.scroll_attempts):
-                current_count = await page.locator("a[href*='/atelier/']").count()
+                current_count = await page.locator(ATELIER_SELECTOR).count()
                 if current_count == previous_count:
                     break
                 previous_count = current_count
+
+                start = time.monotonic()
                 await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(2000)
+                timings['scroll_ms'] += (time.monotonic() - start) * 1000
+                timings['scrolls'] += 1
 
-            html = await page.content()
-            rendered_response = HtmlResponse(
-                url=response.url,
-                body=html.encode("utf-8"),
-                encoding="utf-8",
-            )
+                start = time.monotonic()
+                await self.settle(page, tracker, current_count)
+                timings['settle_ms'] += (time.monotonic() - start) * 1000
         finally:
-            await page.close()
+            tracker.detach()
+
+    # Fonction pour enregistrer le temps passé par page (rendu, scroll, attente, extraction)
+    # Les stats ne gardent que les totaux et maxima, le détail par page est dans les logs et l'histogramme Prometheus
+    def record_timings(self, page_num, timings):
+        stats = self.crawler.stats
+        for key in ('render_ms', 'scroll_ms', 'settle_ms', 'extract_ms'):
+            stats.inc_value(f'wecandoo/{key}', int(timings[key]))
+            stats.max_value(f'wecandoo/{key}_max', int(timings[key]))
+        stats.inc_value('wecandoo/scrolls', timings['scrolls'])
+        self.crawler.signals.send_catch_log(signal=page_timed, spider=self, page_num=page_num, timings=timings)
+
+        self.logger.info(
+            f"Page {page_num}: rendu {timings['render_ms']:.0f} ms, scroll {timings['scroll_ms']:.0f} ms "
+            f"({timings['scrolls']} scrolls), attente {timings['settle_ms']:.0f} ms, "
+            f"extraction {timings['extract_ms']:.0f} ms"
+        )
+
+    # Fonction pour parser la réponse
+    async def parse(self, response):
+        page = response.meta.get("playwright_page")
+        timings = {
+            'render_ms': response.meta.get('download_latency', 0) * 1000,
+            'scroll_ms': 0,
+            'settle_ms': 0,
+            'extract_ms': 0,
+            'scrolls': 0,
+        }
 
         # Récupération du numéro de page
         page_num = response.meta.get('page_num', 1)
 
-        # Récupération des liens des ateliers
-        atelier_links = rendered_response.css("a[href*='/atelier/']")
+        # Avec le pool, la page suivante est demandée avant le scroll: son téléchargement (et le délai de
+        # politesse) se déroule pendant le scroll de celle-ci. Les doublons sont filtrés par le dupefilter
+        if page is not None and self.page_pool is not None and page_num < self.max_pages:
+            for request in self.next_page_requests(response, extract_pagination_links(response), page_num):
+                yield request
 
-        # Parsing des ateliers
-        for atelier in atelier_links:
-            url = atelier.css("::attr(href)").get()
-            if not url:
-                continue
+        cards = links = None
+        if page is None:
+            # Page rejouée depuis le cache de pages: le HTML est déjà rendu et scrollé
+            rendered_response = response
+        else:
+            try:
+                # Scrolling pour charger toutes les ateliers
+                await self.scroll_to_end(page, timings)
 
-            url = response.urljoin(url)
+                # Extraction dans le navigateur: pas de sérialisation ni de re-parsing du HTML
+                if self.extractor == 'browser':
+                    start = time.monotonic()
+                    data = await page.evaluate(EXTRACT_CARDS_SCRIPT, card_extractor.browser_args())
+                    cards = [self.card_from_browser(response, row) for row in data['cards']]
+                    links = [link for link in data['links'] if link]
+                    timings['extract_ms'] = (time.monotonic() - start) * 1000
 
-            if url in self.seen_urls:
-                continue
+                rendered_response = response
+                if cards is None or self.page_store is not None:
+                    html = await page.content()
+                    rendered_response = HtmlResponse(
+                        url=response.url,
+                        body=html.encode("utf-8"),
+                        encoding="utf-8",
+                    )
+            finally:
+                await self.close_page(page)
 
-            self.seen_urls.add(url)
+            if self.page_store is not None:
+                self.page_store.put(
+                    response.request.url,
+                    rendered_response.body,
+                    kind='rendered',
+                    headers={'Content-Type': 'text/html; charset=utf-8'},
+                )
+                self.crawler.stats.inc_value('pagecache/recorded')
 
-            spans = atelier.css("p.w-typo--caption span::text").getall()
+        self.crawler.stats.inc_value('wecandoo/pages_playwright')
 
-            # Création de l'item Atelier
-            yield AtelierItem(
-                title=atelier.css("h3::text").get(),
-                url=url,
-                category=atelier.css("p.w-typo--footnote-serif::text").get(),
-                price=atelier.css("span.w-typo--h6 span::text").get(),
-                duration=spans[0] if spans else None,
-                location=spans[1] if len(spans) > 1 else None,
-            )
+        if cards is None:
+            start = time.monotonic()
+            cards = self.extract_listing(rendered_response)
+            links = extract_pagination_links(rendered_response)
+            timings['extract_ms'] = (time.monotonic() - start) * 1000
+        items = list(self.items_from_cards(cards))
+        self.record_timings(page_num, timings)
+
+        for item in items:
+            yield item
 
         # Parsing des pages suivantes
         if page_num < self.max_pages:
-            for link in rendered_response.css("a[href*='page='], a[href*='/ateliers?']"):
-                next_url = link.css("::attr(href)").get()
-                if next_url:
-                    # Création de la requête pour la page suivante
-                    yield scrapy.Request(
-                        response.urljoin(next_url),
-                        callback=self.parse,
-                        meta={
-                            'page_num': page_num + 1,
-                            "playwright": True,
-                            "playwright_include_page": True,
-                            "playwright_page_methods": [
-                                PageMethod("wait_for_selector", "a[href*='/atelier/']", timeout=10000),
-                            ],
-                        },
-                    )
+            for request in self.next_page_requests(response, links, page_num):
+                yield request
+
+    # Fonction pour extraire les cartes d'une page HTML avec l'extracteur choisi
+    def extract_listing(self, response):
+        if self.extractor == 'css':
+            return extract_cards(response)
+        return card_extractor.extract(response)
+
+    # Fonction pour convertir une carte lue par page.evaluate au format des autres extracteurs
+    @staticmethod
+    def card_from_browser(response, row):
+        return {
+            "title": row["title"],
+            "url": response.urljoin(row["href"]),
+            **{field: row[field] for field in ("category", "price", "duration", "location")},
+        }
+
+    # Fonction pour créer les items des cartes pas encore vues
+    def items_from_cards(self, cards):
+        for card in cards:
+            if card['url'] in self.seen_urls:
+                continue
+
+            self.seen_urls.add(card['url'])
+
+            # Création de l'item Atelier
+            yield AtelierItem(**card)
+
+    # Fonction pour créer les requêtes des pages suivantes à partir des liens de pagination
+    def next_page_requests(self, response, links, page_num):
+        # Shard par plage de pages: uniquement la page suivante de la plage
+        if self.start_page:
+            yield self.page_request(self.page_url(page_num + 1), page_num + 1)
+            return
 
+        for next_url in links:
+            if next_url:
+                # Création de la requête pour la page suivante
+                yield self.page_request(response.urljoin(next_url), page_num + 1)
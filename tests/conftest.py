@@ -0,0 +1,46 @@
+import os
+
+import pytest
+from scrapy.http import HtmlResponse
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine
+
+import api.models.catalog, api.models.crawl_log, api.models.facet, api.models.recrawl  # noqa: F401
+from api.migrations import run_migrations
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+# Fonction pour construire une réponse Scrapy à partir d'une page enregistrée dans tests/fixtures
+def load_fixture(name: str, url: str = "https://wecandoo.fr/ateliers?page=2") -> HtmlResponse:
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return HtmlResponse(url=url, body=f.read(), encoding="utf-8")
+
+
+@pytest.fixture
+def fixture_response():
+    return load_fixture
+
+
+# Base PostgreSQL de test (jamais celle de l'API): les tests qui en ont besoin sont ignorés sans TEST_DATABASE_URL
+@pytest.fixture(scope="session")
+def db_engine():
+    database_url = os.getenv("TEST_DATABASE_URL")
+    if not database_url:
+        pytest.skip("TEST_DATABASE_URL non défini")
+    engine = create_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+# Session sur une base vidée avant chaque test (génération du catalogue remise à 0)
+@pytest.fixture
+def db_session(db_engine):
+    tables = ", ".join(name for name in SQLModel.metadata.tables if name != "catalogstate")
+    with db_engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        conn.execute(text("UPDATE catalogstate SET generation = 0, reset_generation = 0"))
+    with Session(db_engine) as session:
+        yield session
@@ -0,0 +1,22 @@
+import pytest
+from scrapy.exceptions import NotConfigured
+
+from scrapping import browser
+
+
+def test_pinned_scrapy_playwright_is_supported():
+    browser.check_playwright_internals()
+
+
+def test_untested_scrapy_playwright_disables_the_pool(monkeypatch):
+    monkeypatch.setattr(browser, "version", lambda name: "0.0.99")
+
+    with pytest.raises(NotConfigured, match="0.0.99"):
+        browser.check_playwright_internals()
+
+
+def test_missing_private_api_disables_the_pool(monkeypatch):
+    monkeypatch.delattr(browser.ScrapyPlaywrightDownloadHandler, "_create_page")
+
+    with pytest.raises(NotConfigured, match="_create_page"):
+        browser.check_playwright_internals()
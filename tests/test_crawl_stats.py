@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from scrapy import Spider
+from scrapy.utils.test import get_crawler
+
+from api.tasks import BATCHES_FAILED_STAT, read_crawl_stats
+from scrapping.extensions import CrawlStatsFile
+
+
+def test_stats_file_keeps_every_key_whatever_the_values(tmp_path):
+    path = tmp_path / "stats.json"
+    crawler = get_crawler(Spider, {"CRAWL_STATS_PATH": str(path)})
+    extension = CrawlStatsFile.from_crawler(crawler)
+    stats = crawler.stats
+    stats.set_value("aaa/nested", {"page": 1, "render_ms": 120})
+    stats.set_value("bbb/list", [{"}": "{"}, 2])
+    stats.set_value("start_time", datetime(2026, 1, 1))
+    stats.set_value("finish_reason", "closespider_timeout")
+    stats.set_value(BATCHES_FAILED_STAT, 2)
+    stats.set_value("zzz/last", 7)
+
+    extension.spider_closed(Spider("test"), "closespider_timeout")
+    result = read_crawl_stats(str(path))
+
+    assert result["finish_reason"] == "closespider_timeout"
+    assert result[BATCHES_FAILED_STAT] == 2
+    assert result["zzz/last"] == 7
+    assert result["aaa/nested"] == {"page": 1, "render_ms": 120}
+    assert "page" not in result
+
+
+def test_missing_or_empty_stats_file_reads_as_no_stats(tmp_path):
+    empty = tmp_path / "empty.json"
+    empty.write_text("")
+
+    assert read_crawl_stats(str(empty)) == {}
+    assert read_crawl_stats(str(tmp_path / "missing.json")) == {}
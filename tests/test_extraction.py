@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from scrapping.extraction import EXTRACT_CARDS_SCRIPT, card_extractor, extract_cards, extract_pagination_links
+from scrapping.spiders.wecandoo import WecandooSpider
+
+
+def test_compiled_extractor_matches_css(fixture_response):
+    response = fixture_response("listing_static.html")
+
+    cards = extract_cards(response)
+
+    assert len(cards) == 14
+    assert card_extractor.extract(response) == cards
+    assert cards[0] == {
+        "title": "Fabriquez votre mozzarella et tresse artisanales",
+        "url": "https://wecandoo.fr/atelier/mozzarella-italie-latteria-fromage",
+        "category": "À manger",
+        "price": "49 €",
+        "duration": "2h",
+        "location": "Paris, Poissonnière",
+    }
+    assert cards[-1]["location"] is None
+    assert cards[-1]["price"] is None
+
+
+# Fonction pour exécuter le script d'extraction dans Chromium sur le HTML enregistré
+async def evaluate_in_browser(html):
+    from playwright.async_api import Error, async_playwright
+
+    async with async_playwright() as playwright:
+        try:
+            browser = await playwright.chromium.launch()
+        except Error as e:
+            pytest.skip(f"Chromium indisponible: {e.message.splitlines()[0]}")
+        try:
+            page = await browser.new_page()
+            await page.set_content(html)
+            return await page.evaluate(EXTRACT_CARDS_SCRIPT, card_extractor.browser_args())
+        finally:
+            await browser.close()
+
+
+def test_browser_extractor_matches_css(fixture_response):
+    response = fixture_response("listing_static.html")
+
+    data = asyncio.run(evaluate_in_browser(response.text))
+
+    cards = [WecandooSpider.card_from_browser(response, row) for row in data["cards"]]
+    assert cards == extract_cards(response)
+    assert data["links"] == extract_pagination_links(response)
@@ -0,0 +1,68 @@
+from scrapy.utils.test import get_crawler
+
+from scrapping.extraction import extract_embedded_cards
+from scrapping.items import AtelierItem
+from scrapping.spiders.wecandoo import WecandooSpider
+
+
+# Fonction pour créer un spider en mode hybrid, initialisé comme au démarrage du crawl
+def hybrid_spider(**settings):
+    crawler = get_crawler(WecandooSpider, {"WECANDOO_FETCH_MODE": "hybrid", "WECANDOO_MIN_CARDS": 12, **settings})
+    spider = WecandooSpider.from_crawler(crawler)
+    next(iter(spider.start_requests()))
+    return spider
+
+
+def parse_page(spider, response):
+    response = response.replace(request=spider.static_request(response.url, page_num=2))
+    return list(spider.parse_static(response))
+
+
+def test_embedded_page_size_ignores_catalog_totals(fixture_response):
+    cards, page_size = extract_embedded_cards(fixture_response("listing_embedded_full.html"))
+
+    assert len(cards) == 12
+    assert page_size == 12
+    assert cards[0] == {
+        "title": "Fabriquez votre mozzarella et tresse artisanales",
+        "url": "https://wecandoo.fr/atelier/mozzarella-italie-latteria-fromage",
+        "category": "À manger",
+        "price": "49",
+        "duration": "2h",
+        "location": "Paris, Poissonnière",
+    }
+
+
+def test_complete_page_is_served_over_http(fixture_response):
+    spider = hybrid_spider()
+    results = parse_page(spider, fixture_response("listing_embedded_full.html"))
+
+    items = [r for r in results if isinstance(r, AtelierItem)]
+    requests = [r for r in results if not isinstance(r, AtelierItem)]
+    assert len(items) == 12
+    assert requests and all(r.callback == spider.parse_static for r in requests)
+    assert "https://wecandoo.fr/ateliers?page=3" in [r.url for r in requests]
+    assert spider.crawler.stats.get_value("wecandoo/pages_http/embedded") == 1
+    assert spider.crawler.stats.get_value("wecandoo/pages_escalated") is None
+
+
+def test_short_page_escalates_to_playwright(fixture_response):
+    spider = hybrid_spider()
+    results = parse_page(spider, fixture_response("listing_embedded_partial.html"))
+
+    assert len(results) == 1
+    request = results[0]
+    assert request.callback == spider.parse
+    assert request.meta["playwright"] is True
+    assert request.dont_filter is True
+    assert spider.crawler.stats.get_value("wecandoo/pages_escalated") == 1
+    assert spider.crawler.stats.get_value("wecandoo/pages_http") is None
+
+
+def test_page_size_setting_applies_without_embedded_page_size(fixture_response):
+    spider = hybrid_spider(WECANDOO_PAGE_SIZE=24)
+    cards, _ = extract_embedded_cards(fixture_response("listing_embedded_full.html"))
+
+    assert not spider.is_complete(cards)
+    assert spider.is_complete(cards, page_size=12)
+    assert not spider.is_complete(cards[:11], page_size=11)
@@ -0,0 +1,117 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import select
+
+from api import ingest
+from api.catalog import get_catalog_state
+from api.ingest import MAX_NDJSON_LINE_BYTES, NdjsonError, NdjsonReader, ingest_ndjson
+from api.models.atelier import AtelierSnapshot, IngestChunkResult, IngestTransaction
+
+
+def ndjson(count, start=0):
+    return b"".join(
+        json.dumps({"title": f"Atelier {i}", "url": f"https://wecandoo.fr/atelier/{i}"}).encode() + b"\n"
+        for i in range(start, start + count)
+    )
+
+
+# Fonction pour lire un corps découpé en morceaux de size octets
+def read(body, size, compressed=None):
+    reader = NdjsonReader(compressed)
+    lines = []
+    for i in range(0, len(body), size):
+        lines.extend(reader.feed(body[i:i + size]))
+    lines.extend(reader.finish())
+    return lines
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_lines_are_split_across_chunk_boundaries(size):
+    body = b'{"a": 1}\n\n{"a": 2}\r\n{"a": 3}'
+
+    assert read(body, size) == [(1, b'{"a": 1}'), (3, b'{"a": 2}\r'), (4, b'{"a": 3}')]
+
+
+@pytest.mark.parametrize("size", [3, 1000, 1 << 20])
+def test_concatenated_gzip_members_are_read_in_order(size):
+    body = gzip.compress(ndjson(500)) + gzip.compress(ndjson(500, start=500))
+
+    lines = read(body, size)
+
+    assert [number for number, _ in lines] == list(range(1, 1001))
+    assert json.loads(lines[-1][1])["title"] == "Atelier 999"
+
+
+def test_truncated_gzip_is_rejected():
+    body = gzip.compress(ndjson(100))
+
+    with pytest.raises(NdjsonError, match="tronqué"):
+        read(body[:-20], 64)
+
+
+def test_line_longer_than_the_limit_is_rejected():
+    reader = NdjsonReader(compressed=False)
+    lines = list(reader.feed(b'{"a": 1}\n'))
+
+    with pytest.raises(NdjsonError, match="ligne 2 trop longue"):
+        list(reader.feed(b"x" * (MAX_NDJSON_LINE_BYTES + 1)))
+    assert lines == [(1, b'{"a": 1}')]
+
+
+@pytest.fixture
+def written(monkeypatch):
+    chunks = []
+
+    def write_chunk(session, index, lines, mode, transaction):
+        chunks.append([number for number, _ in lines])
+        return IngestChunkResult(chunk=index, first_line=lines[0][0], last_line=lines[-1][0], inserted=len(lines))
+
+    monkeypatch.setattr(ingest, "_write_chunk", write_chunk)
+    return chunks
+
+
+async def stream(*parts):
+    for part in parts:
+        yield part
+
+
+def test_stream_error_returns_the_chunks_already_written(written):
+    body = gzip.compress(ndjson(25))
+    parts = (body[:len(body) // 2], b"garbage" + body[len(body) // 2:])
+
+    result = asyncio.run(ingest_ndjson(None, stream(*parts), chunk_size=10, compressed=True))
+
+    assert result.error.startswith("gzip invalide")
+    assert result.inserted == sum(len(chunk) for chunk in written)
+    assert [chunk.chunk for chunk in result.chunks] == list(range(1, len(written) + 1))
+    assert result.lines == written[-1][-1]
+
+
+def test_stream_error_in_a_single_transaction_is_raised(written):
+    parts = (ndjson(25), b"x" * (MAX_NDJSON_LINE_BYTES + 1))
+
+    with pytest.raises(NdjsonError):
+        asyncio.run(ingest_ndjson(None, stream(*parts), chunk_size=10, transaction=IngestTransaction.request))
+
+
+def test_single_transaction_stages_rows_and_locks_the_generation_only_to_merge(db_session, db_engine):
+    # Un autre écrivain doit pouvoir incrémenter la génération pendant que le corps est encore envoyé
+    async def body():
+        yield ndjson(15)
+        with db_engine.begin() as conn:
+            conn.execute(text("SET LOCAL lock_timeout = '1s'"))
+            conn.execute(text("UPDATE catalogstate SET generation = generation + 1"))
+        yield ndjson(10, start=10)
+
+    result = asyncio.run(ingest_ndjson(db_session, body(), chunk_size=10, transaction=IngestTransaction.request))
+
+    assert [chunk.staged for chunk in result.chunks] == [10, 10, 5]
+    assert (result.lines, result.inserted, result.updated, result.unchanged) == (25, 20, 0, 0)
+    db_session.expire_all()
+    assert get_catalog_state(db_session).generation == 2
+    # Une URL envoyée deux fois dans le flux n'est écrite qu'une fois
+    assert len(db_session.exec(select(AtelierSnapshot)).all()) == 20
@@ -0,0 +1,48 @@
+import pytest
+from sqlmodel import select
+
+from api.catalog import get_catalog_state
+from api.models.atelier import Atelier
+from api.normalize import backfill_normalized, normalize_atelier, parse_price
+from scrapping.items import AtelierItem
+from scrapping.pipelines import AtelierPipeline
+
+
+@pytest.mark.parametrize("text, price", [
+    ("65 €", 65.0),
+    ("65,50 €", 65.5),
+    ("À partir de 89.9€", 89.9),
+    ("1.234 €", 1234.0),
+    ("1 234 €", 1234.0),
+    ("1 234,50 €", 1234.5),
+    ("1.234,50 €", 1234.5),
+    ("1,234.50 €", 1234.5),
+    ("Gratuit", None),
+])
+def test_displayed_prices_are_parsed_with_thousands_separators(text, price):
+    assert parse_price(text) == price
+    item = AtelierPipeline().process_item(AtelierItem(title="Atelier", url="/atelier/a", price=text), None)
+    assert item["price"] == price
+
+
+def test_backfill_normalizes_each_row_once(db_session):
+    db_session.add_all([
+        Atelier(title="Tournage", url="https://wecandoo.fr/atelier/a", price=65.0, duration="3h", location="Paris, 11e"),
+        # Durée et lieu illisibles: duration_minutes et city restent NULL après normalisation
+        Atelier(title="Vitrail", url="https://wecandoo.fr/atelier/b", price=120.0, duration="une journée"),
+        Atelier(**normalize_atelier({"title": "Bague", "url": "https://wecandoo.fr/atelier/c", "price": 89.9})),
+    ])
+    db_session.commit()
+
+    assert backfill_normalized(db_session, batch_size=1) == 2
+    db_session.expire_all()
+    generation = get_catalog_state(db_session).generation
+    rows = {atelier.url[-1]: atelier for atelier in db_session.exec(select(Atelier)).all()}
+    assert (rows["a"].duration_minutes, rows["a"].city, rows["a"].price_cents) == (180, "Paris", 6500)
+    assert rows["b"].content_hash and rows["b"].duration_minutes is None
+    # Un incrément de génération par lot écrit
+    assert (rows["a"].generation, rows["b"].generation, rows["c"].generation, generation) == (1, 2, None, 2)
+
+    assert backfill_normalized(db_session) == 0
+    db_session.expire_all()
+    assert get_catalog_state(db_session).generation == generation
@@ -0,0 +1,66 @@
+from scrapy.utils.test import get_crawler
+
+from api.normalize import content_hash, normalize_atelier
+from scrapping.items import AtelierItem, RecrawlResultItem
+from scrapping.pipelines import DatabasePipeline, RecrawlPipeline
+from scrapping.spiders.wecandoo import WecandooSpider
+
+KNOWN = {
+    "title": "Initiation au tournage",
+    "url": "https://wecandoo.fr/atelier/poterie",
+    "category": "Céramique",
+    "price": 65.0,
+    "duration": "3h",
+    "location": "Paris",
+}
+NEW = {**KNOWN, "title": "Bague en argent", "url": "https://wecandoo.fr/atelier/bague"}
+
+
+def spider():
+    crawler = get_crawler(WecandooSpider)
+    return crawler._create_spider()
+
+
+# Fonction pour faire passer des ateliers dans un pipeline dont l'index contient KNOWN
+def buffered(on_conflict, *rows):
+    pipeline = DatabasePipeline(streaming=False, on_conflict=on_conflict)
+    pipeline.existing_urls = {KNOWN["url"]: content_hash(normalize_atelier(KNOWN))}
+    crawl = spider()
+    for row in rows:
+        pipeline.process_item(AtelierItem(**row), crawl)
+    return [row["url"] for row in pipeline.buffer], crawl.crawler.stats
+
+
+def test_update_mode_sends_new_and_changed_ateliers_only():
+    urls, stats = buffered("update", KNOWN, NEW, NEW)
+    assert urls == [NEW["url"]]
+    assert stats.get_value("database_pipeline/items_skipped_unchanged") == 2
+
+    urls, _ = buffered("update", {**KNOWN, "price": 70.0}, NEW)
+    assert urls == [KNOWN["url"], NEW["url"]]
+
+
+def test_skip_mode_ignores_known_urls_even_when_changed():
+    urls, _ = buffered("skip", {**KNOWN, "price": 70.0}, NEW)
+    assert urls == [NEW["url"]]
+
+
+def test_full_refresh_load_does_not_use_the_index():
+    pipeline = DatabasePipeline(load_id=3)
+    assert pipeline._sync_url_index(spider()) == {}
+    assert pipeline.batch_params is None
+
+
+def test_recrawl_pipeline_opens_nothing_until_a_recrawl_result():
+    crawl = spider()
+    pipeline = RecrawlPipeline(streaming=False)
+    pipeline.open_spider(crawl)
+
+    pipeline.process_item(AtelierItem(**NEW), crawl)
+    assert pipeline.session is None and pipeline.flush_loop is None
+    assert pipeline.close_spider(crawl) is None
+
+    pipeline.process_item(RecrawlResultItem(url=KNOWN["url"], status="not_modified"), crawl)
+    assert pipeline.session is not None
+    assert [row["url"] for row in pipeline.buffer] == [KNOWN["url"]]
+    pipeline.session.close()
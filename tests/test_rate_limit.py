@@ -0,0 +1,104 @@
+import asyncio
+
+import fakeredis
+import pytest
+from scrapy import Request, Spider
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from scrapping import middlewares
+from scrapping.middlewares import RedisRateLimitMiddleware
+
+URL = "https://wecandoo.fr/ateliers"
+KEY = "ratelimit:wecandoo.fr"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(middlewares.aioredis, "from_url", lambda url: fakeredis.aioredis.FakeRedis(server=server))
+    return server
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(middlewares.asyncio, "sleep", sleep)
+    return waits
+
+
+# Fonction pour créer un middleware branché sur le Redis partagé (un par processus de crawl)
+def rate_limiter(**settings):
+    crawler = get_crawler(Spider, {
+        "REDIS_RATE_LIMIT_ENABLED": True,
+        "REDIS_RATE_LIMIT_MIN_DELAY": 2,
+        "REDIS_RATE_LIMIT_MAX_DELAY": 10,
+        "REDIS_RATE_LIMIT_BURST": 1,
+        **settings,
+    })
+    return RedisRateLimitMiddleware.from_crawler(crawler), Spider("test")
+
+
+async def acquire(middleware):
+    wait, delay = await middleware.acquire(keys=[KEY], args=[middleware.min_delay, middleware.burst])
+    return float(wait), float(delay)
+
+
+def test_middlewares_share_the_domain_budget(server, sleeps):
+    first, spider = rate_limiter()
+    second, _ = rate_limiter()
+
+    async def run():
+        await first.process_request(Request(URL), spider)
+        await second.process_request(Request(URL), spider)
+        await first.process_request(Request(URL), spider)
+
+    asyncio.run(run())
+
+    # Le premier jeton part sans attendre, les suivants attendent le délai commun, quel que soit le processus
+    assert len(sleeps) == 2
+    assert sleeps[0] == pytest.approx(2, abs=0.1)
+    assert sleeps[1] == pytest.approx(4, abs=0.1)
+    assert second.stats.get_value("ratelimit/wait_count") == 1
+    assert first.stats.get_value("ratelimit/slots/wecandoo.fr/delay") == 2
+
+
+def test_bucket_refills_up_to_burst(server):
+    middleware, _ = rate_limiter(REDIS_RATE_LIMIT_MIN_DELAY=1, REDIS_RATE_LIMIT_BURST=2)
+    redis = fakeredis.FakeRedis(server=server)
+
+    async def run():
+        waits = [(await acquire(middleware))[0] for _ in range(3)]
+
+        # 5 secondes plus tard: le seau est de nouveau plein, mais jamais au-delà de burst
+        ts = float(redis.hget(KEY, "ts"))
+        redis.hset(KEY, "ts", ts - 5)
+        waits += [(await acquire(middleware))[0] for _ in range(3)]
+        return waits
+
+    waits = asyncio.run(run())
+
+    assert waits[:2] == [0, 0]
+    assert waits[2] == pytest.approx(1, abs=0.1)
+    assert waits[3:5] == [0, 0]
+    assert waits[5] == pytest.approx(1, abs=0.1)
+
+
+def test_measured_latency_slows_every_process(server, sleeps):
+    first, spider = rate_limiter()
+    second, _ = rate_limiter()
+    request = Request(URL, meta={"download_latency": 8.0})
+
+    async def run():
+        await first.process_response(request, HtmlResponse(URL, status=200), spider)
+        return await acquire(second)
+
+    _, delay = asyncio.run(run())
+
+    # Même règle qu'AutoThrottle: le délai passe à latence / concurrence visée (borné par le maximum)
+    assert delay == pytest.approx(8)
+    assert first.stats.get_value("ratelimit/slots/wecandoo.fr/latency") == pytest.approx(8)
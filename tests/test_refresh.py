@@ -0,0 +1,90 @@
+import pytest
+from sqlmodel import select
+
+from api.catalog import get_catalog_state, get_url_index
+from api.ingest import upsert_ateliers
+from api.models.atelier import Atelier, AtelierCreate, ConflictMode
+from api.models.catalog import AtelierLoadRow, CatalogLoad, CatalogLoadStatus
+from api.refresh import clean_load, create_load, fail_load, promote_load, stage_ateliers
+
+
+def atelier(slug, **fields):
+    return AtelierCreate(**{"title": f"Atelier {slug}", "url": f"https://wecandoo.fr/atelier/{slug}", **fields})
+
+
+def catalog(session):
+    session.expire_all()
+    return {row.url.rsplit("/", 1)[-1]: row for row in session.exec(select(Atelier)).all()}
+
+
+def test_truncated_load_is_refused_and_the_catalog_is_kept(db_session):
+    upsert_ateliers(db_session, [atelier(slug) for slug in "abcd"], ConflictMode.update)
+    load = create_load(db_session)
+    stage_ateliers(db_session, load.id, [atelier("a")])
+
+    with pytest.raises(ValueError, match="incomplet"):
+        promote_load(db_session, load.id)
+
+    db_session.rollback()
+    assert sorted(catalog(db_session)) == ["a", "b", "c", "d"]
+    assert db_session.get(CatalogLoad, load.id).status == CatalogLoadStatus.loading
+
+
+def test_promotion_deletes_stale_urls_and_forces_a_full_url_index(db_session):
+    upsert_ateliers(db_session, [atelier(slug) for slug in "abc"], ConflictMode.update)
+    since = get_url_index(db_session, 0)["generation"]
+    load = create_load(db_session)
+    stage_ateliers(db_session, load.id, [atelier("a"), atelier("b", price=40.0), atelier("d")])
+
+    load = promote_load(db_session, load.id)
+
+    # "a" est inchangé: seul "b" est réécrit
+    assert (load.status, load.staged, load.inserted, load.updated, load.deleted) == (
+        CatalogLoadStatus.promoted, 3, 1, 1, 1,
+    )
+    assert sorted(catalog(db_session)) == ["a", "b", "d"]
+    state = get_catalog_state(db_session)
+    assert state.reset_generation == state.generation == since + 1
+    index = get_url_index(db_session, since)
+    assert index["full"] and sorted(index["urls"]) == sorted(row.url for row in catalog(db_session).values())
+
+
+def test_latest_row_wins_for_a_url_loaded_twice(db_session):
+    load = create_load(db_session)
+    stage_ateliers(db_session, load.id, [atelier("a", price=30.0), atelier("b")])
+    stage_ateliers(db_session, load.id, [atelier("a", price=45.0)])
+
+    load = promote_load(db_session, load.id)
+
+    assert (load.staged, load.inserted) == (2, 2)
+    assert catalog(db_session)["a"].price_cents == 4500
+
+
+def test_only_a_loading_load_can_be_promoted_or_staged(db_session):
+    load = create_load(db_session)
+    stage_ateliers(db_session, load.id, [atelier("a")])
+    promote_load(db_session, load.id)
+    failed = create_load(db_session)
+    fail_load(db_session, failed.id, "crawl interrompu")
+
+    for load_id in (load.id, failed.id):
+        with pytest.raises(ValueError, match="ne peut pas être promu"):
+            promote_load(db_session, load_id)
+        db_session.rollback()
+        with pytest.raises(ValueError, match="n'est plus en cours"):
+            stage_ateliers(db_session, load_id, [atelier("b")])
+    assert sorted(catalog(db_session)) == ["a"]
+
+
+def test_clean_load_removes_rows_of_a_finished_load_only(db_session):
+    load = create_load(db_session)
+    stage_ateliers(db_session, load.id, [atelier(slug) for slug in "abcde"])
+
+    with pytest.raises(ValueError, match="encore en cours"):
+        clean_load(db_session, load.id)
+
+    promote_load(db_session, load.id)
+    assert clean_load(db_session, load.id, batch_size=2) == 5
+    assert db_session.exec(select(AtelierLoadRow).where(AtelierLoadRow.load_id == load.id)).all() == []
+    assert db_session.get(CatalogLoad, load.id).cleaned_at is not None
+    assert sorted(catalog(db_session)) == list("abcde")
@@ -0,0 +1,28 @@
+from api import tasks
+from api.models.crawl_log import CrawlStatus
+
+
+def test_shards_report_to_the_crawl_log_of_the_chord_callback(monkeypatch):
+    dispatched = {}
+    monkeypatch.setattr(tasks, "chord", lambda header: lambda callback: dispatched.update(header=header, callback=callback))
+
+    tasks.start_sharded_crawl("wecandoo", tasks.build_shards("pages", 2, None, 4), crawl_id="nuit")
+
+    parent_task_id = dispatched["callback"].options["task_id"]
+    assert [shard.kwargs["parent_task_id"] for shard in dispatched["header"].tasks] == [parent_task_id] * 2
+
+
+def test_shard_only_marks_the_parent_crawl_log_as_started(monkeypatch):
+    logged = []
+    monkeypatch.setattr(tasks, "update_crawl_log", lambda task_id, **fields: logged.append((task_id, fields)))
+    monkeypatch.setattr(tasks.run_scrapy_spider, "update_state", lambda **kwargs: None)
+    monkeypatch.setattr(tasks, "run_in_process_crawl", lambda task, *args: {
+        "items_scraped": 3, "pages_crawled": 1, "errors_count": 0, "finish_reason": "finished", "error_msg": None,
+    })
+
+    result = tasks.run_scrapy_spider.apply(
+        ("wecandoo", "inprocess", {"start_page": 1, "max_pages": 2}, 2, True), {"parent_task_id": "parent"},
+    ).get()
+
+    assert result["status"] == "success"
+    assert logged == [("parent", {"status": CrawlStatus.STARTED.value})]
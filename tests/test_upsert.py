@@ -0,0 +1,97 @@
+from sqlmodel import select
+
+from api.catalog import get_catalog_state, get_url_index
+from api.ingest import upsert_ateliers
+from api.models.atelier import Atelier, AtelierCreate, AtelierSnapshot, ConflictMode
+from api.normalize import content_hash, normalize_atelier
+
+POTERIE = {
+    "title": "Initiation au tournage",
+    "url": "https://wecandoo.fr/atelier/poterie",
+    "category": "Céramique",
+    "price": 65.0,
+    "duration": "3h",
+    "location": "Paris, 11e",
+}
+BIJOU = {
+    "title": "Bague en argent",
+    "url": "https://wecandoo.fr/atelier/bague",
+    "category": "Bijouterie",
+    "price": 89.9,
+    "duration": "2h30",
+    "location": "Lyon",
+}
+
+
+def upsert(session, *rows, mode=ConflictMode.update):
+    return upsert_ateliers(session, [AtelierCreate(**row) for row in rows], mode)
+
+
+def snapshots(session, url):
+    return session.exec(select(AtelierSnapshot).where(AtelierSnapshot.url == url).order_by(AtelierSnapshot.id)).all()
+
+
+def generation(session):
+    session.expire_all()
+    return get_catalog_state(session).generation
+
+
+def test_new_urls_are_inserted_with_a_created_snapshot(db_session):
+    result = upsert(db_session, POTERIE, BIJOU)
+
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (2, 0, 0)
+    atelier = db_session.exec(select(Atelier).where(Atelier.url == POTERIE["url"])).one()
+    assert (atelier.price_cents, atelier.duration_minutes, atelier.city, atelier.district) == (6500, 180, "Paris", "11e")
+    assert atelier.generation == generation(db_session) == 1
+    [snapshot] = snapshots(db_session, POTERIE["url"])
+    assert snapshot.created and snapshot.content_hash == atelier.content_hash
+
+
+def test_unchanged_batch_writes_nothing_and_rolls_back_the_generation(db_session):
+    upsert(db_session, POTERIE, BIJOU)
+
+    result = upsert(db_session, POTERIE, BIJOU)
+
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (0, 0, 2)
+    assert result["ateliers"] == []
+    assert generation(db_session) == 1
+    assert len(snapshots(db_session, POTERIE["url"])) == 1
+
+
+def test_changed_atelier_is_updated_and_snapshotted(db_session):
+    upsert(db_session, POTERIE, BIJOU)
+
+    result = upsert(db_session, {**POTERIE, "price": 70.0}, BIJOU)
+
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (0, 1, 1)
+    assert [atelier.url for atelier in result["ateliers"]] == [POTERIE["url"]]
+    db_session.expire_all()
+    atelier = db_session.exec(select(Atelier).where(Atelier.url == POTERIE["url"])).one()
+    assert (atelier.price, atelier.price_cents, atelier.generation) == (70.0, 7000, 2)
+    first, second = snapshots(db_session, POTERIE["url"])
+    assert (first.price, first.created) == (65.0, True)
+    assert (second.price, second.created, second.generation) == (70.0, False, 2)
+    assert len(snapshots(db_session, BIJOU["url"])) == 1
+
+
+def test_skip_mode_keeps_existing_rows(db_session):
+    upsert(db_session, POTERIE)
+
+    result = upsert(db_session, {**POTERIE, "price": 70.0}, BIJOU, mode=ConflictMode.skip)
+
+    assert (result["inserted"], result["updated"], result["unchanged"]) == (1, 0, 1)
+    db_session.expire_all()
+    assert db_session.exec(select(Atelier.price).where(Atelier.url == POTERIE["url"])).one() == 65.0
+
+
+def test_url_index_delta_carries_the_hash_computed_by_the_pipeline(db_session):
+    upsert(db_session, POTERIE, BIJOU)
+    changed = {**POTERIE, "location": "Paris, 20e"}
+    upsert(db_session, changed)
+
+    full = get_url_index(db_session, 0)
+    delta = get_url_index(db_session, 1)
+
+    assert full["full"] and sorted(full["urls"]) == sorted([POTERIE["url"], BIJOU["url"]])
+    assert (delta["full"], delta["generation"], delta["urls"]) == (False, 2, [POTERIE["url"]])
+    assert delta["hashes"] == [content_hash(normalize_atelier(changed))]